@@ -1,3 +1,3 @@
-from .runner import make_admin_app, start_admin
+from .runner import make_admin_app, start_admin, start_profiler_admin
 
-__all__ = ["make_admin_app", "start_admin"]
+__all__ = ["make_admin_app", "start_admin", "start_profiler_admin"]
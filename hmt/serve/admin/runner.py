@@ -1,9 +1,12 @@
 import logging
+from typing import Optional
 
 from tornado.httpserver import HTTPServer
 from tornado.web import Application
 
 from hmt.serve.admin.views import (
+    MetricsView,
+    ProfilerView,
     RestMiddlewaresView,
     RestMiddlewareView,
     ScopeView,
@@ -11,6 +14,8 @@ from hmt.serve.admin.views import (
 )
 from hmt.serve.mock.rest import RestMiddlewareManager
 from hmt.serve.mock.storage.mock_data_store import MockDataStore
+from hmt.serve.utils.metrics import MetricsRegistry
+from hmt.serve.utils.profiler import Profiler
 
 from ..mock.scope import Scope
 
@@ -21,14 +26,21 @@ def make_admin_app(
     scope: Scope,
     mock_data_store: MockDataStore,
     rest_middleware_manager: RestMiddlewareManager,
+    metrics: Optional[MetricsRegistry] = None,
+    profiler: Optional[Profiler] = None,
+    workers: int = 1,
 ):
     storage_view_deps = dict(mock_data_store=mock_data_store)
     rest_middleware_deps = dict(rest_middleware_manager=rest_middleware_manager)
     scope_view_deps = dict(scope=scope)
+    metrics_view_deps = dict(metrics=metrics or MetricsRegistry())
+    profiler_view_deps = dict(profiler=profiler or Profiler(), workers=workers)
     return Application(
         [
             (r"/admin/scope", ScopeView, scope_view_deps),
             (r"/admin/storage(?:/(.*))?", StorageView, storage_view_deps),
+            (r"/admin/metrics", MetricsView, metrics_view_deps),
+            (r"/admin/profiler(?:/(.*))?", ProfilerView, profiler_view_deps),
             (
                 r"/admin/middleware/rest/pregen",
                 RestMiddlewaresView,
@@ -48,8 +60,30 @@ def start_admin(
     scope: Scope,
     mock_data_store: MockDataStore,
     rest_middleware_manager: RestMiddlewareManager,
+    metrics: Optional[MetricsRegistry] = None,
+    workers: int = 1,
 ):
-    app = make_admin_app(scope, mock_data_store, rest_middleware_manager)
+    app = make_admin_app(
+        scope, mock_data_store, rest_middleware_manager, metrics, workers=workers
+    )
     http_server = HTTPServer(app)
     http_server.listen(port)
     logger.info("- Admin   http://localhost:%s/admin", port)
+
+
+def start_profiler_admin(port: int, profiler: Optional[Profiler] = None):
+    """
+    Starts an admin server that only controls the profiler, e.g. of the record proxy.
+    """
+    app = Application(
+        [
+            (
+                r"/admin/profiler(?:/(.*))?",
+                ProfilerView,
+                dict(profiler=profiler or Profiler()),
+            )
+        ]
+    )
+    http_server = HTTPServer(app)
+    http_server.listen(port)
+    logger.info("- Admin   http://localhost:%s/admin/profiler", port)
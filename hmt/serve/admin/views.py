@@ -1,5 +1,6 @@
 import json
 import logging
+import math
 
 from tornado.web import RequestHandler
 
@@ -7,12 +8,14 @@ from hmt.serve.mock.storage.mock_data_store import MockDataStore
 
 from ..mock.rest import RestMiddlewareManager
 from ..mock.scope import Scope
+from ..utils.metrics import MetricsRegistry
+from ..utils.profiler import DETERMINISTIC, PSTATS, Profile, Profiler
 
 logger = logging.getLogger(__name__)
 
 
 class StorageView(RequestHandler):
-    SUPPORTED_METHODS = ["DELETE", "POST"]
+    SUPPORTED_METHODS = ["DELETE", "POST", "GET"]
 
     def initialize(self, mock_data_store: MockDataStore):
         self._mock_data_store = mock_data_store
@@ -21,14 +24,40 @@ class StorageView(RequestHandler):
         self.set_header("Content-Type", 'application/json; charset="utf-8"')
 
     def delete(self, command):
-        if command is not None:
+        if command is None:
+            self._mock_data_store.clear()
+        elif command.startswith("scopes/"):
+            scope = command[len("scopes/") :]
+            if scope not in self._mock_data_store.scopes():
+                self.set_status(404)
+                return
+            self._mock_data_store.drop(scope)
+        else:
             self.set_status(501)
+
+    def get(self, command):
+        if command == "snapshots":
+            self.write(json.dumps(self._mock_data_store.snapshots()))
+        elif command == "scopes":
+            self.write(json.dumps(self._mock_data_store.scopes()))
         else:
-            self._mock_data_store.clear()
+            self.set_status(501)
 
     def post(self, command):
         if command == "reset":
             self._mock_data_store.reset()
+        elif command == "snapshot":
+            name = self.get_body_argument("name")
+            if name == "":
+                self.set_status(400)
+                return
+            self._mock_data_store.snapshot(name)
+        elif command == "restore":
+            name = self.get_body_argument("name")
+            if name not in self._mock_data_store.snapshots():
+                self.set_status(404)
+                return
+            self._mock_data_store.restore(name)
         else:
             self.set_status(501)
 
@@ -52,6 +81,89 @@ class ScopeView(RequestHandler):
         )
 
 
+class MetricsView(RequestHandler):
+    SUPPORTED_METHODS = ["GET"]
+
+    def initialize(self, metrics: MetricsRegistry):
+        self._metrics = metrics
+
+    def get(self):
+        if self.get_query_argument("format", "json") == "prometheus":
+            self.set_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.write(self._metrics.to_prometheus())
+        else:
+            self.set_header("Content-Type", 'application/json; charset="utf-8"')
+            self.write(json.dumps(self._metrics.to_json()))
+
+
+class ProfilerView(RequestHandler):
+    SUPPORTED_METHODS = ["POST", "GET"]
+
+    def initialize(self, profiler: Profiler, workers: int = 1):
+        """
+        :param profiler: a profiler of the process that runs the admin server
+        :param workers: a number of worker processes serving requests, the profiler can't see them
+        """
+        self._profiler = profiler
+        self._workers = workers
+
+    def get(self, command):
+        if command is None:
+            self.set_header("Content-Type", 'application/json; charset="utf-8"')
+            self.write(json.dumps(self._profiler.status()))
+        elif command == "profile":
+            if self._profiler.last is None:
+                self.set_status(404)
+                return
+            self._write_profile(self._profiler.last)
+        else:
+            self.set_status(501)
+
+    def post(self, command):
+        if command == "start":
+            if self._workers > 1:
+                self.set_status(409)
+                self.write(
+                    "The profiler can't see requests served by %d workers, run the server without --workers"
+                    % self._workers
+                )
+                return
+            requests = self.get_body_argument("requests", None)
+            interval = self.get_body_argument("interval", None)
+            try:
+                self._profiler.start(
+                    self.get_body_argument("mode", DETERMINISTIC),
+                    int(requests) if requests else None,
+                    float(interval) / 1000 if interval else 0.005,
+                )
+            except ValueError as e:
+                self.set_status(409 if self._profiler.running else 400)
+                self.write(str(e))
+        elif command == "stop":
+            if not self._profiler.running:
+                self.set_status(409)
+                return
+            self._write_profile(self._profiler.stop())
+        else:
+            self.set_status(501)
+
+    def _write_profile(self, profile: Profile):
+        output_format = self.get_argument("format", None)
+        try:
+            output = profile.output(output_format)
+        except ValueError as e:
+            self.set_status(400)
+            self.write(str(e))
+            return
+        self.set_header(
+            "Content-Type",
+            "application/octet-stream"
+            if output_format == PSTATS
+            else "text/plain; charset=utf-8",
+        )
+        self.write(output)
+
+
 class RestMiddlewaresView(RequestHandler):
     SUPPORTED_METHODS = ["DELETE", "GET"]
 
@@ -81,4 +193,14 @@ class RestMiddlewareView(RequestHandler):
         self.rest_middleware_manager.clear(url)
 
     def post(self, url):
-        self.rest_middleware_manager.add(url)
+        timeout = self.get_body_argument("timeout", None)
+        if timeout is not None:
+            try:
+                timeout = float(timeout)
+            except ValueError:
+                timeout = math.nan
+            if not (0 < timeout < math.inf):
+                self.set_status(400)
+                self.write(json.dumps({"message": "timeout must be a positive number"}))
+                return
+        self.rest_middleware_manager.add(url, timeout)
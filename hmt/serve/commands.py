@@ -69,6 +69,13 @@ _record_options = _common_server_options + [
         default=None,
         help="Spec building mode.",
     ),
+    click.option(
+        "-a",
+        "--admin-port",
+        default=None,
+        type=int,
+        help="Admin server port, the admin server of the recorder only controls the profiler.",
+    ),
 ]
 
 _mock_options = _common_server_options + [
@@ -88,9 +95,74 @@ _mock_options = _common_server_options + [
         type=click.Path(exists=False, file_okay=False, resolve_path=True),
         help="Directory where server logs are written.",
     ),
+    click.option(
+        "--log-max-entries",
+        default=1000,
+        type=click.IntRange(min=0),
+        help="Number of recent interactions kept in memory.",
+    ),
+    click.option(
+        "--log-max-bytes",
+        default=None,
+        type=click.IntRange(min=0),
+        help="Total size in bytes of the JSON of recent interactions kept in memory.",
+    ),
+    click.option(
+        "--log-max-age",
+        default=None,
+        type=click.FloatRange(min=0),
+        help="Seconds for which recent interactions are kept in memory.",
+    ),
+    click.option(
+        "--log-file-max-bytes",
+        default=None,
+        type=click.IntRange(min=1),
+        help="Size after which a new log file is started.",
+    ),
+    click.option(
+        "--log-file-max-age",
+        default=None,
+        type=click.FloatRange(min=0),
+        help="Seconds after which a new log file is started.",
+    ),
     click.option(
         "-s", "--status", is_flag=True, help="Show the status of the mock daemon."
     ),
+    click.option(
+        "-w",
+        "--workers",
+        default=1,
+        type=click.IntRange(min=1),
+        help="Number of worker processes serving mocks.",
+    ),
+    click.option(
+        "--seed",
+        default=None,
+        type=int,
+        help="Generate the same response for the same request, using the seed.",
+    ),
+    click.option(
+        "--reload-callbacks",
+        is_flag=True,
+        help="Reload callback scripts when they change.",
+    ),
+    click.option(
+        "--storage-file",
+        default=None,
+        type=click.Path(dir_okay=False, resolve_path=True),
+        help="SQLite database where mock data is kept between restarts.",
+    ),
+    click.option(
+        "--stream-threshold",
+        default=None,
+        type=click.IntRange(min=0),
+        help="Stream generated JSON arrays of at least this many items in chunks.",
+    ),
+    click.option(
+        "--validate-body",
+        is_flag=True,
+        help="Validate JSON request bodies against the specifications.",
+    ),
 ]
 
 
@@ -101,12 +173,23 @@ _mock_options = _common_server_options + [
 def mock(
     callback_dir,
     log_dir,
+    log_max_entries,
+    log_max_bytes,
+    log_max_age,
+    log_file_max_bytes,
+    log_file_max_age,
     admin_port,
     port,
     header_routing,
     daemon,
     kill,
     status,
+    workers,
+    validate_body,
+    seed,
+    stream_threshold,
+    reload_callbacks,
+    storage_file,
     specifications,
 ):
     """
@@ -131,6 +214,17 @@ def mock(
         specs=specs,
         routing=HeaderRouting() if header_routing else PathRouting(),
         log_dir=log_dir,
+        validate_body=validate_body,
+        workers=workers,
+        log_max_entries=log_max_entries,
+        log_max_bytes=log_max_bytes,
+        log_max_age=log_max_age,
+        log_file_max_bytes=log_file_max_bytes,
+        log_file_max_age=log_file_max_age,
+        seed=seed,
+        stream_threshold=stream_threshold,
+        reload_callbacks=reload_callbacks,
+        storage_file=storage_file,
     )
 
     if daemon and (not IS_WINDOWS):
@@ -164,7 +258,7 @@ def status_mocking():
 @add_options(_record_options)
 @click.pass_context
 @log_exceptions
-def record(ctx, port, log_dir, header_routing, specs_dir, mode, daemon):
+def record(ctx, port, log_dir, header_routing, specs_dir, mode, daemon, admin_port):
     """
     Record HTTP traffic from a reverse proxy.
     """
@@ -175,7 +269,7 @@ def record(ctx, port, log_dir, header_routing, specs_dir, mode, daemon):
 @record.command(name="start")  # type: ignore
 @add_options(_record_options)
 @log_exceptions
-def start_record(port, log_dir, header_routing, specs_dir, mode, daemon):
+def start_record(port, log_dir, header_routing, specs_dir, mode, daemon, admin_port):
     print(os.getpid())
     proxy_runner = RecordProxyRunner(
         port=port,
@@ -183,6 +277,7 @@ def start_record(port, log_dir, header_routing, specs_dir, mode, daemon):
         routing=HeaderRouting() if header_routing else PathRouting(),
         specs_dir=specs_dir,
         mode=UpdateMode[mode.upper()] if mode else None,
+        admin_port=admin_port,
     )
     if daemon and (not IS_WINDOWS):
         import daemonocle
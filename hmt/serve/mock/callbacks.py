@@ -1,16 +1,118 @@
 import glob
 import importlib.util
 import inspect
-import json
 import logging
 import os
-from dataclasses import asdict
+import typing
+from collections.abc import MutableMapping
+from copy import deepcopy
 
+from http_types import Response
 from http_types.utils import ResponseBuilder
+from tornado.ioloop import PeriodicCallback
+
+from hmt.serve.utils import json_encoding
+from hmt.serve.utils.json_encoding import EncodedResponse, StreamedResponse
 
 logger = logging.getLogger(__name__)
 
 
+class DataclassView(MutableMapping):
+    """
+    A dict-like view of a request or a response given to callbacks instead of a copy.
+    Fields are read from the original object, assigned fields are kept in the view.
+    """
+
+    def __init__(self, obj: typing.Any):
+        self._obj = obj
+        self._fields = obj.__dataclass_fields__
+        self.changes: typing.Dict[str, typing.Any] = {}
+
+    def __getitem__(self, key):
+        if key in self.changes:
+            return self.changes[key]
+        if key not in self._fields:
+            raise KeyError(key)
+        return getattr(self._obj, key)
+
+    def __setitem__(self, key, value):
+        if key not in self._fields:
+            raise KeyError(key)
+        self.changes[key] = value
+
+    def __delitem__(self, key):
+        self[key] = None
+
+    def __iter__(self):
+        return iter(self._fields)
+
+    def __len__(self):
+        return len(self._fields)
+
+    def current(self) -> typing.Dict[str, typing.Any]:
+        """
+        :return: fields of the object with the changes applied, nothing is copied
+        """
+        return {
+            name: self.changes[name]
+            if name in self.changes
+            else getattr(self._obj, name)
+            for name in self._fields
+        }
+
+
+class RequestView(DataclassView):
+    """
+    A view of a request. Headers, the query and the JSON body may be changed in place by callbacks,
+    so they are copied on the first access and the request that is logged stays as it was received.
+    """
+
+    MUTABLE = ("headers", "query", "bodyAsJson")
+
+    def __getitem__(self, key):
+        if key in self.MUTABLE and key not in self.changes:
+            self.changes[key] = deepcopy(getattr(self._obj, key))
+        return super().__getitem__(key)
+
+
+class ResponseView(DataclassView):
+    """
+    A view of a response. Headers and the JSON body may be changed in place by callbacks,
+    so they are copied on the first access unless the response is generated only for this request.
+    """
+
+    MUTABLE = ("headers", "bodyAsJson")
+
+    def __init__(self, response: Response):
+        super().__init__(response)
+        self._shared = getattr(response, "shared", True)
+        self._touched: typing.Set[str] = set()
+
+    def __getitem__(self, key):
+        if key in self.MUTABLE and key not in self.changes:
+            self._touched.add(key)
+            if self._shared:
+                value = getattr(self._obj, key)
+                self.changes[key] = dict(value) if key == "headers" else deepcopy(value)
+        return super().__getitem__(key)
+
+    def build(self, json_body: bool) -> Response:
+        """
+        Rebuilds the response from the changed fields only.
+        :param json_body: whether the body is serialized from bodyAsJson
+        :return: the original response if nothing has changed
+        """
+        if json_body and (
+            "bodyAsJson" in self.changes or "bodyAsJson" in self._touched
+        ):
+            fields = self.current()
+            del fields["body"]
+            return EncodedResponse(json_encoding.dumps(fields["bodyAsJson"]), **fields)
+        if not self.changes:
+            return self._obj
+        return Response(**self.current())  # type: ignore
+
+
 class CallbackManager:
     ARGS_MAP_COMMON = {
         "query": lambda request, response, storage: request["query"],
@@ -35,69 +137,158 @@ class CallbackManager:
 
     def __init__(self):
         self._callbacks = dict()
+        # a new table that callbacks are added to while scripts are loaded
+        self._loading: typing.Optional[typing.Dict] = None
+        self._watcher: typing.Optional[PeriodicCallback] = None
 
     def load(self, path):
+        """
+        Loads callback scripts from a directory. The new callbacks replace all callbacks at once
+        when every script is loaded, requests being processed keep the callbacks they started with.
+        If a script fails, the callbacks are not changed.
+        :param path: a directory with callback scripts
+        """
         if not os.path.isdir(path):
             raise FileNotFoundError(
                 f"Callback configuration directory doesn't exist: {path}"
             )
 
-        for f in glob.glob(os.path.join(path, "*.py")):
-            module_name = "callbacks.{}".format(
-                os.path.splitext(os.path.basename(f))[0]
-            )
-            logging.debug("Loading callbacks from %s to %s module", f, module_name)
-            # from https://stackoverflow.com/questions/19009932/import-arbitrary-python-source-file-python-3-3
-            spec = importlib.util.spec_from_file_location(module_name, f)
-            callbacks = importlib.util.module_from_spec(spec)
-            # even though this is an accepted response, the line below
-            # triggers a typing error. ignore types for now, but should
-            # investigate why the type does not work
-            spec.loader.exec_module(callbacks)  # type: ignore
+        self._loading = dict()
+        try:
+            for f in sorted(glob.glob(os.path.join(path, "*.py"))):
+                module_name = "callbacks.{}".format(
+                    os.path.splitext(os.path.basename(f))[0]
+                )
+                logging.debug("Loading callbacks from %s to %s module", f, module_name)
+                # from https://stackoverflow.com/questions/19009932/import-arbitrary-python-source-file-python-3-3
+                spec = importlib.util.spec_from_file_location(module_name, f)
+                callbacks = importlib.util.module_from_spec(spec)
+                # even though this is an accepted response, the line below
+                # triggers a typing error. ignore types for now, but should
+                # investigate why the type does not work
+                spec.loader.exec_module(callbacks)  # type: ignore
+            self._callbacks = self._loading
+        finally:
+            self._loading = None
 
         logging.info("Loaded %d callbacks", len(self._callbacks))
 
+    def watch(self, path, interval: float = 1.0):
+        """
+        Reloads callback scripts whenever a script in the directory is added, changed or removed.
+        Must be called from a running or a ready-to-run IOLoop.
+        :param path: a directory with callback scripts
+        :param interval: seconds between checks of the directory
+        """
+        self.unwatch()
+        modified = _modification_times(path)
+
+        def check():
+            nonlocal modified
+            current = _modification_times(path)
+            if current == modified:
+                return
+            modified = current
+            try:
+                self.load(path)
+            except Exception:
+                logger.exception("Could not reload callbacks from %s", path)
+
+        self._watcher = PeriodicCallback(check, interval * 1000)
+        self._watcher.start()
+
+    def unwatch(self):
+        if self._watcher is not None:
+            self._watcher.stop()
+            self._watcher = None
+
     def callback(self, host, method, path):
         return self._callbacks.get((host, method, path))
 
     def add_callback(self, host, method, path, format, response_type, callback):
-        args = inspect.getfullargspec(callback).args
         args_map = self.ARGS_MAP_JSON if format == "json" else self.ARGS_MAP_TEXT
-        self._callbacks[
-            (host, method, path)
-        ] = lambda request, response, storage: self._map_results(
-            response,
-            callback(
-                **{arg: args_map[arg](request, response, storage) for arg in args}
-            ),
-            format,
-            response_type,
-        )
+        try:
+            extractors = [
+                (arg, args_map[arg]) for arg in inspect.getfullargspec(callback).args
+            ]
+        except KeyError as e:
+            raise ValueError(
+                "Unknown argument %s of callback %s" % (e, callback.__name__)
+            )
+
+        def arguments(request_view, response_view, storage):
+            return {
+                arg: extractor(request_view, response_view, storage)
+                for arg, extractor in extractors
+            }
+
+        if inspect.iscoroutinefunction(callback):
+
+            async def call(request, response, storage):
+                response_view = ResponseView(response)
+                result = await callback(
+                    **arguments(RequestView(request), response_view, storage)
+                )
+                return self._map_results(response_view, result, format, response_type)
+
+        else:
+
+            def call(request, response, storage):
+                response_view = ResponseView(response)
+                result = callback(
+                    **arguments(RequestView(request), response_view, storage)
+                )
+                return self._map_results(response_view, result, format, response_type)
+
+        callbacks = self._callbacks if self._loading is None else self._loading
+        callbacks[(host, method, path)] = call
 
     def _map_results(self, response, result, format, response_type):
         if response_type == "body":
             if format == "json":
                 response["bodyAsJson"] = result
-                response["body"] = json.dumps(result)
             else:
                 response["body"] = result
-        else:
+        elif isinstance(result, Response):
+            return result
+        elif result is not response:
+            out = dict(result)
             if format == "json":
-                response["body"] = json.dumps(result)
+                encoded = json_encoding.dumps(out.get("bodyAsJson"))
+                out["body"] = encoded.decode("utf-8")
+                return EncodedResponse(encoded, **vars(ResponseBuilder.from_dict(out)))
+            return ResponseBuilder.from_dict(out)
 
-        return response
+        return response.build(format == "json")
 
-    def __call__(self, request, response, storage):
+    def __call__(
+        self, request, response, storage
+    ) -> typing.Union[Response, typing.Awaitable[Response]]:
+        """
+        Calls a callback of the endpoint of the request.
+        :return: a new response, awaitable if the callback is a coroutine function
+        """
         callback = self._callbacks.get(
             (request.host, request.method.value, request.pathname)
         )
         if callback is not None:
-            out = callback(asdict(request), asdict(response), storage)
-            return ResponseBuilder.from_dict(out)
+            if isinstance(response, StreamedResponse):
+                response = response.materialize()
+            return callback(request, response, storage)
         else:
             return response
 
 
+def _modification_times(path) -> typing.Dict[str, float]:
+    out = dict()
+    for f in glob.glob(os.path.join(path, "*.py")):
+        try:
+            out[f] = os.stat(f).st_mtime
+        except OSError:
+            pass
+    return out
+
+
 callback_manager = CallbackManager()
 
 
@@ -0,0 +1,187 @@
+import typing
+from dataclasses import dataclass
+
+import openapi_typed_2
+from openapi_typed_2 import Operation, PathItem, Reference, Schema, convert_from_openapi
+
+from hmt.serve.mock.faker.generators import Generator, SchemaCompiler
+from hmt.serve.mock.faker.response_pool import PoolConfig, get_pool_config
+from hmt.serve.mock.refs import change_ref, change_refs, get_response_body
+from hmt.serve.mock.request_validation import (
+    ParamsValidators,
+    SchemaValidator,
+    compile_body_validator,
+)
+from hmt.serve.mock.specs import OpenAPISpecification
+
+
+def build_full_schema(
+    schema: typing.Union[Schema, Reference], definitions: typing.Any
+) -> typing.Dict:
+    return {
+        **convert_from_openapi(
+            change_ref(schema) if isinstance(schema, Reference) else change_refs(schema)
+        ),
+        "definitions": definitions,
+    }
+
+
+@dataclass(frozen=True)
+class CompiledResponse:
+    """
+    A response of an operation resolved once from a spec.
+    """
+
+    code: str
+    """
+    A status code as it is written in a spec, e.g. 200 or default.
+    """
+    response: typing.Optional[openapi_typed_2.Response]
+    """
+    A response with references resolved.
+    """
+    mime_types: typing.Sequence[str]
+    """
+    All mime types of the response content.
+    """
+    content_type: typing.Optional[str]
+    """
+    A mime type that is faked, application/json or text/plain. None if none of them is supported.
+    """
+    schema: typing.Optional[typing.Dict]
+    """
+    A ready-to-use JSON schema of an application/json response. It includes all definitions from a spec.
+    """
+    generator: typing.Optional[Generator]
+    """
+    The schema compiled to a generator of fake data.
+    """
+
+    @property
+    def status_code(self) -> int:
+        return 400 if self.code == "default" else int(self.code)
+
+
+@dataclass(frozen=True)
+class CompiledOperation:
+    """
+    Everything the faker needs to know about an operation that doesn't depend on an incoming request.
+    """
+
+    spec: OpenAPISpecification
+    """
+    A spec the operation was compiled from. A cached operation is only valid for the same spec object.
+    """
+    path_item: PathItem
+    method: Operation
+    success: typing.Optional[CompiledResponse]
+    """
+    The first 2xx response, served for valid requests.
+    """
+    error: typing.Optional[CompiledResponse]
+    """
+    The default or the first 4xx response, served for invalid requests.
+    """
+    responses: typing.Sequence[CompiledResponse]
+    """
+    All responses, one of them is chosen randomly for valid requests if there is no 2xx response.
+    """
+    query_validator: SchemaValidator
+    """
+    A validator of the required query parameters.
+    """
+    header_validator: SchemaValidator
+    """
+    A validator of the required headers.
+    """
+    body_validator: typing.Optional[SchemaValidator]
+    """
+    A validator of a JSON request body. None if there is no body schema or body validation is off.
+    """
+    pool: typing.Optional[PoolConfig] = None
+    """
+    Settings of pre-generated responses. None if every response is generated for a request.
+    """
+
+
+def compile_response(
+    spec: OpenAPISpecification,
+    code: str,
+    response: typing.Any,
+    compiler: typing.Optional[SchemaCompiler] = None,
+) -> CompiledResponse:
+    resolved = get_response_body(spec.api, response)
+    if resolved is None or resolved.content is None:
+        return CompiledResponse(code, resolved, [], None, None, None)
+
+    mime_types = list(resolved.content.keys())
+    if "application/json" in resolved.content:
+        schema = resolved.content["application/json"].schema
+        if schema is None:
+            return CompiledResponse(
+                code, resolved, mime_types, "application/json", None, None
+            )
+        full_schema = build_full_schema(schema, spec.definitions)
+        return CompiledResponse(
+            code,
+            resolved,
+            mime_types,
+            "application/json",
+            full_schema,
+            (compiler or SchemaCompiler(spec.definitions)).compile(full_schema),
+        )
+    elif "text/plain" in resolved.content:
+        return CompiledResponse(code, resolved, mime_types, "text/plain", None, None)
+    return CompiledResponse(code, resolved, mime_types, None, None, None)
+
+
+def compile_operation(
+    spec: OpenAPISpecification,
+    pathname: str,
+    method_name: str,
+    validate_body: bool = False,
+    params_validators: typing.Optional[ParamsValidators] = None,
+) -> typing.Optional[CompiledOperation]:
+    """
+    Compiles an operation of a spec.
+    :param spec: an OpenAPI spec
+    :param pathname: a name of PathItem in the spec
+    :param method_name: a lowercase http method
+    :param validate_body: whether to compile a validator of a request body
+    :param params_validators: compiles validators of parameters, shared by operations of the spec
+    :return: None if the operation doesn't exist or has no responses
+    """
+    path_item = spec.api.paths[pathname]
+    method = getattr(path_item, method_name, None)
+    if method is None or method.responses is None or len(method.responses) == 0:
+        return None
+
+    if params_validators is None:
+        params_validators = ParamsValidators(spec.api)
+    compiler = SchemaCompiler(spec.definitions)
+    responses = {
+        code: compile_response(spec, code, response, compiler)
+        for code, response in method.responses.items()
+    }
+    success = next(
+        (responses[str(i)] for i in range(200, 209) if str(i) in responses), None
+    )
+    error = (
+        responses["default"]
+        if "default" in responses
+        else next(
+            (responses[str(i)] for i in range(400, 500) if str(i) in responses), None
+        )
+    )
+    return CompiledOperation(
+        spec=spec,
+        path_item=path_item,
+        method=method,
+        success=success,
+        error=error,
+        responses=list(responses.values()),
+        query_validator=params_validators.compile(False, method_name, path_item),
+        header_validator=params_validators.compile(True, method_name, path_item),
+        body_validator=compile_body_validator(spec, method) if validate_body else None,
+        pool=get_pool_config(spec.api, method),
+    )
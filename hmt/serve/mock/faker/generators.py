@@ -0,0 +1,328 @@
+import math
+import typing
+from functools import reduce
+
+LO = -99999999
+HI = 99999999
+
+
+class Generator:
+    """
+    A node of a compiled schema that generates fake data.
+    Generators are called with the faker, the FakerData of a request and the depth of the node.
+    Random values are drawn from faker._random, so a faker can make them reproducible.
+    """
+
+    __slots__ = ()
+
+    def __call__(self, faker: typing.Any, data: typing.Any, depth: int) -> typing.Any:
+        raise NotImplementedError()
+
+
+class ObjectGen(Generator):
+    __slots__ = ("properties", "required", "additional", "has_additional")
+
+    def __init__(
+        self,
+        properties: typing.Sequence[typing.Tuple[str, Generator]],
+        required: typing.FrozenSet[str],
+        additional: typing.Optional[Generator],
+        has_additional: bool,
+    ):
+        self.properties = properties
+        self.required = required
+        # random numbers are generated as additional properties if it's None
+        self.additional = additional
+        self.has_additional = has_additional
+
+    def __call__(self, faker, data, depth):
+        rnd = faker._random
+        out = {}
+        if self.has_additional:
+            for _ in range(rnd.randint(0, 10)):
+                name = faker._text_faker.name()
+                out[name] = (
+                    rnd.random()
+                    if self.additional is None
+                    else self.additional(faker, data, depth + 1)
+                )
+
+        thresh = faker._optional_threshold(0, len(self.required), depth)
+        properties = [
+            prop
+            for prop in self.properties
+            if prop[0] in self.required or rnd.random() < thresh
+        ]
+        rnd.shuffle(properties)
+        for name, generator in properties:
+            out[name] = generator(faker, data, depth + 1)
+        return out
+
+
+class RefGen(Generator):
+    """
+    A reference to a definition. The definition is compiled when it's used for the first time,
+    so recursive schemas can be compiled. Fakers can intercept references by overriding _fake_ref.
+    """
+
+    __slots__ = ("name", "_compiler", "_target")
+
+    def __init__(self, name: str, compiler: "SchemaCompiler"):
+        self.name = name
+        self._compiler = compiler
+        self._target: typing.Optional[Generator] = None
+
+    @property
+    def target(self) -> Generator:
+        if self._target is None:
+            self._target = self._compiler.compile_definition(self.name)
+        return self._target
+
+    def __call__(self, faker, data, depth):
+        return faker._fake_ref(data, self, depth)
+
+
+class ArrayGen(Generator):
+    __slots__ = ("min_items", "max_items", "items", "tuple_items")
+
+    def __init__(
+        self,
+        min_items: int,
+        max_items: typing.Optional[int],
+        items: typing.Optional[Generator],
+        tuple_items: typing.Optional[typing.Sequence[Generator]],
+    ):
+        self.min_items = min_items
+        self.max_items = max_items
+        self.items = items
+        self.tuple_items = tuple_items
+
+    def count(self, faker, depth: int) -> int:
+        mx = (
+            int(100 / math.exp(depth - 1)) if self.max_items is None else self.max_items
+        )
+        return faker._random.randint(self.min_items, mx)
+
+    def iterate(
+        self, faker, data, depth: int, count: int
+    ) -> typing.Iterator[typing.Any]:
+        """
+        Lazily generates count items of a homogeneous array, references are not intercepted.
+        """
+        items = self.items.target if isinstance(self.items, RefGen) else self.items
+        for _ in range(count):
+            yield items(faker, data, depth + 1)
+
+    def __call__(self, faker, data, depth):
+        count = self.count(faker, depth)
+
+        if self.tuple_items is not None:
+            return [item(faker, data, depth + 1) for item in self.tuple_items]
+        elif self.items is None:
+            return []
+        elif isinstance(self.items, RefGen):
+            return faker._fake_ref_array(data, self.items, depth, count)
+        else:
+            return [self.items(faker, data, depth + 1) for _ in range(count)]
+
+
+class ChoiceGen(Generator):
+    """
+    Generates one of anyOf or oneOf schemas.
+    """
+
+    __slots__ = ("choices",)
+
+    def __init__(self, choices: typing.Sequence[Generator]):
+        self.choices = choices
+
+    def __call__(self, faker, data, depth):
+        return faker._random.choice(self.choices)(faker, data, depth + 1)
+
+
+class AllOfGen(Generator):
+    __slots__ = ("parts",)
+
+    def __init__(self, parts: typing.Sequence[Generator]):
+        self.parts = parts
+
+    def __call__(self, faker, data, depth):
+        return reduce(
+            lambda a, b: {**a, **b},
+            [part(faker, data, depth + 1) for part in self.parts],
+            {},
+        )
+
+
+class StringGen(Generator):
+    __slots__ = ("enum",)
+
+    def __init__(self, enum: typing.Optional[typing.Sequence[typing.Any]]):
+        self.enum = enum
+
+    def __call__(self, faker, data, depth):
+        return (
+            faker._random.choice(self.enum)
+            if self.enum is not None
+            else faker._text_faker.name()
+        )
+
+
+class BooleanGen(Generator):
+    __slots__ = ("enum",)
+
+    def __init__(self, enum: typing.Optional[typing.Sequence[typing.Any]]):
+        self.enum = enum
+
+    def __call__(self, faker, data, depth):
+        return (
+            faker._random.choice(self.enum)
+            if self.enum is not None
+            else True
+            if faker._random.random() > 0.5
+            else False
+        )
+
+
+class IntegerGen(Generator):
+    # TODO: add exclusiveMinimum and exclusiveMaximum
+
+    __slots__ = ("minimum", "maximum", "enum")
+
+    def __init__(
+        self,
+        minimum: typing.Any,
+        maximum: typing.Any,
+        enum: typing.Optional[typing.Sequence[typing.Any]],
+    ):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.enum = enum
+
+    def __call__(self, faker, data, depth):
+        return (
+            faker._random.choice(self.enum)
+            if self.enum is not None
+            else faker._random.randint(self.minimum, self.maximum)
+        )
+
+
+class NumberGen(IntegerGen):
+    __slots__ = ()
+
+    def __call__(self, faker, data, depth):
+        return (
+            faker._random.choice(self.enum)
+            if self.enum is not None
+            else (faker._random.random() * (self.maximum - self.minimum)) + self.minimum
+        )
+
+
+class NullGen(Generator):
+    __slots__ = ()
+
+    def __call__(self, faker, data, depth):
+        return None
+
+
+class EmptyGen(Generator):
+    """
+    Generates an empty object for not schemas and unknown types.
+    """
+
+    __slots__ = ()
+
+    def __call__(self, faker, data, depth):
+        return {}
+
+
+class SchemaCompiler:
+    """
+    Compiles JSON schemas with references to #/definitions into trees of generators.
+    Each definition is compiled once.
+    """
+
+    def __init__(self, definitions: typing.Mapping[str, typing.Any]):
+        """
+        :param definitions: schemas that references point to by name
+        """
+        self._definitions = definitions
+        self._compiled: typing.Dict[str, Generator] = {}
+
+    def compile_definition(self, name: str) -> Generator:
+        if name not in self._compiled:
+            self._compiled[name] = self.compile(self._definitions[name])
+        return self._compiled[name]
+
+    def compile(self, schema: typing.Any) -> Generator:
+        """
+        Compiles a schema, checking its keywords in the same order as the faker always did.
+        :param schema: a JSON schema
+        :return: a generator of data for the schema
+        """
+        schema_type = schema.get("type")
+        if schema_type == "array":
+            return self._compile_array(schema)
+        elif "anyOf" in schema:
+            return ChoiceGen([self.compile(x) for x in schema["anyOf"]])
+        elif "allOf" in schema:
+            return AllOfGen([self.compile(x) for x in schema["allOf"]])
+        elif "oneOf" in schema:
+            return ChoiceGen([self.compile(x) for x in schema["oneOf"]])
+        elif "not" in schema:
+            # TODO - make this work
+            return EmptyGen()
+        elif "$ref" in schema:
+            return self._compile_ref(schema)
+        elif "type" not in schema or schema_type == "object":
+            return self._compile_object(schema)
+        elif schema_type == "string":
+            return StringGen(schema.get("enum"))
+        elif schema_type == "integer":
+            return IntegerGen(
+                schema.get("minimum", LO), schema.get("maximum", HI), schema.get("enum")
+            )
+        elif schema_type == "boolean":
+            return BooleanGen(schema.get("enum"))
+        elif schema_type == "null":
+            return NullGen()
+        elif schema_type == "number":
+            return NumberGen(
+                schema.get("minimum", LO), schema.get("maximum", HI), schema.get("enum")
+            )
+        return EmptyGen()
+
+    def _compile_ref(self, schema: typing.Any) -> RefGen:
+        return RefGen(schema["$ref"].split("/")[2], self)
+
+    def _compile_object(self, schema: typing.Any) -> ObjectGen:
+        additional = schema.get("additionalProperties", False)
+        return ObjectGen(
+            [
+                (name, self.compile(property_schema))
+                for name, property_schema in schema.get("properties", {}).items()
+            ],
+            frozenset(schema.get("required", [])),
+            None if isinstance(additional, bool) else self.compile(additional),
+            additional is not False,
+        )
+
+    def _compile_array(self, schema: typing.Any) -> ArrayGen:
+        items = schema.get("items")
+        if isinstance(items, list):
+            return ArrayGen(
+                schema.get("minItems", 0),
+                schema.get("maxItems"),
+                None,
+                [self.compile(x) for x in items],
+            )
+        return ArrayGen(
+            schema.get("minItems", 0),
+            schema.get("maxItems"),
+            None
+            if items is None
+            else self._compile_ref(items)
+            if "$ref" in items
+            else self.compile(items),
+            None,
+        )
@@ -0,0 +1,117 @@
+import random
+import typing
+from dataclasses import dataclass
+
+from http_types import Response
+from tornado.ioloop import IOLoop
+
+from hmt.serve.utils.opanapi_ext import get_x
+
+POOL_EXTENSION = "x-hmt-pool"
+ROUND_ROBIN = "round-robin"
+RANDOM = "random"
+
+
+@dataclass(frozen=True)
+class PoolConfig:
+    """
+    Settings of pre-generated responses of an operation, read from the x-hmt-pool extension.
+    """
+
+    size: int
+    """
+    A number of responses generated for every status code.
+    """
+    order: str = ROUND_ROBIN
+    """
+    round-robin or random.
+    """
+    fresh: float = 0.0
+    """
+    A probability that a served response is replaced by a new one in the background.
+    """
+
+
+def get_pool_config(api: typing.Any, method: typing.Any) -> typing.Optional[PoolConfig]:
+    """
+    Reads the x-hmt-pool extension of an operation or, if it's missing, of the whole spec.
+    The extension is either a pool size or an object with size, order and fresh fields.
+    :param api: an OpenAPI object
+    :param method: an operation
+    :return: None if responses of the operation are not pooled
+    """
+    value = get_x(method, POOL_EXTENSION, get_x(api, POOL_EXTENSION))
+    if value is None or value is False:
+        return None
+    if isinstance(value, int) and not isinstance(value, bool):
+        return PoolConfig(size=value) if value > 0 else None
+    if not isinstance(value, dict):
+        raise ValueError("%s must be a size or an object" % POOL_EXTENSION)
+
+    config = PoolConfig(
+        size=value.get("size", 100),
+        order=value.get("order", ROUND_ROBIN),
+        fresh=value.get("fresh", 0.0),
+    )
+    if config.order not in (ROUND_ROBIN, RANDOM):
+        raise ValueError(
+            "%s order must be %s or %s" % (POOL_EXTENSION, ROUND_ROBIN, RANDOM)
+        )
+    return config if config.size > 0 else None
+
+
+class ResponsePool:
+    """
+    Pre-generated responses served instead of faking a new response for every request.
+    The first response is generated on the first use, the rest of the pool is filled in
+    the background from the IOLoop, one response per iteration.
+    """
+
+    def __init__(self, config: PoolConfig, generate: typing.Callable[[], Response]):
+        """
+        :param config: settings of the pool
+        :param generate: makes a new response with a serialized body
+        """
+        self._config = config
+        self._generate = generate
+        self._responses: typing.List[Response] = []
+        self._next = 0
+        self._filling = False
+
+    def __len__(self):
+        return len(self._responses)
+
+    def fill(self):
+        """
+        Fills the whole pool synchronously.
+        """
+        while len(self._responses) < self._config.size:
+            self._responses.append(self._generate())
+
+    def _fill_one(self):
+        if len(self._responses) < self._config.size:
+            self._responses.append(self._generate())
+        if len(self._responses) < self._config.size:
+            IOLoop.current().add_callback(self._fill_one)
+        else:
+            self._filling = False
+
+    def _refresh(self, index: int):
+        self._responses[index] = self._generate()
+
+    def take(self) -> Response:
+        if len(self._responses) == 0:
+            self._responses.append(self._generate())
+        if len(self._responses) < self._config.size and not self._filling:
+            self._filling = True
+            IOLoop.current().add_callback(self._fill_one)
+
+        if self._config.order == RANDOM:
+            index = random.randrange(len(self._responses))
+        else:
+            index = self._next % len(self._responses)
+            self._next = index + 1
+
+        if self._config.fresh > 0 and random.random() < self._config.fresh:
+            IOLoop.current().add_callback(self._refresh, index)
+        return self._responses[index]
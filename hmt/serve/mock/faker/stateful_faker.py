@@ -1,11 +1,14 @@
 import typing
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 
 from http_types import Request
-from openapi_typed_2 import Any, Operation
+from openapi_typed_2 import Operation
 
+from hmt.serve.mock.faker.generators import RefGen
 from hmt.serve.mock.faker.stateless_faker import FakerData, StatelessFaker
+from hmt.serve.mock.scope import Scope, request_scope
 from hmt.serve.mock.storage.entity import Entity
+from hmt.serve.utils.json_encoding import EncodedResponse
 from hmt.serve.utils.opanapi_ext import ApiOperation, get_x
 
 
@@ -23,6 +26,10 @@ class StatefulFakerData(FakerData):
     """
     It is preserved for requests that do updates and returns updated data
     """
+    links: typing.List[str] = field(default_factory=list)
+    """
+    Link headers of pages of entities collected while the response is generated
+    """
 
 
 class StatefulFaker(StatelessFaker):
@@ -32,9 +39,28 @@ class StatefulFaker(StatelessFaker):
     it works the same way as the StatelessFaker.
     """
 
-    def __init__(self, mock_data_store):
-        super().__init__()
+    def __init__(
+        self,
+        mock_data_store,
+        validate_body: bool = False,
+        seed: typing.Optional[int] = None,
+        cache_size: int = 1024,
+        stream_threshold: typing.Optional[int] = None,
+        scope: typing.Optional[Scope] = None,
+    ):
+        """
+        :param mock_data_store: storages of entities
+        :param scope: the scope set with the admin server, it selects storages of requests without the scope header
+        """
+        super().__init__(validate_body, seed, cache_size, stream_threshold)
         self._mock_data_store = mock_data_store
+        self._scope = scope
+
+    def _can_reuse(self, faker_data: FakerData) -> bool:
+        return (
+            get_x(faker_data.spec.api.paths[faker_data.path_item], "x-hmt-entity")
+            is None
+        )
 
     def _fake_json(
         self, status_code: int, headers: typing.Mapping[str, str], faker_data: FakerData
@@ -43,7 +69,9 @@ class StatefulFaker(StatelessFaker):
             faker_data.spec.api.paths[faker_data.path_item], "x-hmt-entity"
         )
         entity: typing.Optional[Entity] = (
-            self._mock_data_store[faker_data.spec.source].get_entity(entity_name)
+            self._mock_data_store.namespace(
+                request_scope(faker_data.request, self._scope)
+            )[faker_data.spec.source].get_entity(entity_name)
             if entity_name is not None
             else None
         )
@@ -58,15 +86,26 @@ class StatefulFaker(StatelessFaker):
             method=faker_data.method,
             schema=faker_data.schema,
             request=faker_data.request,
+            generator=faker_data.generator,
             updated_data=updated_data,
             entity=entity,
         )
 
-        return super()._fake_json(status_code, headers, faker_data)
+        out = super()._fake_json(status_code, headers, faker_data)
+        if len(faker_data.links) > 0:
+            out = EncodedResponse(
+                out.encoded,
+                statusCode=out.statusCode,
+                bodyAsJson=out.bodyAsJson,
+                headers={**out.headers, "Link": ", ".join(faker_data.links)},
+                timestamp=out.timestamp,
+            )
+        # the body may hold entities of the store
+        out.shared = entity is not None
+        return out
 
-    def _fake_ref(self, faker_data: StatefulFakerData, schema: Any, depth: int):
-        name = schema["$ref"].split("/")[2]
-        if self._matches_entity(faker_data.entity, name):
+    def _fake_ref(self, faker_data: StatefulFakerData, ref: RefGen, depth: int):
+        if self._matches_entity(faker_data.entity, ref.name):
             if faker_data.updated_data is not None:
                 return faker_data.updated_data
             else:
@@ -74,21 +113,20 @@ class StatefulFaker(StatelessFaker):
                     faker_data.path_item, faker_data.request
                 )
         else:
-            return self._fake_it(
-                faker_data, faker_data.schema["definitions"][name], depth
-            )
+            return super()._fake_ref(faker_data, ref, depth)
 
     def _fake_ref_array(
-        self, faker_data: StatefulFakerData, schema: Any, depth: int, count: int
+        self, faker_data: StatefulFakerData, ref: RefGen, depth: int, count: int
     ):
-        name = schema["$ref"].split("/")[2]
-        if self._matches_entity(faker_data.entity, name):
-            return faker_data.entity.query(faker_data.path_item, faker_data.request)
+        if self._matches_entity(faker_data.entity, ref.name):
+            items, link = faker_data.entity.query_page(
+                faker_data.path_item, faker_data.request
+            )
+            if link is not None:
+                faker_data.links.append(link)
+            return items
         else:
-            return [
-                self._fake_it(faker_data, faker_data.schema["definitions"][name], depth)
-                for _ in range(count)
-            ]
+            return super()._fake_ref_array(faker_data, ref, depth, count)
 
     def _update_data(
         self,
@@ -1,26 +1,30 @@
-import json
+import hashlib
 import math
 import random
 import typing
+from collections import OrderedDict
 from dataclasses import dataclass
-from functools import reduce
 from typing import Any, Mapping, Sequence, Union, cast
 
-import openapi_typed_2
 from faker import Faker
 from http_types import Request, Response
-from openapi_typed_2 import Operation, PathItem, Reference, Schema, convert_from_openapi
+from openapi_typed_2 import Operation
 
+from hmt.serve.mock.faker.compiled_operation import (
+    CompiledOperation,
+    CompiledResponse,
+    compile_operation,
+)
 from hmt.serve.mock.faker.faker_base import FakerBase
 from hmt.serve.mock.faker.faker_exception import FakerException
-from hmt.serve.mock.refs import get_response_body
-from hmt.serve.mock.request_validation import (
-    change_ref,
-    change_refs,
-    validate_header_params,
-    validate_query_params,
-)
+from hmt.serve.mock.faker.generators import HI, LO, ArrayGen, Generator, RefGen
+from hmt.serve.mock.faker.response_pool import PoolConfig, ResponsePool, get_pool_config
+from hmt.serve.mock.request_validation import ParamsValidators, params_to_validate
+from hmt.serve.mock.routes import methods
 from hmt.serve.mock.specs import OpenAPISpecification
+from hmt.serve.utils import json_encoding
+from hmt.serve.utils.json_encoding import EncodedResponse, StreamedResponse
+from hmt.serve.utils.metrics import MATCH, VALIDATION, Stopwatch
 
 
 @dataclass(frozen=True)
@@ -51,6 +55,10 @@ class FakerData:
     """
     An incoming http request
     """
+    generator: Generator
+    """
+    The top-level schema compiled to a generator.
+    """
 
 
 class StatelessFaker(FakerBase):
@@ -60,9 +68,11 @@ class StatelessFaker(FakerBase):
     """
 
     _text_faker: Faker
+    # (request seed, status code) -> a response cached in the seeded mode
+    _responses: "OrderedDict[typing.Tuple[int, str], typing.Tuple[CompiledResponse, Response]]"
 
-    _LO = -99999999
-    _HI = 99999999
+    _LO = LO
+    _HI = HI
 
     max_depth = 10
 
@@ -72,91 +82,261 @@ class StatelessFaker(FakerBase):
         "(ie asking for a 201 response when it only has 200 and 400)."
     )
 
-    def __init__(self):
+    def __init__(
+        self,
+        validate_body: bool = False,
+        seed: typing.Optional[int] = None,
+        cache_size: int = 1024,
+        stream_threshold: typing.Optional[int] = None,
+    ):
+        """
+        :param validate_body: whether to validate JSON request bodies
+        :param seed: makes responses to equal requests equal if it's not None
+        :param cache_size: a number of responses cached in the seeded mode
+        :param stream_threshold: a number of items from which top-level arrays are streamed, None disables streaming
+        """
         self._text_faker = Faker()
+        self._validate_body = validate_body
+        self._seed = seed
+        self._random: typing.Any = random if seed is None else random.Random(seed)
+        self._cache_size = cache_size
+        self._stream_threshold = stream_threshold
+        self._responses = OrderedDict()
+        self._operations: typing.Dict[
+            typing.Tuple[str, str, str], CompiledOperation
+        ] = {}
+        # spec source -> (the spec, validators of its parameters)
+        self._params_validators: typing.Dict[
+            str, typing.Tuple[OpenAPISpecification, ParamsValidators]
+        ] = {}
+        self._pools: typing.Dict[
+            typing.Tuple[str, str, str, str],
+            typing.Tuple[CompiledResponse, ResponsePool],
+        ] = {}
 
     def process(
-        self, pathname: str, spec: OpenAPISpecification, request: Request,
+        self,
+        pathname: str,
+        spec: OpenAPISpecification,
+        request: Request,
+        stopwatch: typing.Optional[Stopwatch] = None,
     ) -> Any:
-        path_candidate = spec.api.paths[pathname]
+        """
+        :param stopwatch: times matching the request to a response and validating it
+        """
+        operation = self._compiled_operation(spec, pathname, request.method.value)
 
-        method = getattr(path_candidate, request.method.value, None)
-
-        if method is None:
+        if operation is None:
             raise FakerException(self.responses_error)
 
-        if method.responses is None or len(method.responses) == 0:
-            raise FakerException(self.responses_error)
+        request_seed = None
+        if self._seed is not None:
+            request_seed = self._request_seed(spec, pathname, request)
+            self._random.seed(request_seed)
+            self._text_faker.seed_instance(request_seed)
 
         status_code, response = self._get_response(
-            request, spec, method, path_candidate
+            request, operation, stopwatch or Stopwatch()
         )
-        if response is None:
+        if response is None or response.response is None:
             raise FakerException(self.responses_error)
 
+        # TODO: can't handle response headers yet, need to fix
         headers: Mapping[str, str] = {}
-        if response.headers is not None:
-            # TODO: can't handle references yet, need to fix
-            headers = (
-                {}
-            )  # { k: (faker(v['schema'], v['schema'], 0) if 'schema' in v else '***') for k,v in headers.items() }
-        if (response.content is None) or len(response.content.items()) == 0:
+        if len(response.mime_types) == 0:
             return self._empty_response(status_code, headers)
 
-        if "application/json" in response.content:
+        if response.content_type == "application/json":
             ct: Mapping[str, str] = {"Content-Type": "application/json"}
             new_headers: Mapping[str, str] = {
                 **headers,
                 **ct,
             }
-            content = response.content["application/json"]
-            if content.schema is None:
+            if response.schema is None:
                 return self._empty_response(status_code, new_headers)
 
             faker_data = FakerData(
                 spec=spec,
                 path_item=pathname,
-                method=method,
-                schema=self._build_full_schema(content.schema, spec.definitions),
+                method=operation.method,
+                schema=response.schema,
                 request=request,
+                generator=response.generator,
             )
 
+            if request_seed is not None and self._can_reuse(faker_data):
+                return self._cached_response(
+                    request_seed,
+                    response,
+                    lambda: self._fake_shared_json(
+                        status_code, new_headers, faker_data
+                    ),
+                )
+
+            if operation.pool is not None and self._can_reuse(faker_data):
+                return self._response_pool(
+                    operation, pathname, request.method.value, response, faker_data
+                ).take()
+
+            if self._stream_threshold is not None and request_seed is None:
+                return self._fake_json_stream(status_code, new_headers, faker_data)
+
             return self._fake_json(status_code, new_headers, faker_data)
 
-        elif "text/plain" in response.content:
+        elif response.content_type == "text/plain":
             return self._fake_text_response(status_code, headers)
         else:
             raise FakerException(
                 "Could not produce content for these mime types %s"
-                % str(response.content.keys())
+                % str(response.mime_types)
             )
 
-    def _get_response(
-        self,
-        request: Request,
-        spec: typing.Optional[OpenAPISpecification],
-        method: Operation,
-        path_candidate: PathItem,
-    ) -> typing.Tuple[int, typing.Optional[openapi_typed_2.Response]]:
-        if self._validate_request(
-            request, cast(OpenAPISpecification, spec), method, path_candidate
+    def _compiled_operation(
+        self, spec: OpenAPISpecification, pathname: str, method_name: str
+    ) -> typing.Optional[CompiledOperation]:
+        key = (spec.source, pathname, method_name)
+        if key in self._operations and self._operations[key].spec is spec:
+            return self._operations[key]
+
+        params = self._params_validators.get(spec.source)
+        if params is None or params[0] is not spec:
+            params = self._params_validators[spec.source] = (
+                spec,
+                ParamsValidators(spec.api),
+            )
+        operation = compile_operation(
+            spec, pathname, method_name, self._validate_body, params[1]
+        )
+        if operation is not None:
+            self._operations[key] = operation
+        return operation
+
+    def clear_compiled_operations(self):
+        """
+        Drops all compiled operations and response pools.
+        They are also recompiled when a spec with the same source is replaced.
+        """
+        self._operations.clear()
+        self._params_validators.clear()
+        self._pools.clear()
+        self._responses.clear()
+
+    def reseed(self):
+        """
+        Draws a new random state of generated text, e.g. in a forked process that inherited the state of its parent.
+        Does nothing in the seeded mode, where responses depend only on requests.
+        """
+        if self._seed is None:
+            self._text_faker.seed_instance()
+
+    def _can_reuse(self, faker_data: FakerData) -> bool:
+        """
+        Whether a generated response can be served again, e.g. from a pool or a cache.
+        """
+        return True
+
+    def _request_seed(
+        self, spec: OpenAPISpecification, pathname: str, request: Request
+    ) -> int:
+        digest = hashlib.sha256()
+        for part in (
+            str(self._seed),
+            spec.source,
+            pathname,
+            request.method.value,
+            request.path,
+            request.body or "",
         ):
-            for i in range(200, 209):
-                code = str(i)
-                if code in method.responses:
-                    return i, get_response_body(spec.api, method.responses[code])
+            digest.update(part.encode())
+            digest.update(b"\0")
+        return int.from_bytes(digest.digest()[:8], "big")
+
+    def _cached_response(
+        self,
+        request_seed: int,
+        response: CompiledResponse,
+        generate: typing.Callable[[], Response],
+    ) -> Response:
+        key = (request_seed, response.code)
+        cached = self._responses.get(key)
+        if cached is not None and cached[0] is response:
+            self._responses.move_to_end(key)
+            return cached[1]
+
+        out = generate()
+        self._responses[key] = (response, out)
+        self._responses.move_to_end(key)
+        if len(self._responses) > self._cache_size:
+            self._responses.popitem(last=False)
+        return out
+
+    def _response_pool(
+        self,
+        operation: CompiledOperation,
+        pathname: str,
+        method_name: str,
+        response: CompiledResponse,
+        faker_data: FakerData,
+    ) -> ResponsePool:
+        key = (operation.spec.source, pathname, method_name, response.code)
+        cached = self._pools.get(key)
+        if cached is None or cached[0] is not response:
+            status_code = response.status_code
+            headers = {"Content-Type": "application/json"}
+            pool = ResponsePool(
+                typing.cast(PoolConfig, operation.pool),
+                lambda: self._fake_shared_json(status_code, headers, faker_data),
+            )
+            cached = (response, pool)
+            self._pools[key] = cached
+        return cached[1]
+
+    def fill_pools(self, specs: typing.Iterable[OpenAPISpecification]):
+        """
+        Generates all responses of operations with the x-hmt-pool extension, e.g. before a server starts.
+        Other operations are compiled when they are requested for the first time.
+        :param specs: OpenAPI specs
+        """
+        for spec in specs:
+            for pathname, path_item in spec.api.paths.items():
+                for method_name in methods:
+                    method = getattr(path_item, method_name, None)
+                    if method is None or get_pool_config(spec.api, method) is None:
+                        continue
+                    operation = self._compiled_operation(spec, pathname, method_name)
+                    if operation is None or operation.pool is None:
+                        continue
+                    for response in operation.responses:
+                        if response.generator is None:
+                            continue
+                        faker_data = FakerData(
+                            spec=spec,
+                            path_item=pathname,
+                            method=operation.method,
+                            schema=typing.cast(typing.Dict, response.schema),
+                            request=None,
+                            generator=response.generator,
+                        )
+                        if self._can_reuse(faker_data):
+                            self._response_pool(
+                                operation, pathname, method_name, response, faker_data
+                            ).fill()
+
+    def _get_response(
+        self, request: Request, operation: CompiledOperation, stopwatch: Stopwatch
+    ) -> typing.Tuple[int, typing.Optional[CompiledResponse]]:
+        stopwatch.lap(MATCH)
+        valid = self._validate_request(request, operation)
+        stopwatch.lap(VALIDATION)
+        if valid:
+            if operation.success is not None:
+                return operation.success.status_code, operation.success
 
-            status_code, response = random.choice([r for r in method.responses.items()])
-            status_code = 400 if status_code == "default" else int(status_code)
-            return status_code, get_response_body(spec.api, response)
+            response = self._random.choice(operation.responses)
+            return response.status_code, response
 
-        else:
-            if "default" in method.responses:
-                return 400, get_response_body(spec.api, method.responses["default"])
-            for i in range(400, 500):
-                code = str(i)
-                if code in method.responses:
-                    return i, get_response_body(spec.api, method.responses[code])
+        elif operation.error is not None:
+            return operation.error.status_code, operation.error
 
         return 500, None
 
@@ -188,201 +368,84 @@ class StatelessFaker(FakerBase):
         headers: typing.Mapping[str, str],
         faker_data: FakerData,
     ):
-        bodyAsJson = self._fake_it(faker_data, faker_data.schema, 0)
+        bodyAsJson = faker_data.generator(self, faker_data, 1)
 
-        return Response(
+        return EncodedResponse(
+            json_encoding.dumps(bodyAsJson),
             statusCode=status_code,
-            body=json.dumps(bodyAsJson),
             bodyAsJson=bodyAsJson,
             headers=headers,
             timestamp=None,
         )
 
-    def _build_full_schema(
-        self, schema: typing.Union[Schema, Reference], definitions: typing.Any
-    ) -> typing.Dict:
-        return {
-            **convert_from_openapi(
-                change_ref(schema)
-                if isinstance(schema, Reference)
-                else change_refs(schema)
-            ),
-            "definitions": definitions,
-        }
-
-    def _optional_threshold(self, properties_count, required_count, depth):
-        return 0.4 if depth < 3 else 0.4 / math.exp(depth - 2) if depth < 10 else 0
-
-    def _fake_object(self, faker_data: FakerData, schema: Any, depth: int) -> Any:
-        addls = (
-            {}
-            if "additionalProperties" not in schema
-            else {
-                k: v
-                for k, v in [
-                    (
-                        self._text_faker.name(),
-                        random.random()
-                        if (isinstance(schema["additionalProperties"], bool))
-                        and (schema["additionalProperties"] is True)
-                        else self._fake_it(
-                            faker_data, schema["additionalProperties"], depth
-                        ),
-                    )
-                    for x in range(random.randint(0, 10))
-                ]
-            }
-        )
-        properties = []
-        required = set(schema.get("required", []))
-        thresh = self._optional_threshold(len(properties), len(required), depth)
-        properties = [
-            prop
-            for prop in schema.get("properties", {}).keys()
-            if prop in required or random.random() < thresh
-        ]
-        random.shuffle(properties)
-
-        return {
-            **addls,
-            **{
-                k: v
-                for k, v in [
-                    (p, self._fake_it(faker_data, schema["properties"][p], depth))
-                    for p in properties
-                ]
-            },
-        }
-
-    def _fake_array(self, faker_data: FakerData, schema: Any, depth: int) -> Any:
-        mn = 0 if "minItems" not in schema else schema["minItems"]
-        mx = (
-            int(100 / math.exp(depth - 1))
-            if "maxItems" not in schema
-            else schema["maxItems"]
-        )
-        count = random.randint(mn, mx)
-
-        if "items" not in schema:
-            return []
-        elif isinstance(schema["items"], list):
-            return [self._fake_it(faker_data, x, depth) for x in schema["items"]]
-        else:
-            items_schema = schema["items"]
-            if "$ref" in items_schema:
-                return self._fake_ref_array(faker_data, items_schema, depth, count)
-            else:
-                return [
-                    self._fake_it(faker_data, schema["items"], depth)
-                    for _ in range(count)
-                ]
-
-    def _fake_any_of(self, faker_data: FakerData, schema: Any, depth: int) -> Any:
-        return self._fake_it(faker_data, random.choice(schema["anyOf"]), depth)
-
-    def _fake_all_of(self, faker_data: FakerData, schema: Any, depth: int) -> Any:
-        return reduce(
-            lambda a, b: {**a, **b},
-            [self._fake_it(faker_data, x, depth) for x in schema["allOf"]],
-            {},
-        )
-
-    def _fake_one_of(self, faker_data: FakerData, schema: Any, depth: int) -> Any:
-        return self._fake_it(faker_data, random.choice(schema["oneOf"]), depth)
-
-    # TODO - make this work
-    def _fake_not(self, faker_data: FakerData, schema: Any, depth: int) -> Any:
-        return {}
-
-    # TODO - make this not suck
-
-    def _fake_string(self, schema: Any) -> str:
-        return (
-            random.choice(schema["enum"])
-            if "enum" in schema
-            else self._text_faker.name()
-        )
+    def _fake_shared_json(
+        self,
+        status_code: int,
+        headers: typing.Mapping[str, str],
+        faker_data: FakerData,
+    ):
+        """
+        Generates a response that is served more than once.
+        """
+        out = self._fake_json(status_code, headers, faker_data)
+        out.shared = True
+        return out
+
+    def _fake_json_stream(
+        self,
+        status_code: int,
+        headers: typing.Mapping[str, str],
+        faker_data: FakerData,
+    ):
+        """
+        Streams a top-level array of at least stream_threshold items of a stateless response.
+        Other responses are generated at once.
+        """
+        generator = faker_data.generator
+        if (
+            not isinstance(generator, ArrayGen)
+            or generator.items is None
+            or not self._can_reuse(faker_data)
+        ):
+            return self._fake_json(status_code, headers, faker_data)
+
+        count = generator.count(self, 1)
+        items = generator.iterate(self, faker_data, 1, count)
+        if count < typing.cast(int, self._stream_threshold):
+            bodyAsJson = list(items)
+            return EncodedResponse(
+                json_encoding.dumps(bodyAsJson),
+                statusCode=status_code,
+                bodyAsJson=bodyAsJson,
+                headers=headers,
+                timestamp=None,
+            )
 
-    def _fake_boolean(self, schema: Any) -> bool:
-        return (
-            random.choice(schema["enum"])
-            if "enum" in schema
-            else True
-            if random.random() > 0.5
-            else False
+        return StreamedResponse(
+            json_encoding.dumps_array(items),
+            statusCode=status_code,
+            bodyAsJson=None,
+            headers=headers,
+            timestamp=None,
         )
 
-    # TODO: add exclusiveMinimum and exclusiveMaximum
-
-    def _fake_integer(self, schema: Any) -> int:
-        mn = self._LO if "minimum" not in schema else schema["minimum"]
-        mx = self._HI if "maximum" not in schema else schema["maximum"]
-        return (
-            random.choice(schema["enum"])
-            if "enum" in schema
-            else random.randint(mn, mx)
-        )
+    def _optional_threshold(self, properties_count, required_count, depth):
+        return 0.4 if depth < 3 else 0.4 / math.exp(depth - 2) if depth < 10 else 0
 
-    def _fake_ref(self, faker_data: FakerData, schema: Any, depth: int):
-        name = schema["$ref"].split("/")[2]
-        return self._fake_it(faker_data, faker_data.schema["definitions"][name], depth)
+    def _fake_ref(self, faker_data: FakerData, ref: RefGen, depth: int) -> Any:
+        return ref.target(self, faker_data, depth + 1)
 
     def _fake_ref_array(
-        self, faker_data: FakerData, schema: Any, depth: int, count: int
-    ):
-        name = schema["$ref"].split("/")[2]
-        return [
-            self._fake_it(faker_data, faker_data.schema["definitions"][name], depth)
-            for _ in range(count)
-        ]
-
-    def _fake_null(self) -> None:
-        return None
-
-    def _fake_number(self, schema: Any) -> float:
-        mn = self._LO if "minimum" not in schema else schema["minimum"]
-        mx = self._HI if "maximum" not in schema else schema["maximum"]
-        return (
-            random.choice(schema["enum"])
-            if "enum" in schema
-            else (random.random() * (mx - mn)) + mn
-        )
-
-    def _fake_it(self, faker_data: FakerData, schema: Any, depth: int) -> Any:
-        depth += 1
-        return (
-            self._fake_array(faker_data, schema, depth)
-            if ("type" in schema) and (schema["type"] == "array")
-            else self._fake_any_of(faker_data, schema, depth)
-            if "anyOf" in schema
-            else self._fake_all_of(faker_data, schema, depth)
-            if "allOf" in schema
-            else self._fake_one_of(faker_data, schema, depth)
-            if "oneOf" in schema
-            else self._fake_not(faker_data, schema, depth)
-            if "not" in schema
-            else self._fake_ref(faker_data, schema, depth)
-            if "$ref" in schema
-            else self._fake_object(faker_data, schema, depth)
-            if ("type" not in schema) or (schema["type"] == "object")
-            else self._fake_string(schema)
-            if schema["type"] == "string"
-            else self._fake_integer(schema)
-            if schema["type"] == "integer"
-            else self._fake_boolean(schema)
-            if schema["type"] == "boolean"
-            else self._fake_null()
-            if schema["type"] == "null"
-            else self._fake_number(schema)
-            if schema["type"] == "number"
-            else {}
-        )
+        self, faker_data: FakerData, ref: RefGen, depth: int, count: int
+    ) -> Any:
+        return [ref.target(self, faker_data, depth + 1) for _ in range(count)]
 
-    def _validate_request(
-        self, request: Request, spec: OpenAPISpecification, op: Operation, p: PathItem,
-    ):
+    def _validate_request(self, request: Request, operation: CompiledOperation):
         return (
-            validate_query_params(request, spec.api, p)
-            and validate_header_params(request, spec.api, p)
-            # and validate_body(request, spec, op)
+            operation.query_validator(params_to_validate(False, request))
+            and operation.header_validator(params_to_validate(True, request))
+            and (
+                operation.body_validator is None
+                or operation.body_validator(request.bodyAsJson)
+            )
         )
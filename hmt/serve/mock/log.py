@@ -1,12 +1,15 @@
 import json
 import os
 import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
-from typing import Optional, Sequence
+from typing import Any, Deque, List, Optional, Sequence, Tuple
 
 from http_types import HttpExchange, HttpExchangeWriter, Request, Response
+from tornado.ioloop import IOLoop
 
-from .scope import Scope
+from .scope import Scope, request_scope
 
 
 @dataclass
@@ -26,60 +29,306 @@ class AbstractSink:
     def write(self, interactions):
         pass
 
+    def append(self, interaction, interactions):
+        """
+        Called for every new interaction. By default, the whole log is written.
+        :param interaction: the new interaction in the json format
+        :param interactions: all logged interactions including the new one
+        """
+        self.write(interactions)
+
+    def close(self):
+        pass
+
 
 class NoSink(AbstractSink):
     def write(self, interactions):
         pass
 
 
-class FileSink(AbstractSink):
-    def __init__(self, log_dir: str):
+class RotatingFile:
+    """
+    A log file that is replaced by a new numbered file once it gets too large or too old,
+    e.g. 123.log.json is followed by 123-1.log.json, 123-2.log.json etc.
+    """
+
+    def __init__(
+        self,
+        log_dir: str,
+        log_file_name: str,
+        max_bytes: Optional[int] = None,
+        max_age: Optional[float] = None,
+    ):
+        """
+        :param log_dir: a directory of log files, created if missing
+        :param log_file_name: a name of the first file
+        :param max_bytes: a maximum size of a file
+        :param max_age: a maximum number of seconds a file is written to
+        """
+        if not os.path.exists(log_dir):
+            os.mkdir(log_dir)
         self._dir = log_dir
-        if not os.path.exists(self._dir):
-            os.mkdir(self._dir)
-        self._log_file_name = "%d.log.json" % int(time.time() * 1000)
+        self._stem, dot, self._extension = log_file_name.partition(".")
+        self._extension = dot + self._extension
+        self._max_bytes = max_bytes
+        self._max_age = max_age
+        self._index = 0
+        self._opened = time.time()
+
+    @property
+    def path(self) -> str:
+        suffix = "" if self._index == 0 else "-%d" % self._index
+        return os.path.join(self._dir, self._stem + suffix + self._extension)
+
+    def should_rotate(self, size: int) -> bool:
+        """
+        :param size: a size the file would have after the next write
+        :return: whether the next write should go to a new file
+        """
+        return (self._max_bytes is not None and size > self._max_bytes) or (
+            self._max_age is not None and time.time() - self._opened > self._max_age
+        )
+
+    def rotate(self):
+        self._index += 1
+        self._opened = time.time()
+
+
+class FileSink(AbstractSink):
+    """
+    Writes interactions to a JSON file. Every interaction is appended to the array in the file,
+    which is replaced by a new file after max_entries interactions, max_bytes or max_age.
+    """
+
+    def __init__(
+        self,
+        log_dir: str,
+        log_file_name: Optional[str] = None,
+        max_bytes: Optional[int] = None,
+        max_age: Optional[float] = None,
+        max_entries: Optional[int] = None,
+    ):
+        self._file = RotatingFile(
+            log_dir,
+            log_file_name or "%d.log.json" % int(time.time() * 1000),
+            max_bytes,
+            max_age,
+        )
+        self._max_entries = max_entries
+        # the number of interactions and the size of the current file
+        self._entries = 0
+        self._size = 0
+
+    @property
+    def path(self) -> str:
+        return self._file.path
 
     def write(self, interactions):
-        with open(os.path.join(self._dir, self._log_file_name), "w") as logfile:
-            logfile.write(json.dumps(interactions, indent=2))
+        with open(self._file.path, "w") as logfile:
+            logfile.write(json.dumps(list(interactions), indent=2))
+
+    def append(self, interaction, interactions):
+        # the interaction as an item of an array indented like json.dumps(..., indent=2)
+        item = json.dumps([interaction], indent=2)[2:-2].encode()
+        if self._entries > 0 and (
+            (self._max_entries is not None and self._entries >= self._max_entries)
+            or self._file.should_rotate(self._size + len(item) + 2)
+        ):
+            self._file.rotate()
+            self._entries = 0
+
+        if self._entries == 0:
+            content = b"[\n" + item + b"\n]"
+            with open(self._file.path, "wb") as logfile:
+                logfile.write(content)
+            self._size = len(content)
+        else:
+            # overwrite the closing bracket
+            with open(self._file.path, "r+b") as logfile:
+                logfile.seek(self._size - 2)
+                logfile.write(b",\n" + item + b"\n]")
+            self._size += len(item) + 2
+        self._entries += 1
+
+
+class JsonLinesSink(AbstractSink):
+    """
+    Appends interactions to a JSON lines file. Interactions are buffered and written in batches
+    after flush_interval seconds or when batch_size interactions are buffered.
+    If background is True, batches are serialized and written by a separate thread, off the IOLoop.
+    Files are rotated by max_bytes or max_age.
+    """
+
+    def __init__(
+        self,
+        log_dir: str,
+        log_file_name: Optional[str] = None,
+        flush_interval: float = 1.0,
+        batch_size: int = 1000,
+        background: bool = True,
+        max_bytes: Optional[int] = None,
+        max_age: Optional[float] = None,
+    ):
+        self._file = RotatingFile(
+            log_dir,
+            log_file_name or "%d.log.jsonl" % int(time.time() * 1000),
+            max_bytes,
+            max_age,
+        )
+        self._size = 0
+        self._flush_interval = flush_interval
+        self._batch_size = batch_size
+        self._executor = ThreadPoolExecutor(1) if background else None
+        self._buffer: List[Any] = []
+        self._timeout = None
+
+    @property
+    def path(self) -> str:
+        return self._file.path
+
+    def append(self, interaction, interactions):
+        self._buffer.append(interaction)
+        if len(self._buffer) >= self._batch_size:
+            self.flush()
+        elif self._timeout is None:
+            loop = IOLoop.current()
+            self._timeout = (loop, loop.call_later(self._flush_interval, self.flush))
+
+    def flush(self):
+        """
+        Writes buffered interactions, in the background if enabled.
+        """
+        if self._timeout is not None:
+            loop, timeout = self._timeout
+            loop.remove_timeout(timeout)
+            self._timeout = None
+        if len(self._buffer) == 0:
+            return
+
+        batch, self._buffer = self._buffer, []
+        if self._executor is None:
+            self._write(batch)
+        else:
+            self._executor.submit(self._write, batch)
+
+    def _write(self, batch: List[Any]):
+        lines: List[str] = []
+        for interaction in batch:
+            line = json.dumps(interaction) + "\n"
+            if self._size > 0 and self._file.should_rotate(self._size + len(line)):
+                self._append_lines(lines)
+                self._file.rotate()
+                self._size = 0
+                lines = []
+            lines.append(line)
+            self._size += len(line)
+        self._append_lines(lines)
+
+    def _append_lines(self, lines: List[str]):
+        if len(lines) > 0:
+            with open(self._file.path, "a") as logfile:
+                logfile.write("".join(lines))
+
+    def close(self):
+        """
+        Writes buffered interactions and waits until all of them are written.
+        """
+        self.flush()
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
 
 
 class Log:
-    _interactions: Sequence[LoggedHttpExchange]
+    """
+    Keeps recent interactions in memory in the json format, and optionally as LoggedHttpExchange
+    objects, and passes every interaction to a sink. Old interactions are dropped once there are
+    more than max_entries of them, their total size in the json format exceeds max_bytes
+    or they are older than max_age seconds.
+    """
+
+    _interactions: Deque[LoggedHttpExchange]
 
-    def __init__(self, scope: Scope, sink: Optional[AbstractSink] = None):
+    def __init__(
+        self,
+        scope: Scope,
+        sink: Optional[AbstractSink] = None,
+        max_entries: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+        max_age: Optional[float] = None,
+        keep_typed: bool = False,
+    ):
+        """
+        :param scope: the scope set with the admin server, the scope of a request is added to the meta of interactions
+        :param sink: a sink interactions are written to
+        :param max_entries: a maximum number of kept interactions
+        :param max_bytes: a maximum size of kept interactions serialized to json
+        :param max_age: a maximum age of kept interactions in seconds
+        :param keep_typed: whether to also keep interactions as LoggedHttpExchange objects
+        """
         self._scope = scope
         self._sink = sink
-        self._interactions = []
-        self._interactions_as_json = []
-        self._log_file_name = "%d.log.json" % int(time.time() * 1000)
+        self._max_entries = max_entries
+        self._max_bytes = max_bytes
+        self._max_age = max_age
+        self._keep_typed = keep_typed
+        self._interactions = deque()
+        self._interactions_as_json = deque()
+        # (timestamp, size) of every kept interaction
+        self._kept: Deque[Tuple[int, int]] = deque()
+        self._bytes = 0
+
+    @property
+    def interactions(self) -> Sequence[LoggedHttpExchange]:
+        return self._interactions
+
+    @property
+    def interactions_as_json(self) -> Sequence[Any]:
+        return self._interactions_as_json
 
     def put(self, request: Request, response: Response):
-        self._interactions = [
-            *self._interactions,
-            LoggedHttpExchange(
-                request=request,
-                response=response,
-                meta=MeeshkanMeta(
-                    timestamp=int(time.time() * 1000), scope=self._scope.get()
-                ),
-            ),
-        ]
+        meta = MeeshkanMeta(
+            timestamp=int(time.time() * 1000), scope=request_scope(request, self._scope)
+        )
         exchange = HttpExchangeWriter.to_dict(
             HttpExchange(request=request, response=response,)
         )
         interaction = {
             **exchange,
             "meta": {
-                "timestamp": self._interactions[-1].meta.timestamp,
-                **(
-                    {"scope": self._interactions[-1].meta.scope}
-                    if self._interactions[-1].meta.scope is not None
-                    else {}
-                ),
+                "timestamp": meta.timestamp,
+                **({"scope": meta.scope} if meta.scope is not None else {}),
             },
         }
 
-        self._interactions_as_json = [*self._interactions_as_json, interaction]
+        if self._keep_typed:
+            self._interactions.append(
+                LoggedHttpExchange(request=request, response=response, meta=meta)
+            )
+        self._interactions_as_json.append(interaction)
+        size = 0 if self._max_bytes is None else len(json.dumps(interaction))
+        self._kept.append((meta.timestamp, size))
+        self._bytes += size
+        self._evict(meta.timestamp)
+
+        if self._sink is not None:
+            self._sink.append(interaction, self._interactions_as_json)
+
+    def _evict(self, now: int):
+        while len(self._kept) > 0 and (
+            (self._max_entries is not None and len(self._kept) > self._max_entries)
+            or (self._max_bytes is not None and self._bytes > self._max_bytes)
+            or (
+                self._max_age is not None
+                and now - self._kept[0][0] > self._max_age * 1000
+            )
+        ):
+            _, size = self._kept.popleft()
+            self._bytes -= size
+            if self._keep_typed:
+                self._interactions.popleft()
+            self._interactions_as_json.popleft()
+
+    def close(self):
         if self._sink is not None:
-            self._sink.write(self._interactions_as_json)
+            self._sink.close()
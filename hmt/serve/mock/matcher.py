@@ -1,10 +1,12 @@
 import datetime
+import typing
 from typing import Optional, Sequence, Tuple
 from urllib.parse import urlparse
 
-from http_types import Request
+from http_types import Protocol, Request
 from openapi_typed_2 import OpenAPIObject, PathItem
 
+from hmt.serve.mock.routes import split_pathname
 from hmt.serve.mock.specs import OpenAPISpecification
 
 
@@ -74,9 +76,80 @@ def remove_trailing_slash(s: str) -> str:
     return s if len(s) == 0 else s[:-1] if s[-1] == "/" else s
 
 
-def truncate_path(path: str, o: OpenAPIObject, i: Request,) -> str:
+class SpecIndex(typing.Sequence[OpenAPISpecification]):
+    """
+    A sequence of specs with their servers indexed by (scheme, host).
+    Each key maps to the specs whose servers match it, in the order of the specs,
+    together with the base paths of the matching servers. It follows the same rules as match_urls,
+    so a server without a scheme is indexed for every protocol.
+    """
+
+    def __init__(self, specs: Sequence[OpenAPISpecification]):
+        self._specs = list(specs)
+        self._apis = [spec.api for spec in self._specs]
+        self._servers: typing.Dict[
+            Tuple[str, str], typing.List[Tuple[OpenAPISpecification, Sequence[str]]]
+        ] = {}
+
+        for spec in self._specs:
+            base_paths: typing.Dict[Tuple[str, str], typing.List[str]] = {}
+            for server in spec.api.servers or []:
+                url = urlparse(server.url)
+                protocols = (
+                    [protocol.value for protocol in Protocol]
+                    if url.scheme in ["", None]
+                    else [url.scheme]
+                )
+                for protocol in protocols:
+                    for host in {server.url.split("/")[0], url.netloc}:
+                        base_paths.setdefault((protocol, host), []).append(
+                            remove_trailing_slash(url.path)
+                        )
+            for key, paths in base_paths.items():
+                self._servers.setdefault(key, []).append((spec, paths))
+
+    @property
+    def apis(self) -> Sequence[OpenAPIObject]:
+        return self._apis
+
+    def match_servers(
+        self, protocol: str, host: str
+    ) -> Sequence[Tuple[OpenAPISpecification, Sequence[str]]]:
+        """Finds specs with servers that match a given protocol and host.
+
+        Arguments:
+            protocol {str} -- like http or https
+            host {str} -- like api.foo.com
+
+        Returns:
+            Pairs of a spec and the base paths of its matching servers.
+        """
+        return self._servers.get((protocol, host), [])
+
+    def base_paths(self, protocol: str, host: str, o: OpenAPIObject) -> Sequence[str]:
+        return next(
+            (
+                paths
+                for spec, paths in self.match_servers(protocol, host)
+                if spec.api is o
+            ),
+            [],
+        )
+
+    def __getitem__(self, i):
+        return self._specs[i]
+
+    def __len__(self) -> int:
+        return len(self._specs)
+
+
+def truncate_path(
+    path: str, o: OpenAPIObject, i: Request, index: Optional[SpecIndex] = None
+) -> str:
     return cut_path(
-        [
+        index.base_paths(i.protocol.value, i.host, o)
+        if index is not None
+        else [
             remove_trailing_slash(urlparse(u).path)
             for u in match_urls(i.protocol.value, i.host, o)
         ],
@@ -87,26 +160,12 @@ def truncate_path(path: str, o: OpenAPIObject, i: Request,) -> str:
 def match_request_to_openapi(
     req: Request, specs: Sequence[OpenAPISpecification]
 ) -> Tuple[Optional[str], Optional[OpenAPISpecification]]:
-    def _match_path(oai: OpenAPIObject) -> Optional[str]:
-        path = [x for x in truncate_path(req.pathname, oai, req).split("/") if x != ""]
-        best_path: Optional[str] = None
-        best_score = 0
-
-        for pathname, path_item in oai.paths.items():
-            score = matches(path, pathname, path_item, req.method.value)
-            if score > 0 and score > best_score:
-                best_path = pathname
-                best_score = score
-
-        return best_path
-
-    specs_with_matching_urls = (
-        spec
-        for spec in specs
-        if len(match_urls(req.protocol.value, req.host, spec.api)) > 0
-    )
-    for spec in specs_with_matching_urls:
-        path = _match_path(spec.api)
+    index = specs if isinstance(specs, SpecIndex) else SpecIndex(specs)
+
+    for spec, base_paths in index.match_servers(req.protocol.value, req.host):
+        path = spec.routes.match(
+            split_pathname(cut_path(base_paths, req.pathname)), req.method.value
+        )
         if path is not None:
             return path, spec
 
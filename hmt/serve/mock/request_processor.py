@@ -1,3 +1,4 @@
+import inspect
 import json
 import logging
 import typing
@@ -8,17 +9,26 @@ from http_types import Request, Response
 from hmt.serve.mock.callbacks import CallbackManager
 from hmt.serve.mock.faker.faker_exception import FakerException
 from hmt.serve.mock.faker.stateful_faker import StatefulFaker
-from hmt.serve.mock.matcher import match_request_to_openapi
+from hmt.serve.mock.matcher import SpecIndex, match_request_to_openapi
 from hmt.serve.mock.rest import RestMiddlewareManager
-from hmt.serve.mock.security import match_to_security_schemes
+from hmt.serve.mock.scope import Scope, request_scope
+from hmt.serve.mock.security import match_to_security_schemes, security_routes
 from hmt.serve.mock.specs import OpenAPISpecification
 from hmt.serve.mock.storage.mock_data_store import MockDataStore
+from hmt.serve.utils.metrics import (
+    CALLBACKS,
+    FAKING,
+    MIDDLEWARE,
+    ROUTING,
+    SECURITY,
+    Stopwatch,
+)
 
 logger = logging.getLogger(__name__)
 
 
 class RequestProcessor:
-    _specs: Sequence[OpenAPISpecification]
+    _specs: SpecIndex
 
     def __init__(
         self,
@@ -26,12 +36,36 @@ class RequestProcessor:
         mock_data_store: MockDataStore,
         callback_manager: CallbackManager,
         rest_middleware_manager: RestMiddlewareManager,
+        validate_body: bool = False,
+        seed: typing.Optional[int] = None,
+        stream_threshold: typing.Optional[int] = None,
+        scope: typing.Optional[Scope] = None,
     ):
-        self._specs = specs
+        self._specs = SpecIndex(specs)
+        security_routes(self._specs)
         self._mock_data_store = mock_data_store
+        self._scope = scope
         self._callback_manager = callback_manager
         self._rest_middleware_manager = rest_middleware_manager
-        self._faker = StatefulFaker(self._mock_data_store)
+        self._faker = StatefulFaker(
+            self._mock_data_store,
+            validate_body,
+            seed,
+            stream_threshold=stream_threshold,
+            scope=scope,
+        )
+
+    def fill_pools(self):
+        """
+        Pre-generates responses of operations with the x-hmt-pool extension.
+        """
+        self._faker.fill_pools(self._specs)
+
+    def reseed(self):
+        """
+        Draws new random states of the faker, e.g. in a forked worker.
+        """
+        self._faker.reseed()
 
     def match_error(self, msg: str, req: Request):
         json_resp = {
@@ -47,14 +81,27 @@ class RequestProcessor:
         )
 
     def _match_response(
-        self, pathname: str, spec: OpenAPISpecification, request: Request,
+        self,
+        pathname: str,
+        spec: OpenAPISpecification,
+        request: Request,
+        stopwatch: Stopwatch,
     ):
         try:
-            return self._faker.process(pathname, spec, request)
+            return self._faker.process(pathname, spec, request, stopwatch)
         except FakerException as e:
             return self.match_error(str(e), request)
+        finally:
+            stopwatch.lap(FAKING)
 
-    def process(self, request: Request) -> Response:
+    async def process(
+        self, request: Request, stopwatch: typing.Optional[Stopwatch] = None
+    ) -> Response:
+        """
+        :param request: a request to the mock server
+        :param stopwatch: times the stages of processing and is given the spec and the path that matched the request
+        """
+        stopwatch = stopwatch or Stopwatch()
         if request.method.value is None:
             method_error = "Could not find a method %s for path %s on hostname %s." % (
                 request.method.value,
@@ -63,20 +110,22 @@ class RequestProcessor:
             )
             return self.match_error(method_error, request)
 
-        specs = self._rest_middleware_manager.spew(request, self._specs)
+        specs = await self._rest_middleware_manager.spew(request, self._specs)
+        stopwatch.lap(MIDDLEWARE)
 
         logger.debug("Matching to security schemes of %d specs", len(specs))
-        maybe_security_response = match_to_security_schemes(
-            request, [spec.api for spec in specs]
-        )
+        maybe_security_response = match_to_security_schemes(request, specs.apis, specs)
+        stopwatch.lap(SECURITY)
 
         if maybe_security_response is not None:
             return maybe_security_response
 
         pathname, spec = match_request_to_openapi(request, specs)
+        storages = self._mock_data_store.namespace(request_scope(request, self._scope))
+        stopwatch.lap(ROUTING)
 
         if pathname is None:
-            return self._callback_manager(
+            response = self._callback_manager(
                 request,
                 self.match_error(
                     "Could not find an open API schema for the host {} and the path {}".format(
@@ -84,11 +133,25 @@ class RequestProcessor:
                     ),
                     request,
                 ),
-                self._mock_data_store.default,
+                storages.default,
+            )
+        else:
+            stopwatch.spec = spec.source
+            stopwatch.path = pathname
+            storage = storages[spec.source]
+            response = self._callback_manager(
+                request,
+                self._match_response(
+                    pathname,
+                    typing.cast(OpenAPISpecification, spec),
+                    request,
+                    stopwatch,
+                ),
+                storage,
             )
 
-        storage = self._mock_data_store[spec.source]
-        response = self._match_response(
-            pathname, typing.cast(OpenAPISpecification, spec), request
-        )
-        return self._callback_manager(request, response, storage)
+        if inspect.isawaitable(response):
+            response = await response
+        self._mock_data_store.flush()
+        stopwatch.lap(CALLBACKS)
+        return response
@@ -1,8 +1,18 @@
 import json
 import logging
 from dataclasses import replace
-from functools import reduce
-from typing import Any, Callable, Mapping, Optional, Sequence, TypeVar, Union, cast
+from functools import lru_cache, reduce
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Mapping,
+    Optional,
+    Sequence,
+    TypeVar,
+    Union,
+    cast,
+)
 
 import jsonschema
 import lenses
@@ -307,19 +317,27 @@ def get_required_request_query_or_header_parameters_internal(
     ]
 
 
-def get_required_request_query_or_header_parameters(
-    header: bool, req: Request, oai: OpenAPIObject, p: PathItem
+def get_required_operation_query_or_header_parameters(
+    header: bool, method: str, oai: OpenAPIObject, p: PathItem
 ) -> Sequence[Parameter]:
     return [
         *get_required_request_query_or_header_parameters_internal(
             header, parameters_o.Each(), oai, p
         ),
         *get_required_request_query_or_header_parameters_internal(
-            header, operation_o(req.method.value).add_lens(parameters_o).Each(), oai, p
+            header, operation_o(method).add_lens(parameters_o).Each(), oai, p
         ),
     ]
 
 
+def get_required_request_query_or_header_parameters(
+    header: bool, req: Request, oai: OpenAPIObject, p: PathItem
+) -> Sequence[Parameter]:
+    return get_required_operation_query_or_header_parameters(
+        header, req.method.value, oai, p
+    )
+
+
 def valid_schema(to_validate: Any, schema: Any) -> bool:
     try:
         jsonschema.validate(to_validate, schema)
@@ -328,8 +346,42 @@ def valid_schema(to_validate: Any, schema: Any) -> bool:
         return False
 
 
+class SchemaValidator:
+    """
+    Validates instances against a JSON schema that is checked and compiled once.
+    It gives the same answers as valid_schema without rebuilding a validator on every call.
+    """
+
+    def __init__(self, schema: Any, definitions_checked: bool = False):
+        """
+        :param definitions_checked: whether the definitions of the schema were already checked, e.g. once for a spec
+        """
+        try:
+            cls = jsonschema.validators.validator_for(schema)
+            cls.check_schema(
+                {**schema, "definitions": {}} if definitions_checked else schema
+            )
+            self._validator = cls(schema)
+        except Exception:
+            self._validator = None
+
+    def __call__(self, to_validate: Any) -> bool:
+        if self._validator is None:
+            return False
+        try:
+            return self._validator.is_valid(to_validate)
+        except Exception:
+            return False
+
+
 def _json_schema_from_required_parameters(
     parameters: Sequence[Parameter], oai: OpenAPIObject
+) -> Any:
+    return _parameters_schema(parameters, make_definitions_from_spec(oai))
+
+
+def _parameters_schema(
+    parameters: Sequence[Parameter], definitions: Mapping[str, Any]
 ) -> Any:
     return {
         "type": "object",
@@ -338,7 +390,7 @@ def _json_schema_from_required_parameters(
         },
         "required": [param.name for param in parameters if param.required],
         "additionalProperties": True,
-        "definitions": make_definitions_from_spec(oai),
+        "definitions": definitions,
     }
 
 
@@ -440,17 +492,95 @@ def path_parameter_match(
     )
 
 
+def params_to_validate(header: bool, req: Request) -> Any:
+    return {k.lower(): v for k, v in req.headers.items()} if header else req.query
+
+
 def validate_params(
     header: bool, req: Request, oai: OpenAPIObject, p: PathItem
 ) -> bool:
     return valid_schema(
-        {k.lower(): v for k, v in req.headers.items()} if header else req.query,
+        params_to_validate(header, req),
         _json_schema_from_required_parameters(
             get_required_request_query_or_header_parameters(header, req, oai, p), oai,
         ),
     )
 
 
+def compile_params_validator(
+    header: bool, method: str, oai: OpenAPIObject, p: PathItem
+) -> SchemaValidator:
+    """Compiles a validator of the required query or header parameters of an operation.
+
+    Arguments:
+        header {bool} -- validate headers if True, query parameters otherwise
+        method {str} -- a lowercase http method of the operation
+        oai {OpenAPIObject} -- the schema to traverse to find definitions
+        p {PathItem} -- a path item containing the operation
+
+    Returns:
+        SchemaValidator -- a validator of the output of params_to_validate
+    """
+    return ParamsValidators(oai).compile(header, method, p)
+
+
+class ParamsValidators:
+    """
+    Compiles validators of the required query or header parameters of operations of a spec.
+    The definitions of the spec are converted and checked against the metaschema once and shared by the validators,
+    so compiling every operation of a spec doesn't check all its definitions again for every operation.
+    """
+
+    def __init__(self, oai: OpenAPIObject):
+        self._oai = oai
+        self._definitions: Optional[Mapping[str, Any]] = None
+        self._valid = False
+        # parameters schema without definitions -> its validator, operations often have equal parameters
+        self._validators: Dict[str, SchemaValidator] = {}
+
+    def _checked_definitions(self) -> Mapping[str, Any]:
+        if self._definitions is None:
+            self._definitions = make_definitions_from_spec(self._oai)
+            try:
+                cls = jsonschema.validators.validator_for({})
+                cls.check_schema({"definitions": self._definitions})
+                self._valid = True
+            except Exception:
+                self._valid = False
+        return self._definitions
+
+    def compile(self, header: bool, method: str, p: PathItem) -> SchemaValidator:
+        """
+        :param header: validate headers if True, query parameters otherwise
+        :param method: a lowercase http method of the operation
+        :param p: a path item of the spec containing the operation
+        :return: a validator of the output of params_to_validate
+        """
+        parameters = get_required_operation_query_or_header_parameters(
+            header, method, self._oai, p
+        )
+        definitions = self._checked_definitions()
+        if not self._valid:
+            # the schema is checked with its definitions and nothing is valid, like with valid_schema
+            return SchemaValidator(_parameters_schema(parameters, definitions))
+        if len(parameters) == 0:
+            return _no_parameters_validator()
+        schema = _parameters_schema(parameters, definitions)
+        key = json.dumps({**schema, "definitions": None}, sort_keys=True, default=str)
+        validator = self._validators.get(key)
+        if validator is None:
+            validator = self._validators[key] = SchemaValidator(
+                schema, definitions_checked=True
+            )
+        return validator
+
+
+@lru_cache(maxsize=None)
+def _no_parameters_validator() -> SchemaValidator:
+    # operations without parameters accept anything, so they share a validator
+    return SchemaValidator(_parameters_schema([], {}))
+
+
 def validate_query_params(req: Request, oai: OpenAPIObject, p: PathItem) -> bool:
     return validate_params(False, req, oai, p)
 
@@ -459,7 +589,9 @@ def validate_header_params(req: Request, oai: OpenAPIObject, p: PathItem) -> boo
     return validate_params(True, req, oai, p)
 
 
-def validate_body(req: Request, spec: OpenAPISpecification, op: Operation) -> bool:
+def _json_schema_from_request_body(
+    spec: OpenAPISpecification, op: Operation
+) -> Optional[Any]:
     request_body = get_request_body(spec.api, op.requestBody)
     if (
         request_body is not None
@@ -469,16 +601,34 @@ def validate_body(req: Request, spec: OpenAPISpecification, op: Operation) -> bo
         schema = cast(
             Union[Schema, Reference], request_body.content["application/json"].schema
         )
-        return valid_schema(
-            req.bodyAsJson,
-            {
-                **convert_from_openapi(
-                    change_ref(schema)
-                    if isinstance(schema, Reference)
-                    else change_refs(schema)
-                ),
-                "definitions": spec.definitions,
-            },
-        )
+        return {
+            **convert_from_openapi(
+                change_ref(schema)
+                if isinstance(schema, Reference)
+                else change_refs(schema)
+            ),
+            "definitions": spec.definitions,
+        }
+
+    return None
+
+
+def validate_body(req: Request, spec: OpenAPISpecification, op: Operation) -> bool:
+    schema = _json_schema_from_request_body(spec, op)
+    return True if schema is None else valid_schema(req.bodyAsJson, schema)
+
 
-    return True
+def compile_body_validator(
+    spec: OpenAPISpecification, op: Operation
+) -> Optional[SchemaValidator]:
+    """Compiles a validator of a JSON request body of an operation.
+
+    Arguments:
+        spec {OpenAPISpecification} -- the spec of the operation
+        op {Operation} -- the operation
+
+    Returns:
+        Optional[SchemaValidator] -- None if the operation has no JSON request body schema
+    """
+    schema = _json_schema_from_request_body(spec, op)
+    return None if schema is None else SchemaValidator(schema)
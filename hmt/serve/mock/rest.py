@@ -1,56 +1,180 @@
+import hashlib
+import json
 import logging
-from typing import Sequence
+import typing
+from concurrent.futures import ThreadPoolExecutor
 
 import requests
 from http_types import Request
 from http_types.utils import HttpExchangeWriter
 from openapi_typed_2 import convert_from_openapi, convert_to_openapi
+from requests.adapters import HTTPAdapter
+from requests.exceptions import RequestException
+from tornado.ioloop import IOLoop
 
+from hmt.serve.mock.matcher import SpecIndex
 from hmt.serve.mock.refs import make_definitions_from_spec
 from hmt.serve.mock.specs import OpenAPISpecification
+from hmt.serve.utils.observable import Observable
 
 logger = logging.getLogger(__name__)
 
+# A key of a middleware response holding only changed schemas, a null schema removes a spec
+DIFF = "x-hmt-diff"
 
-class RestMiddlewareManager:
-    def __init__(self, mock_data_store):
+
+def spec_digest(dict_spec: typing.Any) -> str:
+    """
+    Hashes the content of a spec in the dictionary format.
+    :param dict_spec: an OpenAPI spec as a dictionary
+    :return: a hex digest that is equal for equal specs
+    """
+    return hashlib.sha1(
+        json.dumps(dict_spec, sort_keys=True, separators=(",", ":")).encode()
+    ).hexdigest()
+
+
+class RestMiddlewareManager(Observable):
+    """
+    Calls registered REST middlewares that can replace specs before a request is mocked.
+    Middlewares are called in the order they were added. The calls are made from a thread pool
+    over keep-alive connections, so waiting for a middleware doesn't block the IOLoop.
+    A middleware that fails, doesn't answer in time or doesn't answer with specs is skipped.
+
+    A middleware can answer with 204 No Content if the specs are unchanged or with {"x-hmt-diff": {...}}
+    holding only the changed specs. Specs are identified by the hash of their content, so unchanged specs
+    are neither converted nor registered in the mock data store again.
+    """
+
+    def __init__(
+        self, mock_data_store, timeout: float = 5.0, max_connections: int = 10
+    ):
+        """
+        :param mock_data_store: a store to register specs returned by middlewares in
+        :param timeout: a default timeout of a middleware call in seconds
+        :param max_connections: a maximum number of concurrent middleware calls
+        """
         self._mock_data_store = mock_data_store
-        self._endpoints = set([])
+        self._endpoints: typing.Dict[str, typing.Optional[float]] = dict()
+        self._timeout = timeout
+        self._executor = ThreadPoolExecutor(max_connections)
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_maxsize=max_connections)
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+        # source -> the spec given to middlewares and its dictionary format
+        self._dict_specs: typing.Dict[
+            str, typing.Tuple[OpenAPISpecification, typing.Any]
+        ] = dict()
+        # name -> the digest and the spec last registered in the mock data store
+        self._registered: typing.Dict[
+            str, typing.Tuple[str, OpenAPISpecification]
+        ] = dict()
+        self._index: typing.Tuple[
+            typing.Tuple[OpenAPISpecification, ...], SpecIndex
+        ] = ((), SpecIndex([]))
 
     def get(self):
         return list(self._endpoints)
 
     def clear(self, url=None):
         if not url:
-            self._endpoints = set([])
+            self._endpoints = dict()
         else:
-            self._endpoints.remove(url)
+            del self._endpoints[url]
+        self._notify("clear", url)
+
+    def add(self, url, timeout: typing.Optional[float] = None):
+        """
+        Adds a middleware.
+        :param url: an url the middleware is posted to
+        :param timeout: a timeout in seconds, the default timeout of the manager if None
+        """
+        self._endpoints[url] = timeout
+        self._notify("add", url, timeout)
 
-    def add(self, url):
-        self._endpoints.add(url)
+    def _call(self, endpoint: str, timeout: float, body: typing.Any) -> typing.Any:
+        res = self._session.post(endpoint, json=body, timeout=timeout)
+        res.raise_for_status()
+        if res.status_code == 204:
+            return None
+        return res.json()
+
+    def _to_dicts(self, specs: SpecIndex) -> typing.Dict[str, typing.Any]:
+        out = dict()
+        for spec in specs:
+            cached = self._dict_specs.get(spec.source)
+            if cached is None or cached[0] is not spec:
+                cached = (spec, convert_from_openapi(spec.api))
+                self._dict_specs[spec.source] = cached
+                self._registered.setdefault(spec.source, (spec_digest(cached[1]), spec))
+            out[spec.source] = cached[1]
+        return out
 
-    def spew(
-        self, request: Request, specs: Sequence[OpenAPISpecification]
-    ) -> Sequence[OpenAPISpecification]:
+    def _to_spec(self, name: str, dict_spec: typing.Any) -> OpenAPISpecification:
+        digest = spec_digest(dict_spec)
+        registered = self._registered.get(name)
+        if registered is not None and registered[0] == digest:
+            return registered[1]
+
+        api = convert_to_openapi(dict_spec)
+        spec = OpenAPISpecification(
+            api, name, definitions=make_definitions_from_spec(api)
+        )
+        self._mock_data_store.add_mock(spec)
+        self._registered[name] = (digest, spec)
+        return spec
+
+    def _to_index(self, specs: typing.Tuple[OpenAPISpecification, ...]) -> SpecIndex:
+        cached_specs, index = self._index
+        if len(cached_specs) != len(specs) or any(
+            a is not b for a, b in zip(cached_specs, specs)
+        ):
+            index = SpecIndex(specs)
+            self._index = (specs, index)
+        return index
+
+    async def spew(self, request: Request, specs: SpecIndex) -> SpecIndex:
         if len(self._endpoints) == 0:
             return specs
 
         req = HttpExchangeWriter.to_dict(request)
-        cs = {spec.source: convert_from_openapi(spec.api) for spec in specs}
-        for endpoint in self._endpoints:
-            res = requests.post(endpoint, json={"request": req, "schemas": cs})
-            cs = res.json()
-
-        out = []
-        for name, dict_spec in cs.items():
-            spec = convert_to_openapi(dict_spec)
-            out.append(
-                OpenAPISpecification(
-                    spec, name, definitions=make_definitions_from_spec(spec)
+        cs = self._to_dicts(specs)
+        changed = False
+        for endpoint, timeout in list(self._endpoints.items()):
+            try:
+                res = await IOLoop.current().run_in_executor(
+                    self._executor,
+                    self._call,
+                    endpoint,
+                    self._timeout if timeout is None else timeout,
+                    {"request": req, "schemas": cs},
                 )
-            )
+            except (RequestException, ValueError) as e:
+                logger.warning("Skipping REST middleware %s: %s", endpoint, e)
+                continue
 
-        for spec in out:
-            self._mock_data_store.add_mock(spec)
+            if res is None:
+                continue
+            diff = isinstance(res, dict) and DIFF in res
+            schemas = res[DIFF] if diff else res
+            if not isinstance(schemas, dict) or any(
+                spec is not None and not isinstance(spec, dict)
+                for spec in schemas.values()
+            ):
+                logger.warning(
+                    "Skipping REST middleware %s: unexpected response %.100s",
+                    endpoint,
+                    json.dumps(res),
+                )
+                continue
+            cs = {**cs, **schemas} if diff else schemas
+            cs = {name: spec for name, spec in cs.items() if spec is not None}
+            changed = True
 
-        return out
+        if not changed:
+            return specs
+
+        return self._to_index(
+            tuple(self._to_spec(name, dict_spec) for name, dict_spec in cs.items())
+        )
@@ -0,0 +1,103 @@
+import typing
+from typing import Mapping, Optional, Sequence, Tuple
+
+from openapi_typed_2 import PathItem
+
+methods: Sequence[str] = [
+    "get",
+    "put",
+    "post",
+    "delete",
+    "options",
+    "head",
+    "patch",
+    "trace",
+]
+
+
+def split_pathname(pathname: str) -> Sequence[str]:
+    return [x for x in pathname.split("/") if x != ""]
+
+
+def is_template(segment: str) -> bool:
+    return segment[0] == "{" and segment[-1] == "}"
+
+
+class RouteNode:
+    """
+    A single path segment in a RouteTrie. Literal children are kept in a dict,
+    all templated children (like {id}) share one wildcard child.
+    """
+
+    __slots__ = ("literals", "template", "leaves")
+
+    def __init__(self):
+        self.literals: typing.Dict[str, "RouteNode"] = {}
+        self.template: Optional["RouteNode"] = None
+        # http method -> (position, name) of the first PathItem ending in this node
+        self.leaves: typing.Dict[str, Tuple[int, str]] = {}
+
+
+class RouteTrie:
+    """
+    A segment trie built once from the paths of an OpenAPI document.
+    It resolves a request path to the same PathItem name as scoring every path with
+    hmt.serve.mock.matcher.matches does: the path with most literal segments wins and ties
+    go to the path declared first. The cost depends on the depth of a path, not on the number of paths.
+    """
+
+    def __init__(self, paths: Mapping[str, PathItem]):
+        self._root = RouteNode()
+        for position, (pathname, path_item) in enumerate(paths.items()):
+            node = self._root
+            for segment in split_pathname(pathname):
+                if is_template(segment):
+                    if node.template is None:
+                        node.template = RouteNode()
+                    node = node.template
+                else:
+                    node = node.literals.setdefault(segment, RouteNode())
+            for method in methods:
+                if getattr(path_item, method, None) is not None:
+                    node.leaves.setdefault(method, (position, pathname))
+
+    def match(self, path: Sequence[str], method: str) -> Optional[str]:
+        """
+        Finds the best matching PathItem name.
+        :param path: a request path split into segments
+        :param method: a lowercase http method
+        :return: a name of a PathItem or None
+        """
+        best = self._match(self._root, path, 0, method, 0, None)
+        return None if best is None else best[2]
+
+    def _match(
+        self,
+        node: RouteNode,
+        path: Sequence[str],
+        index: int,
+        method: str,
+        literals: int,
+        best: Optional[Tuple[int, int, str]],
+    ) -> Optional[Tuple[int, int, str]]:
+        if best is not None and literals + len(path) - index < best[0]:
+            return best
+
+        if index == len(path):
+            leaf = node.leaves.get(method)
+            if leaf is None:
+                return best
+            if (
+                best is None
+                or literals > best[0]
+                or (literals == best[0] and leaf[0] < best[1])
+            ):
+                return literals, leaf[0], leaf[1]
+            return best
+
+        literal = node.literals.get(path[index])
+        if literal is not None:
+            best = self._match(literal, path, index + 1, method, literals + 1, best)
+        if node.template is not None:
+            best = self._match(node.template, path, index + 1, method, literals, best)
+        return best
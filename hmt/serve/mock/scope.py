@@ -1,12 +1,42 @@
-class Scope:
+import typing
+
+from http_types import Request
+
+from hmt.serve.utils.observable import Observable
+
+SCOPE_HEADER = "x-hmt-scope"
+
+
+class Scope(Observable):
     def __init__(self):
         self._name = None
 
     def set(self, name):
         self._name = name
+        self._notify("set", name)
 
     def get(self):
         return self._name
 
     def clear(self):
         self._name = None
+        self._notify("clear")
+
+
+def request_scope(
+    request: Request, scope: typing.Optional[Scope] = None
+) -> typing.Optional[str]:
+    """
+    Finds the scope of a request. The x-hmt-scope header selects a scope for a single request,
+    otherwise the scope set with the admin server is used.
+    :param request: an http request
+    :param scope: the scope set with the admin server
+    :return: None if there is no scope
+    """
+    for name, value in (request.headers or {}).items():
+        if name.lower() == SCOPE_HEADER:
+            if isinstance(value, list):
+                value = value[-1] if len(value) > 0 else None
+            if value:
+                return value
+    return scope.get() if scope is not None else None
@@ -1,9 +1,11 @@
-from typing import Optional, Sequence
+import weakref
+from typing import Dict, List, Optional, Sequence
+from urllib.parse import urlparse
 
 from http_types import Request, Response
 from openapi_typed_2.openapi import OAuth2SecurityScheme, OpenAPIObject
 
-from .matcher import truncate_path
+from .matcher import SpecIndex, remove_trailing_slash, truncate_path
 
 
 def generate_code():
@@ -46,14 +48,90 @@ def matches_to_oauth2(
     return None
 
 
+def authorization_urls(spec: OpenAPIObject) -> List[str]:
+    """
+    :return: authorization urls of OAuth2 flows the mock serves
+    """
+    components = spec.components
+    if components is None or components.securitySchemes is None:
+        return []
+    return [
+        scheme.flows.authorizationCode.authorizationUrl
+        for scheme in components.securitySchemes.values()
+        if isinstance(scheme, OAuth2SecurityScheme)
+        and scheme.flows.authorizationCode is not None
+    ]
+
+
+class SecurityRoutes:
+    """
+    Specs with OAuth2 flows by the paths of requests that may match their authorization urls.
+    A request matches an authorization url after the base path of a server is cut from its path,
+    or with the whole path if no base path is a prefix of it, so every url is indexed both with
+    the base paths of servers of its spec and alone. Requests with other paths are answered by one dict lookup.
+    """
+
+    def __init__(self, index: SpecIndex):
+        # the routes are cached by the index, so they don't keep it alive
+        self._index = weakref.ref(index)
+        self._specs: Dict[str, List[OpenAPIObject]] = {}
+        for spec in index.apis:
+            urls = authorization_urls(spec)
+            if len(urls) == 0:
+                continue
+            base_paths = {""} | {
+                remove_trailing_slash(urlparse(server.url).path)
+                for server in spec.servers or []
+            }
+            for base_path in base_paths:
+                for url in urls:
+                    specs = self._specs.setdefault(base_path + url, [])
+                    # specs are added in the order of the index, so the first match stays the same
+                    if len(specs) == 0 or specs[-1] is not spec:
+                        specs.append(spec)
+
+    def match(self, req: Request) -> Optional[Response]:
+        specs = self._specs.get(req.pathname)
+        if specs is None:
+            return None
+        return next(
+            (
+                match
+                for spec in specs
+                for match in (
+                    match_request_to_security_scheme(req, spec, self._index()),
+                )
+                if match is not None
+            ),
+            None,
+        )
+
+
+_security_routes: "weakref.WeakKeyDictionary[SpecIndex, SecurityRoutes]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def security_routes(index: SpecIndex) -> SecurityRoutes:
+    """
+    Finds the security routes of specs, they are built once for an index, so they change with the specs.
+    """
+    routes = _security_routes.get(index)
+    if routes is None:
+        routes = SecurityRoutes(index)
+        _security_routes[index] = routes
+    return routes
+
+
 def match_request_to_security_scheme(
-    req: Request, spec: OpenAPIObject
+    req: Request, spec: OpenAPIObject, index: Optional[SpecIndex] = None
 ) -> Optional[Response]:
     """Match request to an OpenAPI document's security schemes if present.
 
     Arguments:
         req {Request} -- HttpRequest
         spec {OpenAPIObject} -- OpenAPI document
+        index {Optional[SpecIndex]} -- Index of servers to truncate the path with
 
     Returns:
         Optional[Response] -- [description]
@@ -65,7 +143,7 @@ def match_request_to_security_scheme(
 
     security_schemes = components.securitySchemes
 
-    truncated_path = truncate_path(req.pathname, spec, req)
+    truncated_path = truncate_path(req.pathname, spec, req, index)
 
     for _, scheme in security_schemes.items():
         if isinstance(scheme, OAuth2SecurityScheme):
@@ -76,13 +154,25 @@ def match_request_to_security_scheme(
 
 
 def match_to_security_schemes(
-    req: Request, specs: Sequence[OpenAPIObject]
+    req: Request, specs: Sequence[OpenAPIObject], index: Optional[SpecIndex] = None
 ) -> Optional[Response]:
+    """Match request to security schemes of OpenAPI documents.
+
+    Arguments:
+        req {Request} -- HttpRequest
+        specs {Sequence[OpenAPIObject]} -- OpenAPI documents
+        index {Optional[SpecIndex]} -- Index of the documents, its security routes are used instead of the documents
+
+    Returns:
+        Optional[Response] -- a response of the first matching scheme
+    """
+    if index is not None and specs is index.apis:
+        return security_routes(index).match(req)
 
     matches_iterator = (
         match
         for spec in specs
-        for match in (match_request_to_security_scheme(req, spec),)
+        for match in (match_request_to_security_scheme(req, spec, index),)
         if match is not None
     )
 
@@ -1,20 +1,30 @@
 import logging
+import os
+import random
+import signal
+import sys
+import time
+from multiprocessing import Pipe
 from typing import Optional
 
 from tornado.httpserver import HTTPServer
 from tornado.ioloop import IOLoop
+from tornado.netutil import bind_sockets
 from tornado.web import Application
 
 from hmt.serve.mock.rest import RestMiddlewareManager
 from hmt.serve.mock.storage.mock_data_store import MockDataStore
+from hmt.serve.mock.storage.sqlite_backend import SqliteBackend
 
 from ..admin.runner import start_admin
 from ..mock.callbacks import callback_manager
 from ..mock.request_processor import RequestProcessor
 from ..mock.views import MockServerView
+from ..utils.metrics import MetricsRegistry
 from ..utils.routing import PathRouting
-from .log import FileSink, Log, NoSink
+from .log import AbstractSink, JsonLinesSink, Log, NoSink
 from .scope import Scope
+from .workers import SharedState
 
 logger = logging.getLogger(__name__)
 
@@ -29,15 +39,44 @@ class MockServer:
         admin_port=None,
         routing=PathRouting(),
         log_dir: Optional[str] = None,
+        validate_body: bool = False,
+        workers: int = 1,
+        log_max_entries: Optional[int] = 1000,
+        log_max_bytes: Optional[int] = None,
+        log_max_age: Optional[float] = None,
+        log_file_max_bytes: Optional[int] = None,
+        log_file_max_age: Optional[float] = None,
+        seed: Optional[int] = None,
+        stream_threshold: Optional[int] = None,
+        reload_callbacks: bool = False,
+        storage_file: Optional[str] = None,
     ):
         self._admin_port = admin_port
         self._port = port
         self._specs = specs
         self._routing = routing
+        self._workers = workers
+        self._callback_dir = callback_dir
+        self._reload_callbacks = reload_callbacks
+        self._log_dir = log_dir
+        self._log_max_entries = log_max_entries
+        self._log_max_bytes = log_max_bytes
+        self._log_max_age = log_max_age
+        self._log_file_max_bytes = log_file_max_bytes
+        self._log_file_max_age = log_file_max_age
         self._scope = scope or Scope()
-        self._log = Log(self._scope, NoSink() if log_dir is None else FileSink(log_dir))
+        self._metrics = MetricsRegistry()
+        self._log = self._make_log(
+            NoSink()
+            if log_dir is None
+            else JsonLinesSink(
+                log_dir, max_bytes=log_file_max_bytes, max_age=log_file_max_age
+            )
+        )
 
-        self._mock_data_store = MockDataStore()
+        self._mock_data_store = MockDataStore(
+            SqliteBackend(storage_file) if storage_file is not None else None
+        )
         self._rest_middleware_manager = RestMiddlewareManager(self._mock_data_store)
         self._callback_manager = callback_manager
 
@@ -52,18 +91,57 @@ class MockServer:
             self._mock_data_store,
             self._callback_manager,
             self._rest_middleware_manager,
+            validate_body,
+            seed,
+            stream_threshold,
+            self._scope,
         )
+        self._request_processor.fill_pools()
 
     def run(self) -> None:
+        if self._workers > 1:
+            if hasattr(os, "fork"):
+                self._run_workers()
+                return
+            logger.warning("Multiple workers are not supported on this platform")
+
+        self._start_admin()
+        self._watch_callbacks()
+        http_server = HTTPServer(self._make_app())
+        http_server.listen(self._port)
+        self.log_startup()
+        try:
+            IOLoop.current().start()
+        finally:
+            self._log.close()
+            self._mock_data_store.close()
+
+    def _watch_callbacks(self) -> None:
+        if self._callback_dir is not None and self._reload_callbacks:
+            self._callback_manager.watch(self._callback_dir)
+
+    def _make_log(self, sink: AbstractSink) -> Log:
+        return Log(
+            self._scope,
+            sink,
+            max_entries=self._log_max_entries,
+            max_bytes=self._log_max_bytes,
+            max_age=self._log_max_age,
+        )
+
+    def _start_admin(self, workers: int = 1) -> None:
         if self._admin_port:
             start_admin(
                 port=self._admin_port,
                 scope=self._scope,
                 mock_data_store=self._mock_data_store,
                 rest_middleware_manager=self._rest_middleware_manager,
+                metrics=self._metrics,
+                workers=workers,
             )
 
-        app = Application(
+    def _make_app(self) -> Application:
+        return Application(
             [
                 (
                     r"/.*",
@@ -72,15 +150,102 @@ class MockServer:
                         request_processor=self._request_processor,
                         router=self._routing,
                         http_log=self._log,
+                        metrics=self._metrics,
                     ),
                 )
             ]
         )
 
-        http_server = HTTPServer(app)
-        http_server.listen(self._port)
+    def _run_workers(self) -> None:
+        """
+        Pre-forks worker processes that accept connections from one listening socket.
+        This process only runs the admin server and shares changes of the state between the workers.
+        """
+        sockets = bind_sockets(self._port)
+        connections = []
+        pids = []
+        for index in range(self._workers):
+            connection, worker_connection = Pipe()
+            connections.append(connection)
+            pid = os.fork()
+            if pid == 0:
+                for c in connections:
+                    c.close()
+                self._run_worker(index, sockets, worker_connection)
+                os._exit(0)
+            worker_connection.close()
+            pids.append(pid)
+
+        for sock in sockets:
+            sock.close()
+
+        def stop_workers(signum, frame):
+            for pid in pids:
+                try:
+                    os.kill(pid, signal.SIGTERM)
+                except OSError:
+                    pass
+            sys.exit(0)
+
+        signal.signal(signal.SIGTERM, stop_workers)
+
+        shared_state = SharedState(
+            self._scope,
+            self._mock_data_store,
+            self._rest_middleware_manager,
+            self._metrics,
+        )
+        for connection in connections:
+            shared_state.connect(connection, forward=True)
+
+        self._start_admin(self._workers)
         self.log_startup()
-        IOLoop.current().start()
+        logger.info("Started %d workers", self._workers)
+        try:
+            IOLoop.current().start()
+        finally:
+            self._mock_data_store.close()
+            stop_workers(None, None)
+
+    def _run_worker(self, index: int, sockets, connection) -> None:
+        # Forked workers inherit the state of the random generators
+        random.seed()
+        self._request_processor.reseed()
+        if self._log_dir is not None:
+            self._log = self._make_log(
+                JsonLinesSink(
+                    self._log_dir,
+                    "%d-%d.log.jsonl" % (int(time.time() * 1000), index),
+                    max_bytes=self._log_file_max_bytes,
+                    max_age=self._log_file_max_age,
+                )
+            )
+
+        shared_state = SharedState(
+            self._scope,
+            self._mock_data_store,
+            self._rest_middleware_manager,
+            self._metrics,
+        )
+        shared_state.connect(connection, on_close=IOLoop.current().stop)
+        shared_state.share_metrics(index)
+
+        # Stop gracefully to write buffered logs
+        signal.signal(
+            signal.SIGTERM,
+            lambda signum, frame: IOLoop.current().add_callback_from_signal(
+                IOLoop.current().stop
+            ),
+        )
+
+        self._watch_callbacks()
+        http_server = HTTPServer(self._make_app())
+        http_server.add_sockets(sockets)
+        try:
+            IOLoop.current().start()
+        finally:
+            self._log.close()
+            self._mock_data_store.close()
 
     def log_startup(self) -> None:
         for spec in self._specs:
@@ -1,6 +1,6 @@
 import json
 import os
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from typing import Any, Sequence, Union
 
 import requests
@@ -9,6 +9,7 @@ from openapi_typed_2 import OpenAPIObject, convert_to_openapi
 from requests.exceptions import RequestException
 
 from hmt.serve.mock.refs import make_definitions_from_spec
+from hmt.serve.mock.routes import RouteTrie
 
 
 @dataclass
@@ -18,6 +19,10 @@ class OpenAPISpecification:
     api: OpenAPIObject
     source: str
     definitions: Any
+    routes: RouteTrie = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        self.routes = RouteTrie(self.api.paths)
 
 
 def load_spec(spec_source: str, is_http: bool) -> OpenAPISpecification:
@@ -0,0 +1,128 @@
+import typing
+from contextlib import contextmanager
+
+
+class MemoryTable(dict):
+    """
+    Values of an entity or of a global storage of a mock by id. Tables of all backends have the methods of a dict
+    and the methods below, so entities don't depend on a backend:
+    peek reads a value that won't be changed in place, insert adds a value at a position of the insertion order,
+    restore lists stored ids when an entity is created and flush saves values changed in place.
+
+    A snapshot of a memory table is the table itself, an entity unshares it before it's changed,
+    so taking and restoring snapshots doesn't copy anything.
+    """
+
+    shares_values = True
+    """
+    Whether values are shared with snapshots, so they must be copied before they are changed in place.
+    """
+
+    peek = dict.__getitem__
+
+    def insert(self, id: typing.Any, value: typing.Any, position: int):
+        self[id] = value
+
+    def restore(
+        self, values: bool = False
+    ) -> typing.Iterator[typing.Tuple[int, typing.Any, typing.Any]]:
+        """
+        :param values: whether to read values, e.g. to build indexes
+        :return: (position, id, value or None) in the insertion order
+        """
+        return iter(())
+
+    def flush(self):
+        pass
+
+    def snapshot(self, name: str) -> typing.Any:
+        """
+        :param name: a name of the snapshot
+        :return: a state of the table
+        """
+        return self
+
+    def restore_snapshot(self, state: typing.Any) -> "MemoryTable":
+        """
+        :param state: a state returned by snapshot
+        :return: a table with the state
+        """
+        return state
+
+    def unshare(self) -> "MemoryTable":
+        """
+        :return: a table with the same values that can be changed without changing snapshots
+        """
+        return MemoryTable(self)
+
+
+class StorageBackend:
+    """
+    Creates tables for entities and global storages of mocks. Changes of tables are made by MockDataStore
+    which seeds a mock from the x-hmt-data extension only if the backend hasn't stored its data yet.
+    Every scope has its own tables, None is the scope of requests without a scope.
+    """
+
+    mirroring = False
+    """
+    Whether changes are made by another process that stores them, so they are only applied to caches.
+    """
+
+    def table(
+        self, mockname: str, name: str, scope: typing.Optional[str] = None
+    ) -> typing.MutableMapping[typing.Any, typing.Any]:
+        """
+        :param mockname: a name of a mock
+        :param name: a name of an entity or an empty string for the global storage
+        :param scope: a scope of requests
+        """
+        raise NotImplementedError()
+
+    def seeded(self, mockname: str, scope: typing.Optional[str] = None) -> bool:
+        raise NotImplementedError()
+
+    def set_seeded(self, mockname: str, scope: typing.Optional[str] = None):
+        raise NotImplementedError()
+
+    def drop(self, scope: typing.Optional[str] = None):
+        """
+        Deletes tables of a scope.
+        :param scope: a scope, None deletes tables of all scopes except the tables of requests without a scope
+        """
+
+    def drop_snapshots(self):
+        """
+        Deletes snapshots stored by a previous run, their names are only kept in memory.
+        """
+
+    @contextmanager
+    def transaction(self):
+        """
+        Groups changes, so they are stored at once.
+        """
+        yield
+
+    def flush(self):
+        """
+        Saves values that may have been changed in place, e.g. by callbacks.
+        """
+
+    def close(self):
+        pass
+
+
+class MemoryBackend(StorageBackend):
+    """
+    Keeps data in dicts. Nothing is stored, so mocks are always seeded.
+    """
+
+    def table(
+        self, mockname: str, name: str, scope: typing.Optional[str] = None
+    ) -> MemoryTable:
+        return MemoryTable()
+
+    def seeded(self, mockname: str, scope: typing.Optional[str] = None) -> bool:
+        return False
+
+    def set_seeded(self, mockname: str, scope: typing.Optional[str] = None):
+        pass
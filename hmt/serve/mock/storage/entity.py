@@ -1,17 +1,40 @@
+import copy
 import typing
 import uuid
+from bisect import bisect_left
+from dataclasses import dataclass
+from itertools import islice
 
 from http_types import Request
 from jsonpath_rw import Fields, parse
 from openapi_typed_2 import (
     OpenAPIObject,
     Operation,
+    Parameter,
     PathItem,
     RequestBody,
+    Schema,
     convert_from_openapi,
 )
 
 from hmt.build.paths import _match_to_path
+from hmt.serve.mock.storage.backend import MemoryTable
+from hmt.serve.mock.storage.entity_index import (
+    EQ,
+    OPERATORS,
+    HashIndex,
+    QueryFilter,
+    SortedIndex,
+    make_index,
+)
+from hmt.serve.mock.storage.pagination import (
+    Page,
+    PageRequest,
+    get_pagination,
+    link_header,
+    page_request,
+)
+from hmt.serve.utils.observable import Observable
 from hmt.serve.utils.opanapi_ext import ApiOperation, get_x
 
 
@@ -36,11 +59,74 @@ class EntityPathItem:
 
     methods = ["get", "put", "post", "delete", "options", "head", "patch", "trace"]
 
-    def __init__(self, entity_name: str, pathname: str, path_item: PathItem):
+    def __init__(
+        self,
+        entity_name: str,
+        pathname: str,
+        path_item: PathItem,
+        fields: typing.Collection[str] = (),
+        id_field: typing.Optional[str] = None,
+    ):
+        """
+        :param entity_name: a name of the entity schema
+        :param pathname: a path of the path item
+        :param path_item: a path item with the x-hmt-entity extension
+        :param fields: top-level properties of the entity that query parameters of the same name filter by
+        :param id_field: a top-level property holding the id, if the id path is a plain field
+        """
         self._entity_name = entity_name
         self._pathname = pathname
         self._path_item = path_item
+        self._id_field = id_field
         self._request_entity_selectors = self._build_request_entity_selectors(path_item)
+        self.pagination = get_pagination(path_item)
+        self._query_filters = self._build_query_filters(path_item, fields)
+
+    def _build_query_filters(
+        self, path_item: PathItem, fields: typing.Collection[str]
+    ) -> typing.Dict[str, typing.Tuple[str, str, typing.Optional[str]]]:
+        """
+        Maps query parameters of the GET operation to (field, operator, parameter type).
+        A parameter filters by the field of the same name unless the x-hmt-filter extension gives
+        another field name or an object with field and operator (eq, lt, lte, gt or gte).
+        """
+        parameters = list(path_item.parameters or [])
+        if path_item.get is not None:
+            parameters += path_item.get.parameters or []
+
+        paging = (
+            set(self.pagination.parameters.values())
+            if self.pagination is not None
+            else set()
+        )
+        res = {}
+        for parameter in parameters:
+            if (
+                not isinstance(parameter, Parameter)
+                or parameter._in != "query"
+                or parameter.name in paging
+            ):
+                continue
+            config = get_x(parameter, "x-hmt-filter")
+            if config is None:
+                if parameter.name not in fields:
+                    continue
+                config = parameter.name
+            if isinstance(config, str):
+                config = {"field": config}
+            operator = config.get("operator", EQ)
+            if operator not in OPERATORS:
+                raise ValueError(
+                    "Unknown x-hmt-filter operator %s of parameter %s"
+                    % (operator, parameter.name)
+                )
+            schema = parameter.schema
+            res[parameter.name] = (
+                config.get("field", parameter.name),
+                operator,
+                schema._type if isinstance(schema, Schema) else None,
+            )
+        return res
 
     def _build_request_entity_selectors(self, path_item: PathItem) -> typing.Dict:
         res = {}
@@ -102,22 +188,53 @@ class EntityPathItem:
 
         return None
 
-    def filter(self, request: Request):
+    def query_filters(self, request: Request) -> typing.List[QueryFilter]:
         """
-        Builds a filter from an http request to search for specific entities. It is currently unsupported,
-        so we return everything that is inside a storage for every search request.
+        Builds filters from query parameters of an http request, e.g. GET /pets?status=sold&owner=42.
+        Parameters repeated in the query match any of their values.
         :param request:
         :return:
         """
-        return lambda x: True
+        res = []
+        for name, (field, operator, parameter_type) in self._query_filters.items():
+            values = _query_values(request, name)
+            if len(values) == 0:
+                continue
+            if operator == EQ:
+                res.append(QueryFilter(field, operator, frozenset(values)))
+            else:
+                res.append(
+                    QueryFilter(
+                        field,
+                        operator,
+                        frozenset(),
+                        _convert(values[-1], parameter_type),
+                    )
+                )
+        return res
+
+    def filter(self, request: Request):
+        """
+        Builds a filter from an http request to search for specific entities.
+        :param request:
+        :return: a function returning whether an entity matches all query parameters
+        """
+        filters = self.query_filters(request)
+        return lambda x: all(f(x) for f in filters)
 
     def id_filter(self, request: Request):
         """
-        Extracts id from an http request arguments, e.g. GET /items?id=123. It is currently unsupported.
+        Extracts id from an http request arguments, e.g. GET /items?id=123.
         :param request:
         :return:
         """
-        return None
+        if self._id_field is None:
+            return None
+        values = _query_values(request, self._id_field)
+        if len(values) == 0:
+            return None
+        declared = self._query_filters.get(self._id_field)
+        return _convert(values[-1], declared[2] if declared is not None else None)
 
     def extract_id(self, request: Request):
         match = _match_to_path(request.pathname, self._pathname)
@@ -141,40 +258,237 @@ class EntityPathItem:
         return found[0].value
 
 
-class Entity:
+def _query_values(request: Request, name: str) -> typing.List[str]:
+    value = (request.query or {}).get(name)
+    if value is None:
+        return []
+    values = value if isinstance(value, list) else [value]
+    return [v.decode("utf-8") if isinstance(v, bytes) else str(v) for v in values]
+
+
+def _convert(value: str, parameter_type: typing.Optional[str]) -> typing.Any:
+    try:
+        if parameter_type == "integer":
+            return int(value)
+        elif parameter_type == "number":
+            return float(value)
+    except ValueError:
+        return None
+    return value
+
+
+@dataclass(frozen=True)
+class EntitySnapshot:
+    """
+    A state of an entity. Its parts are shared with the entity until the entity is changed.
+    """
+
+    data: typing.Any
+    """
+    A state of the table of the entity.
+    """
+    order: typing.Dict[typing.Any, int]
+    sequence: typing.List[typing.Tuple[int, typing.Any]]
+    counter: int
+    deleted: int
+    indexes: typing.List[typing.Union[HashIndex, SortedIndex]]
+
+
+class Entity(Observable):
     """
     The Entity object can be used as a typing.Dict[str, typing.Any] in callbacks. It also contains utility functions
     to implement automatic insetion/extraction logic extracted from an OpenAPI spec.
+    Every change of the stored data is reported to a listener as ("set", id, value), ("delete", id) or ("clear",).
+
+    Secondary indexes of top-level fields are declared with the x-hmt-index extension of the entity schema,
+    e.g. {"status": "hash", "price": "sorted"}. Hash indexes answer equality filters, sorted ones answer ranges.
+    Indexes are kept up to date by the methods of the entity, values changed in place must be set again.
+
+    Values are kept in a table of a storage backend. Ids and positions are kept in memory, so a durable backend
+    only loads values when they are used.
+
+    Snapshots share the state of the entity, it's copied when the entity is changed for the first time after
+    a snapshot is taken or restored. Values shared with snapshots are copied when they are read by callbacks.
     """
 
-    def __init__(self, name: str, spec: OpenAPIObject):
+    def __init__(
+        self,
+        name: str,
+        spec: OpenAPIObject,
+        table: typing.Optional[MemoryTable] = None,
+    ):
+        """
+        :param name: a name of the entity schema
+        :param spec: an OpenAPI spec
+        :param table: a table of a storage backend, stored values are restored from it
+        """
         self._name = name
-        self._id_path = parse(spec.components.schemas[name]._x["x-hmt-id-path"])
+        schema = spec.components.schemas[name]
+        self._id_path = parse(schema._x["x-hmt-id-path"])
+        self._fields = (
+            frozenset(schema.properties or {})
+            if isinstance(schema, Schema)
+            else frozenset()
+        )
+        self._indexes = [
+            make_index(field, kind)
+            for field, kind in (get_x(schema, "x-hmt-index") or {}).items()
+        ]
 
         self._path_config: typing.Dict[str, EntityPathItem] = {}
         for pathname, path_item in spec.paths.items():
             if get_x(path_item, "x-hmt-entity") == self.name:
                 self.add_path(pathname, path_item)
 
-        self._data = dict()
+        self._data = MemoryTable() if table is None else table
+        # id -> the position of insertion, kept when an entity is updated like the order of the data
+        self._order: typing.Dict[typing.Any, int] = dict()
+        self._counter = 0
+        # (position, id) in the insertion order, deleted ids are left until the sequence is compacted
+        self._sequence: typing.List[typing.Tuple[int, typing.Any]] = []
+        self._deleted = 0
+        # whether the state is shared with a snapshot
+        self._shared = False
+        # ids of values that are not shared with snapshots, None if there are no shared values
+        self._copied: typing.Optional[typing.Set[typing.Any]] = None
+
+        for position, id, value in self._data.restore(values=len(self._indexes) > 0):
+            self._order[id] = position
+            self._sequence.append((position, id))
+            self._counter = position
+            self._index(id, value)
 
     @property
     def name(self):
         return self._name
 
     def add_path(self, pathname: str, path_item: PathItem):
-        self._path_config[pathname] = EntityPathItem(self.name, pathname, path_item)
+        self._path_config[pathname] = EntityPathItem(
+            self.name,
+            pathname,
+            path_item,
+            self._fields,
+            self._id_path.fields[0]
+            if isinstance(self._id_path, Fields) and len(self._id_path.fields) == 1
+            else None,
+        )
 
     def query(self, path_item: str, request: Request):
         """
-        Queries a set of entities. The current implementation doesn't support filtering.
-        So it always return the full list of entities.
+        Queries a set of entities filtered by query parameters of an http request.
         :param path_item:
         :param request:
-        :return:
+        :return: matching entities in the insertion order
+        """
+        return self.find(self._path_config[path_item].query_filters(request))
+
+    def query_page(
+        self, path_item: str, request: Request
+    ) -> typing.Tuple[typing.List[typing.Any], typing.Optional[str]]:
+        """
+        Queries a page of entities if the list operation has pagination parameters, otherwise all of them.
+        :param path_item:
+        :param request:
+        :return: the page and a value of the Link header if it's enabled and there are other pages
+        """
+        config = self._path_config[path_item]
+        if config.pagination is None:
+            return self.query(path_item, request), None
+
+        selected = page_request(config.pagination, request)
+        page = self.page(config.query_filters(request), selected)
+        return (
+            page.items,
+            link_header(config.pagination, request, selected, page)
+            if config.pagination.link
+            else None,
+        )
+
+    def page(
+        self, filters: typing.Sequence[QueryFilter], page_request: PageRequest
+    ) -> Page:
+        """
+        Finds a page of entities matching all filters. Without filters, a page is taken directly
+        from the insertion order, so it takes time proportional to its size.
+        :param filters: conditions on fields of entities
+        :param page_request: a size and an offset or a position to continue after
+        :return: the page
+        """
+        stop = page_request.offset + page_request.size + 1
+        if len(filters) == 0 and page_request.after is None:
+            self._compact()
+            chunk = [
+                (position, self._data.peek(id))
+                for position, id in self._sequence[page_request.offset : stop]
+            ]
+        else:
+            chunk = list(
+                islice(
+                    self._iter_matching(filters, page_request.after),
+                    page_request.offset,
+                    stop,
+                )
+            )
+
+        items = chunk[: page_request.size]
+        return Page(
+            items=[value for _, value in items],
+            has_more=len(chunk) > page_request.size,
+            last=items[-1][0] if len(items) > 0 else None,
+        )
+
+    def find(self, filters: typing.Sequence[QueryFilter]) -> typing.List[typing.Any]:
+        """
+        Finds entities matching all filters. The smallest set of ids found by an index is checked
+        against the rest of the filters, without indexes all entities are checked.
+        :param filters: conditions on fields of entities
+        :return: matching entities in the insertion order
+        """
+        return [value for _, value in self._iter_matching(filters)]
+
+    def _iter_matching(
+        self, filters: typing.Sequence[QueryFilter], after: typing.Optional[int] = None
+    ) -> typing.Iterator[typing.Tuple[int, typing.Any]]:
+        """
+        Lazily finds entities matching all filters.
+        :param after: a position in the insertion order to start after
+        :return: (position, entity) in the insertion order
         """
-        filter = self._path_config[path_item].filter(request)
-        return [x for x in self._data.values() if filter(x)]
+        candidates: typing.Optional[typing.Collection[typing.Any]] = None
+        consumed: typing.List[QueryFilter] = []
+        for index in self._indexes:
+            supported = [
+                f for f in filters if f.field == index.field and index.supports(f)
+            ]
+            if len(supported) == 0:
+                continue
+            found, matched = index.find(supported)
+            if candidates is None or len(found) < len(candidates):
+                candidates, consumed = found, matched
+
+        remaining = [f for f in filters if all(f is not c for c in consumed)]
+        if candidates is None:
+            # positions are unique, so every entry at a greater position follows (after + 1,)
+            start = 0 if after is None else bisect_left(self._sequence, (after + 1,))
+            ids = (
+                self._sequence[i]
+                for i in range(start, len(self._sequence))
+                if self._order.get(self._sequence[i][1]) == self._sequence[i][0]
+            )
+        else:
+            # ids found by indexes are mostly in the insertion order already, so sorting them is cheap
+            ids = (
+                (self._order[id], id)
+                for id in sorted(candidates, key=self._order.__getitem__)
+            )
+            if after is not None:
+                ids = ((position, id) for position, id in ids if position > after)
+
+        peek = self._data.peek
+        for position, id in ids:
+            value = peek(id)
+            if all(f(value) for f in remaining):
+                yield position, value
 
     def query_one(self, path_item: str, request: Request):
         """
@@ -184,7 +498,7 @@ class Entity:
         :return:
         """
         id = self._path_config[path_item].extract_id(request)
-        return self._data.get(id, {}) if id is not None else {}
+        return self._data.peek(id) if id in self._order else {}
 
     def insert_from_request(self, path_item: str, request: Request) -> typing.Any:
         """
@@ -201,7 +515,8 @@ class Entity:
         if id is None:
             id = self._generate_id()
         entity_val = replace_path(self._id_path, entity_val, id)
-        self._data[id] = entity_val
+        self._set(id, entity_val)
+        self._notify("set", id, entity_val)
         return entity_val
 
     def insert(self, entity):
@@ -210,7 +525,8 @@ class Entity:
         :param entity:
         """
         id = self._extract_id(entity)
-        self._data[id] = entity
+        self._set(id, entity)
+        self._notify("set", id, entity)
         return entity
 
     def upsert_from_request(self, path_item: str, request: Request) -> typing.Any:
@@ -224,43 +540,144 @@ class Entity:
         entity_val = self._path_config[path_item].extract_entity(request)
         id = self._extract_id(entity_val)
         id = self._path_config[path_item].extract_id(request) if id is None else id
-        if id is None or id not in self._data:
+        if id is None or id not in self._order:
             id = self._generate_id() if id is None else id
             entity_val = replace_path(self._id_path, entity_val, id)
-            self._data[id] = entity_val
+            self._set(id, entity_val)
+            self._notify("set", id, entity_val)
             return entity_val
         else:
-            return self._merge(self._data[id], entity_val)
+            merged = self._merge(self[id], entity_val)
+            self._set(id, merged)
+            self._notify("set", id, merged)
+            return merged
 
     def __getitem__(self, key):
+        if self._copied is not None and key not in self._copied:
+            return self._copy(key)
         return self._data[key]
 
     def __contains__(self, key):
-        return key in self._data
+        return key in self._order
 
     def __delitem__(self, key):
+        self._own()
+        del self._order[key]
         del self._data[key]
+        self._deleted += 1
+        self._unindex(key)
+        self._notify("delete", key)
 
     def __setitem__(self, key, value):
-        self._data[key] = value
+        self._set(key, value)
+        self._notify("set", key, value)
 
     def items(self):
+        if self._copied is not None:
+            return [(id, self[id]) for id in list(self._order)]
         return self._data.items()
 
     def values(self):
+        if self._copied is not None:
+            return [self[id] for id in list(self._order)]
         return self._data.values()
 
     def keys(self):
         return self._data.keys()
 
     def get(self, key, default=None):
-        return self._data.get(key, default)
+        return self[key] if key in self._order else default
 
     def clear(self):
+        self._own()
         self._data.clear()
+        self._order.clear()
+        self._sequence.clear()
+        self._deleted = 0
+        for index in self._indexes:
+            index.clear()
+        self._notify("clear")
 
     def __len__(self):
-        return len(self._data)
+        return len(self._order)
+
+    def snapshot(self, name: str) -> EntitySnapshot:
+        """
+        Captures the state of the entity without copying it.
+        :param name: a name of the snapshot
+        :return: the state
+        """
+        self._shared = True
+        self._copied = set() if self._data.shares_values else None
+        return EntitySnapshot(
+            data=self._data.snapshot(name),
+            order=self._order,
+            sequence=self._sequence,
+            counter=self._counter,
+            deleted=self._deleted,
+            indexes=self._indexes,
+        )
+
+    def restore(self, snapshot: EntitySnapshot):
+        """
+        Makes the state of a snapshot the state of the entity without copying it.
+        :param snapshot: a state returned by snapshot
+        """
+        self._data = self._data.restore_snapshot(snapshot.data)
+        self._order = snapshot.order
+        self._sequence = snapshot.sequence
+        self._counter = snapshot.counter
+        self._deleted = snapshot.deleted
+        self._indexes = snapshot.indexes
+        self._shared = True
+        self._copied = set() if self._data.shares_values else None
+
+    def _own(self):
+        if self._shared:
+            self._data = self._data.unshare()
+            self._order = dict(self._order)
+            self._sequence = list(self._sequence)
+            self._indexes = [index.copy() for index in self._indexes]
+            self._shared = False
+
+    def _copy(self, id):
+        # callbacks may change the value in place, so a value shared with snapshots is replaced by a copy
+        value = copy.deepcopy(self._data.peek(id))
+        self._own()
+        self._data[id] = value
+        typing.cast(set, self._copied).add(id)
+        return value
+
+    def _set(self, id, value):
+        self._own()
+        if self._copied is not None:
+            self._copied.add(id)
+        if id in self._order:
+            self._unindex(id)
+            self._data[id] = value
+        else:
+            self._counter += 1
+            self._order[id] = self._counter
+            self._sequence.append((self._counter, id))
+            self._data.insert(id, value, self._counter)
+        self._index(id, value)
+
+    def _compact(self):
+        if self._deleted > 0:
+            self._sequence = [
+                (position, id)
+                for position, id in self._sequence
+                if self._order.get(id) == position
+            ]
+            self._deleted = 0
+
+    def _index(self, id, value):
+        for index in self._indexes:
+            index.add(id, value)
+
+    def _unindex(self, id):
+        for index in self._indexes:
+            index.remove(id)
 
     def _generate_id(self):
         return str(uuid.uuid4())
@@ -0,0 +1,269 @@
+import typing
+from bisect import bisect_left, bisect_right
+from collections.abc import Sequence
+from dataclasses import dataclass
+
+EQ = "eq"
+LT = "lt"
+LTE = "lte"
+GT = "gt"
+GTE = "gte"
+OPERATORS = (EQ, LT, LTE, GT, GTE)
+
+HASH = "hash"
+SORTED = "sorted"
+
+
+def query_value(value: typing.Any) -> typing.Optional[str]:
+    """
+    Converts a field of an entity to the form it has in a query string.
+    :param value: a field of an entity
+    :return: None if the value can't be a part of a query string, e.g. an object
+    """
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if value is None:
+        return "null"
+    if isinstance(value, (str, int, float)):
+        return str(value)
+    return None
+
+
+def sort_key(value: typing.Any) -> typing.Optional[typing.Tuple[int, typing.Any]]:
+    """
+    Makes numbers and strings comparable to each other, numbers go first.
+    :return: None for other values, they can't be compared
+    """
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return (0, value)
+    if isinstance(value, str):
+        return (1, value)
+    return None
+
+
+@dataclass(frozen=True)
+class QueryFilter:
+    """
+    A condition on a field of entities built from a query parameter.
+    """
+
+    field: str
+    """
+    A top-level field of an entity.
+    """
+    operator: str
+    """
+    eq, lt, lte, gt or gte.
+    """
+    values: typing.FrozenSet[str]
+    """
+    Query values of eq filters, any of them matches.
+    """
+    bound: typing.Any = None
+    """
+    A bound of a range filter, converted to the type of the parameter.
+    """
+
+    def __call__(self, entity: typing.Any) -> bool:
+        if not isinstance(entity, dict) or self.field not in entity:
+            return False
+        if self.operator == EQ:
+            return query_value(entity[self.field]) in self.values
+        key = sort_key(entity[self.field])
+        bound = sort_key(self.bound)
+        if key is None or bound is None or key[0] != bound[0]:
+            return False
+        if self.operator == LT:
+            return key < bound
+        elif self.operator == LTE:
+            return key <= bound
+        elif self.operator == GT:
+            return key > bound
+        return key >= bound
+
+
+class HashIndex:
+    """
+    Ids of entities by the query form of a field. Answers eq filters.
+    """
+
+    kind = HASH
+
+    def __init__(self, field: str):
+        self.field = field
+        # dicts keep ids in the insertion order
+        self._ids: typing.Dict[str, typing.Dict[typing.Any, None]] = {}
+        # id -> its key, so entities changed in place can be removed
+        self._keys: typing.Dict[typing.Any, str] = {}
+
+    def add(self, id: typing.Any, entity: typing.Any):
+        key = self._key(entity)
+        if key is not None:
+            self._ids.setdefault(key, {})[id] = None
+            self._keys[id] = key
+
+    def remove(self, id: typing.Any):
+        key = self._keys.pop(id, None)
+        if key is not None:
+            ids = self._ids[key]
+            del ids[id]
+            if len(ids) == 0:
+                del self._ids[key]
+
+    def clear(self):
+        self._ids.clear()
+        self._keys.clear()
+
+    def copy(self) -> "HashIndex":
+        index = HashIndex(self.field)
+        index._ids = {key: dict(ids) for key, ids in self._ids.items()}
+        index._keys = dict(self._keys)
+        return index
+
+    def supports(self, query_filter: QueryFilter) -> bool:
+        return query_filter.operator == EQ
+
+    def find(
+        self, query_filters: typing.Sequence[QueryFilter]
+    ) -> typing.Tuple[typing.Collection[typing.Any], typing.List[QueryFilter]]:
+        """
+        :param query_filters: supported filters on the field of the index
+        :return: found ids and the filters they match
+        """
+        query_filter = min(query_filters, key=lambda f: len(f.values))
+        return self._find(query_filter), [query_filter]
+
+    def _find(self, query_filter: QueryFilter) -> typing.Collection[typing.Any]:
+        if len(query_filter.values) == 1:
+            return self._ids.get(next(iter(query_filter.values)), {})
+        out: typing.Dict[typing.Any, None] = {}
+        for value in query_filter.values:
+            out.update(self._ids.get(value, {}))
+        return out
+
+    def _key(self, entity: typing.Any) -> typing.Optional[str]:
+        if not isinstance(entity, dict) or self.field not in entity:
+            return None
+        return query_value(entity[self.field])
+
+
+class _Span(Sequence):
+    """
+    Ids between two positions of a sorted index, not copied unless they are iterated.
+    """
+
+    def __init__(self, ids: typing.List[typing.Any], start: int, stop: int):
+        self._ids = ids
+        self._start = start
+        self._stop = max(start, stop)
+
+    def __len__(self):
+        return self._stop - self._start
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            raise TypeError("_Span doesn't support slices")
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return self._ids[self._start + i]
+
+    def __iter__(self):
+        return iter(self._ids[self._start : self._stop])
+
+
+class SortedIndex:
+    """
+    Ids of entities ordered by a field with a number or a string value. Answers range filters.
+    """
+
+    kind = SORTED
+
+    def __init__(self, field: str):
+        self.field = field
+        self._keys: typing.List[typing.Tuple[typing.Any, ...]] = []
+        # ids of the keys, they are not compared, so ids may have different types
+        self._ids: typing.List[typing.Any] = []
+        # a sequence number appended to keys makes every key unique
+        self._counter = 0
+        # id -> its key, so entities changed in place can be removed
+        self._keys_by_id: typing.Dict[typing.Any, typing.Tuple[typing.Any, ...]] = {}
+
+    def add(self, id: typing.Any, entity: typing.Any):
+        key = self._key(entity)
+        if key is None:
+            return
+        self._counter += 1
+        full_key = (*key, self._counter)
+        self._keys_by_id[id] = full_key
+        index = bisect_left(self._keys, full_key)
+        self._keys.insert(index, full_key)
+        self._ids.insert(index, id)
+
+    def remove(self, id: typing.Any):
+        full_key = self._keys_by_id.pop(id, None)
+        if full_key is None:
+            return
+        index = bisect_left(self._keys, full_key)
+        del self._keys[index]
+        del self._ids[index]
+
+    def clear(self):
+        self._keys.clear()
+        self._ids.clear()
+        self._keys_by_id.clear()
+
+    def copy(self) -> "SortedIndex":
+        index = SortedIndex(self.field)
+        index._keys = list(self._keys)
+        index._ids = list(self._ids)
+        index._counter = self._counter
+        index._keys_by_id = dict(self._keys_by_id)
+        return index
+
+    def supports(self, query_filter: QueryFilter) -> bool:
+        return query_filter.operator != EQ and sort_key(query_filter.bound) is not None
+
+    def find(
+        self, query_filters: typing.Sequence[QueryFilter]
+    ) -> typing.Tuple[typing.Collection[typing.Any], typing.List[QueryFilter]]:
+        """
+        Finds ids in the intersection of ranges, e.g. of a minimum and a maximum.
+        :param query_filters: supported filters on the field of the index
+        :return: found ids and the filters they match
+        """
+        # keys of other types than the first bound are out of the range
+        group = typing.cast(tuple, sort_key(query_filters[0].bound))[0]
+        lo = bisect_left(self._keys, (group,))
+        hi = bisect_left(self._keys, (group + 1,))
+        consumed = []
+        for query_filter in query_filters:
+            bound = typing.cast(tuple, sort_key(query_filter.bound))
+            if bound[0] != group:
+                return _Span(self._ids, 0, 0), list(query_filters)
+            consumed.append(query_filter)
+            if query_filter.operator == LT:
+                hi = min(hi, bisect_left(self._keys, bound))
+            elif query_filter.operator == LTE:
+                hi = min(hi, bisect_right(self._keys, (*bound, float("inf"))))
+            elif query_filter.operator == GT:
+                lo = max(lo, bisect_right(self._keys, (*bound, float("inf"))))
+            else:
+                lo = max(lo, bisect_left(self._keys, bound))
+        return _Span(self._ids, lo, hi), consumed
+
+    def _key(
+        self, entity: typing.Any
+    ) -> typing.Optional[typing.Tuple[int, typing.Any]]:
+        if not isinstance(entity, dict) or self.field not in entity:
+            return None
+        return sort_key(entity[self.field])
+
+
+def make_index(field: str, kind: str) -> typing.Union[HashIndex, SortedIndex]:
+    if kind == HASH:
+        return HashIndex(field)
+    elif kind == SORTED:
+        return SortedIndex(field)
+    raise ValueError("Unknown index %s of %s, use hash or sorted" % (kind, field))
@@ -1,18 +1,34 @@
+import copy
 import typing
+from dataclasses import dataclass
 
-from hmt.serve.mock.storage.entity import Entity
+from hmt.serve.mock.storage.entity import Entity, EntitySnapshot
+from hmt.serve.utils.observable import Observable
 
 
-class MockData:
+@dataclass(frozen=True)
+class MockDataSnapshot:
+    default: typing.Dict[str, typing.Any]
+    """
+    A copy of the global storage.
+    """
+    entities: typing.Dict[str, EntitySnapshot]
+
+
+class MockData(Observable):
     """
     The MockData object encapsulated a set of entities specific for a single mock.
     It also contains a global default key-value storage that can be used in callbacks to store unstructured data.
     mock_data.entity_name returns an instance of the Entity class if it presents.
     mock_data["some_name"] returns a value from the global storage.
+    Changes of the global storage are reported to a listener as ("set", key, value), ("delete", key) or ("clear",).
     """
 
-    def __init__(self):
-        self._default = dict()
+    def __init__(self, default: typing.Optional[typing.MutableMapping] = None):
+        """
+        :param default: a table of a storage backend for the global storage
+        """
+        self._default = dict() if default is None else default
         self._entities: typing.Dict[str, Entity] = dict()
 
     @property
@@ -25,8 +41,29 @@ class MockData:
     def get_entity(self, name: str) -> Entity:
         return self._entities[name]
 
+    def snapshot(self, name: str) -> MockDataSnapshot:
+        """
+        Captures the state of entities without copying them, the global storage is copied.
+        :param name: a name of the snapshot
+        """
+        return MockDataSnapshot(
+            default=copy.deepcopy(dict(self._default.items())),
+            entities={
+                entity_name: entity.snapshot(name)
+                for entity_name, entity in self._entities.items()
+            },
+        )
+
+    def restore(self, snapshot: MockDataSnapshot):
+        self._default.clear()
+        self._default.update(copy.deepcopy(snapshot.default))
+        for name, entity in self._entities.items():
+            if name in snapshot.entities:
+                entity.restore(snapshot.entities[name])
+
     def clear(self):
         self._default.clear()
+        self._notify("clear")
         for entity in self._entities.values():
             entity.clear()
 
@@ -43,9 +80,11 @@ class MockData:
 
     def __delitem__(self, key):
         del self._default[key]
+        self._notify("delete", key)
 
     def __setitem__(self, key, value):
         self._default[key] = value
+        self._notify("set", key, value)
 
     def get(self, key, default=None):
         return self._default.get(key, default)
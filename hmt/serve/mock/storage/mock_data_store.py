@@ -1,62 +1,287 @@
 import copy
 import logging
 import typing
+from contextlib import contextmanager
+from functools import partial
 
 from hmt.serve.mock.specs import OpenAPISpecification
+from hmt.serve.mock.storage.backend import MemoryBackend, StorageBackend
 from hmt.serve.mock.storage.entity import Entity
-from hmt.serve.mock.storage.mock_data import MockData
+from hmt.serve.mock.storage.mock_data import MockData, MockDataSnapshot
+from hmt.serve.utils.observable import Observable
 from hmt.serve.utils.opanapi_ext import get_x
 
 logger = logging.getLogger(__name__)
 
 
-class MockDataStore:
+class Namespace:
+    """
+    Storages of all mocks for requests of a scope. The storage of a mock is created when it's used for the first
+    time, from the seeded data of the mock shared until it's changed.
+    """
+
+    def __init__(
+        self,
+        default: typing.MutableMapping[str, typing.Any],
+        make_storage: typing.Callable[[str], MockData],
+    ):
+        """
+        :param default: a global storage of requests that don't match a mock
+        :param make_storage: creates the storage of a mock by its name
+        """
+        self.default = default
+        self._make_storage = make_storage
+        self._storages: typing.Dict[str, MockData] = dict()
+
+    def __getitem__(self, mockname: str) -> MockData:
+        storage = self._storages.get(mockname)
+        if storage is None:
+            storage = self._make_storage(mockname)
+            self._storages[mockname] = storage
+        return storage
+
+
+class MockDataStore(Observable):
     """
     The MockDataStore object contains instances of the MockData class for each configured mock.
+    A listener receives ("clear",) and ("reset",) for the whole store, ("entity", mockname, entity_name, *event)
+    for changes of entities and ("default", mockname, *event) for changes of the global storage of a mock.
+    Data is kept by a storage backend, in memory unless another backend is given.
+    Named snapshots are reported as ("snapshot", name) and ("restore", name). Entities share their state with
+    snapshots until they are changed, so taking and restoring a snapshot of the memory backend takes constant time.
+    Snapshots are kept until the store is closed, a durable backend doesn't keep them between runs.
+
+    Requests of a scope use storages of a separate namespace. Changes of them are reported as
+    ("scoped", scope, *event) and dropping a namespace as ("drop", scope).
+    Snapshots, clear and reset apply to storages of requests without a scope, clear and reset drop all namespaces.
     """
 
-    def __init__(self):
+    def __init__(self, backend: typing.Optional[StorageBackend] = None):
+        """
+        :param backend: a storage backend, e.g. SqliteBackend to keep data when a mock server is restarted
+        """
+        self._backend = MemoryBackend() if backend is None else backend
         self._storages: typing.Dict[str, MockData] = dict()
-        self._default = dict()
+        # mock names are sources of specs, so they are never empty
+        self._default = self._backend.table("", "")
         self._specs = dict()
+        self._muted = False
+        self._snapshots: typing.Dict[
+            str,
+            typing.Tuple[
+                typing.Dict[str, typing.Any], typing.Dict[str, MockDataSnapshot]
+            ],
+        ] = dict()
+        # snapshots of mocks made right after they were seeded, restored by reset
+        self._seeds: typing.Dict[str, MockDataSnapshot] = dict()
+        self._namespaces: typing.Dict[str, Namespace] = dict()
+        self._backend.drop_snapshots()
 
     def add_mock(self, spec: OpenAPISpecification):
         """
         Adds a mock. The method automatically creates entities defined in an OpenAPI spec and populates them with
-        data if it is defined in the spec.
+        data if it is defined in the spec, unless the backend has already stored data of the mock.
         :param mockname: a name of a mock
         :param spec: an OpenAPI spec
         """
         self._specs[spec.source] = spec
-
-        storage = MockData()
+        storage = self._make_storage(spec)
         self._storages[spec.source] = storage
+
+        if self._backend.seeded(spec.source):
+            return
+        self._muted = True
+        try:
+            with self._backend.transaction():
+                self._seed(spec, storage)
+        finally:
+            self._muted = False
+
+    def _make_storage(
+        self, spec: OpenAPISpecification, scope: typing.Optional[str] = None
+    ) -> MockData:
+        prefix = () if scope is None else ("scoped", scope)
+        storage = MockData(self._backend.table(spec.source, "", scope))
+        storage.subscribe(self._listen(*prefix, "default", spec.source))
         if spec.api.components is not None and spec.api.components.schemas is not None:
             for name, schema in spec.api.components.schemas.items():
                 if get_x(schema, "x-hmt-id-path") is not None:
-                    storage.add_entity(Entity(name, spec.api))
+                    entity = Entity(
+                        name, spec.api, self._backend.table(spec.source, name, scope)
+                    )
+                    entity.subscribe(self._listen(*prefix, "entity", spec.source, name))
+                    storage.add_entity(entity)
+        return storage
 
+    def _seed(
+        self,
+        spec: OpenAPISpecification,
+        storage: MockData,
+        scope: typing.Optional[str] = None,
+    ):
         for entity, values in get_x(spec.api, "x-hmt-data", dict()).items():
+            entity = storage.get_entity(entity)
             for val in values:
-                storage.get_entity(entity).insert(copy.deepcopy(val))
+                entity.insert(copy.deepcopy(val))
+        self._backend.set_seeded(spec.source, scope)
+        if scope is None:
+            # names of snapshots are never empty
+            self._seeds[spec.source] = storage.snapshot("")
+
+    def _scoped_storage(self, scope: str, mockname: str) -> MockData:
+        spec = self._specs[mockname]
+        storage = self._make_storage(spec, scope)
+        if self._backend.seeded(mockname, scope):
+            return storage
+
+        self._muted = True
+        try:
+            with self._backend.transaction():
+                seed = self._seeds.get(mockname)
+                if seed is None:
+                    self._seed(spec, storage, scope)
+                else:
+                    storage.restore(seed)
+                    self._backend.set_seeded(mockname, scope)
+        finally:
+            self._muted = False
+        return storage
+
+    def namespace(
+        self, scope: typing.Optional[str]
+    ) -> typing.Union["MockDataStore", Namespace]:
+        """
+        Finds storages of requests of a scope, a new namespace is created for a new scope.
+        :param scope: a name of the scope
+        :return: the store itself if the scope is None
+        """
+        if scope is None:
+            return self
+        namespace = self._namespaces.get(scope)
+        if namespace is None:
+            namespace = Namespace(
+                self._backend.table("", "", scope), partial(self._scoped_storage, scope)
+            )
+            self._namespaces[scope] = namespace
+        return namespace
+
+    def scopes(self) -> typing.List[str]:
+        return list(self._namespaces)
+
+    def drop(self, scope: str):
+        """
+        Deletes storages of a scope. They are created from the seeded data again when the scope is used.
+        :param scope: a name of the scope
+        """
+        self._namespaces.pop(scope, None)
+        self._backend.drop(scope)
+        self._notify("drop", scope)
+
+    def _drop_all(self):
+        self._namespaces.clear()
+        self._backend.drop()
+
+    def _listen(self, *prefix):
+        def listener(*event):
+            if not self._muted:
+                self._notify(*prefix, *event)
+
+        return listener
 
     def __getitem__(self, mockname):
         return self._storages[mockname]
 
-    def clear(self):
+    def _clear(self):
         for storage in self._storages.values():
             storage.clear()
         self._default.clear()
+        self._drop_all()
+
+    def clear(self):
+        self._muted = True
+        try:
+            with self._backend.transaction():
+                self._clear()
+        finally:
+            self._muted = False
+        self._notify("clear")
         logger.debug("All storages cleared")
 
     def reset(self):
-        self.clear()
-        for spec in self._specs.values():
-            storage = self._storages[spec.source]
-            for entity, values in get_x(spec.api, "x-hmt-data", dict()).items():
-                entity = storage.get_entity(entity)
-                for val in values:
-                    entity.insert(copy.deepcopy(val))
+        self._muted = True
+        try:
+            with self._backend.transaction():
+                self._default.clear()
+                for spec in self._specs.values():
+                    seed = self._seeds.get(spec.source)
+                    if seed is None:
+                        # data of the mock was stored by a previous run
+                        self._storages[spec.source].clear()
+                        self._seed(spec, self._storages[spec.source])
+                    else:
+                        self._storages[spec.source].restore(seed)
+                self._drop_all()
+        finally:
+            self._muted = False
+        self._notify("reset")
+
+    def snapshot(self, name: str):
+        """
+        Saves the data of all mocks as a named snapshot, replacing a snapshot with the same name.
+        :param name: a name of the snapshot
+        """
+        if name == "":
+            raise ValueError("A snapshot must have a name")
+        with self._backend.transaction():
+            self._snapshots[name] = (
+                copy.deepcopy(dict(self._default.items())),
+                {
+                    mockname: storage.snapshot(name)
+                    for mockname, storage in self._storages.items()
+                },
+            )
+        self._notify("snapshot", name)
+
+    def restore(self, name: str):
+        """
+        Restores the data of all mocks from a snapshot. Mocks added after the snapshot was taken are kept.
+        :param name: a name of the snapshot
+        :raises KeyError: if there is no snapshot with the name
+        """
+        default, storages = self._snapshots[name]
+        self._muted = True
+        try:
+            with self._backend.transaction():
+                self._default.clear()
+                self._default.update(copy.deepcopy(default))
+                for mockname, snapshot in storages.items():
+                    self._storages[mockname].restore(snapshot)
+        finally:
+            self._muted = False
+        self._notify("restore", name)
+
+    def snapshots(self) -> typing.List[str]:
+        return list(self._snapshots)
+
+    @contextmanager
+    def mirroring(self):
+        """
+        Applies changes made by another process that stores them with the same backend.
+        """
+        self._backend.mirroring = True
+        try:
+            yield
+        finally:
+            self._backend.mirroring = False
+
+    def flush(self):
+        """
+        Saves stored values that may have been changed in place, e.g. by callbacks of a request.
+        """
+        self._backend.flush()
+
+    def close(self):
+        self._backend.close()
 
     @property
     def default(self):
@@ -0,0 +1,235 @@
+import base64
+import binascii
+import typing
+from dataclasses import dataclass
+from urllib.parse import urlencode
+
+from http_types import Request
+from openapi_typed_2 import Parameter, PathItem, Schema
+
+from hmt.serve.utils.opanapi_ext import get_x
+
+PAGINATION_EXTENSION = "x-hmt-pagination"
+# a role of a query parameter if its name is not one of the names below
+PAGE_EXTENSION = "x-hmt-page"
+
+OFFSET = "offset"
+PAGE = "page"
+CURSOR = "cursor"
+LIMIT = "limit"
+SIZE = "size"
+
+DEFAULT_NAMES = {
+    "limit": LIMIT,
+    "offset": OFFSET,
+    "page": PAGE,
+    "size": SIZE,
+    "page_size": SIZE,
+    "pageSize": SIZE,
+    "per_page": SIZE,
+    "cursor": CURSOR,
+}
+
+
+@dataclass(frozen=True)
+class Pagination:
+    """
+    Query parameters of a list operation that select a page of entities.
+    """
+
+    style: str
+    """
+    offset (limit and offset), page (page numbers from 1 and size) or cursor (opaque tokens and limit).
+    """
+    parameters: typing.Mapping[str, str]
+    """
+    A role (limit, offset, page, size or cursor) -> the name of the query parameter.
+    """
+    default_size: int
+    """
+    A page size if a request doesn't give it.
+    """
+    max_size: typing.Optional[int]
+    """
+    The largest allowed page size.
+    """
+    link: bool
+    """
+    Whether responses have a Link header with the next and previous pages.
+    """
+
+
+@dataclass(frozen=True)
+class PageRequest:
+    """
+    A page selected by query parameters of a request.
+    """
+
+    size: int
+    offset: int = 0
+    after: typing.Optional[int] = None
+    """
+    The position of the last entity of the previous page in the storage, given by a cursor.
+    """
+
+
+@dataclass(frozen=True)
+class Page:
+    items: typing.List[typing.Any]
+    has_more: bool
+    last: typing.Optional[int]
+    """
+    The position of the last item in the storage.
+    """
+
+
+def get_pagination(path_item: PathItem) -> typing.Optional[Pagination]:
+    """
+    Finds pagination parameters of the GET operation of a path item. Parameters are recognized by their names,
+    e.g. limit and offset, or by the x-hmt-page extension with the role of a parameter.
+    Settings are read from the x-hmt-pagination extension of the operation: size, maxSize and link.
+    :param path_item: a path item of a list of entities
+    :return: None if the operation doesn't have pagination parameters
+    """
+    operation = path_item.get
+    if operation is None:
+        return None
+    parameters = [
+        p
+        for p in list(path_item.parameters or []) + list(operation.parameters or [])
+        if isinstance(p, Parameter) and p._in == "query"
+    ]
+
+    roles: typing.Dict[str, str] = {}
+    schemas: typing.Dict[str, typing.Optional[Schema]] = {}
+    for parameter in parameters:
+        role = get_x(parameter, PAGE_EXTENSION, DEFAULT_NAMES.get(parameter.name))
+        if role is not None:
+            roles[role] = parameter.name
+            schemas[role] = (
+                parameter.schema if isinstance(parameter.schema, Schema) else None
+            )
+
+    if CURSOR in roles:
+        style = CURSOR
+    elif PAGE in roles:
+        style = PAGE
+    elif LIMIT in roles or OFFSET in roles:
+        style = OFFSET
+    else:
+        return None
+
+    size_schema = schemas.get(_size_role(style, roles))
+    config = get_x(operation, PAGINATION_EXTENSION, {})
+    default_size = config.get(
+        "size",
+        size_schema.default
+        if size_schema is not None and isinstance(size_schema.default, int)
+        else 100,
+    )
+    return Pagination(
+        style=style,
+        parameters=roles,
+        default_size=default_size,
+        max_size=config.get(
+            "maxSize", size_schema.maximum if size_schema is not None else None
+        ),
+        link=config.get("link", False),
+    )
+
+
+def _size_role(style: str, roles: typing.Mapping[str, str]) -> str:
+    # pages have a size, other styles a limit, but either may be declared
+    preferred, other = (SIZE, LIMIT) if style == PAGE else (LIMIT, SIZE)
+    return preferred if preferred in roles else other
+
+
+def encode_cursor(position: int) -> str:
+    return base64.urlsafe_b64encode(str(position).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> typing.Optional[int]:
+    """
+    :return: None for an invalid cursor, so the first page is served
+    """
+    try:
+        return int(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (ValueError, binascii.Error):
+        return None
+
+
+def _query_int(request: Request, name: typing.Optional[str]) -> typing.Optional[int]:
+    if name is None:
+        return None
+    value = (request.query or {}).get(name)
+    if isinstance(value, list):
+        value = value[-1] if len(value) > 0 else None
+    if isinstance(value, bytes):
+        value = value.decode("utf-8")
+    try:
+        return int(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def page_request(pagination: Pagination, request: Request) -> PageRequest:
+    """
+    Reads a page from query parameters of a request.
+    """
+    names = pagination.parameters
+    size = _query_int(request, names.get(_size_role(pagination.style, names)))
+    if size is None or size < 0:
+        size = pagination.default_size
+    if pagination.max_size is not None:
+        size = min(size, pagination.max_size)
+
+    if pagination.style == PAGE:
+        page = _query_int(request, names.get(PAGE)) or 1
+        return PageRequest(size=size, offset=max(page - 1, 0) * size)
+    elif pagination.style == CURSOR:
+        cursor = (request.query or {}).get(names[CURSOR])
+        if isinstance(cursor, list):
+            cursor = cursor[-1] if len(cursor) > 0 else None
+        if isinstance(cursor, bytes):
+            cursor = cursor.decode("utf-8")
+        return PageRequest(size=size, after=decode_cursor(cursor) if cursor else None,)
+    offset = _query_int(request, names.get(OFFSET)) or 0
+    return PageRequest(size=size, offset=max(offset, 0))
+
+
+def link_header(
+    pagination: Pagination, request: Request, page_request: PageRequest, page: Page
+) -> typing.Optional[str]:
+    """
+    Builds a Link header with relative references to the next and the previous pages.
+    :return: None if there are no other pages
+    """
+    names = pagination.parameters
+    links = []
+
+    def link(rel, **changes):
+        query = {
+            k: v for k, v in (request.query or {}).items() if k not in names.values()
+        }
+        query.update({names[k]: v for k, v in changes.items() if k in names})
+        size_name = names.get(_size_role(pagination.style, names))
+        if size_name is not None:
+            query[size_name] = page_request.size
+        links.append('<?%s>; rel="%s"' % (urlencode(query, doseq=True), rel))
+
+    if pagination.style == CURSOR:
+        if page.has_more and page.last is not None:
+            link("next", cursor=encode_cursor(page.last))
+    elif pagination.style == PAGE:
+        number = page_request.offset // max(page_request.size, 1) + 1
+        if page.has_more:
+            link("next", page=number + 1)
+        if number > 1:
+            link("prev", page=number - 1)
+    elif OFFSET in names:
+        if page.has_more:
+            link("next", offset=page_request.offset + page_request.size)
+        if page_request.offset > 0:
+            link("prev", offset=max(page_request.offset - page_request.size, 0))
+
+    return ", ".join(links) if len(links) > 0 else None
@@ -0,0 +1,367 @@
+import json
+import logging
+import os
+import sqlite3
+import typing
+from collections import OrderedDict
+from collections.abc import MutableMapping
+from contextlib import contextmanager
+
+from hmt.serve.mock.storage.backend import StorageBackend
+from hmt.serve.utils.json_encoding import dumps
+
+logger = logging.getLogger(__name__)
+
+_decode = json.JSONDecoder().decode
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS records (
+    scope TEXT NOT NULL,
+    mock TEXT NOT NULL,
+    name TEXT NOT NULL,
+    id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    value BLOB NOT NULL,
+    PRIMARY KEY (scope, mock, name, id)
+);
+CREATE INDEX IF NOT EXISTS records_position ON records (scope, mock, name, position);
+CREATE TABLE IF NOT EXISTS snapshot_records (
+    snapshot TEXT NOT NULL,
+    scope TEXT NOT NULL,
+    mock TEXT NOT NULL,
+    name TEXT NOT NULL,
+    id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    value BLOB NOT NULL,
+    PRIMARY KEY (scope, mock, name, snapshot, id)
+);
+CREATE TABLE IF NOT EXISTS mocks (
+    scope TEXT NOT NULL,
+    mock TEXT NOT NULL,
+    seeded INTEGER NOT NULL,
+    PRIMARY KEY (scope, mock)
+);
+"""
+
+
+class SqliteTable(MutableMapping):
+    """
+    Values of an entity or of a global storage of a mock in an SQLite database. Ids and values are stored as JSON.
+    Values are loaded when they are read and the most recently used ones are cached.
+    Values read or set with the dict methods may be changed in place by callbacks, they are saved again
+    by flush if they changed.
+    Snapshots are copies of rows made by the database, values loaded from them are not shared.
+    """
+
+    shares_values = False
+
+    def __init__(
+        self,
+        backend: "SqliteBackend",
+        scope: str,
+        mockname: str,
+        name: str,
+        cache_size: int,
+    ):
+        self._backend = backend
+        self.scope = scope
+        self._mockname = mockname
+        self._name = name
+        self._cache: OrderedDict = OrderedDict()
+        self._cache_size = cache_size
+        # id -> (value, its encoded form when it was lent), values are kept until they are flushed
+        self._lent: typing.Dict[typing.Any, typing.Tuple[typing.Any, bytes]] = {}
+
+    def _execute(self, sql: str, *parameters) -> sqlite3.Cursor:
+        return self._backend.connection.execute(
+            sql, (self.scope, self._mockname, self._name, *parameters)
+        )
+
+    def _write(self, sql: str, *parameters) -> typing.Optional[sqlite3.Cursor]:
+        if self._backend.mirroring:
+            return None
+        return self._execute(sql, *parameters)
+
+    def _cache_value(self, id, value):
+        self._cache[id] = value
+        self._cache.move_to_end(id)
+        if len(self._cache) > self._cache_size:
+            self._cache.popitem(last=False)
+
+    def _load(self, id) -> typing.Tuple[typing.Any, typing.Optional[bytes]]:
+        try:
+            value = self._cache[id]
+            self._cache.move_to_end(id)
+            return value, None
+        except KeyError:
+            pass
+        row = self._execute(
+            "SELECT value FROM records WHERE scope = ? AND mock = ? AND name = ? AND id = ?",
+            _encode_id(id),
+        ).fetchone()
+        if row is None:
+            raise KeyError(id)
+        value = _loads(row[0])
+        self._cache_value(id, value)
+        return value, row[0]
+
+    def peek(self, id) -> typing.Any:
+        return self._load(id)[0]
+
+    def __getitem__(self, id) -> typing.Any:
+        value, encoded = self._load(id)
+        if id not in self._lent:
+            self._lent[id] = (value, dumps(value) if encoded is None else encoded)
+        return value
+
+    def __contains__(self, id) -> bool:
+        if id in self._cache:
+            return True
+        return (
+            self._execute(
+                "SELECT 1 FROM records WHERE scope = ? AND mock = ? AND name = ? AND id = ?",
+                _encode_id(id),
+            ).fetchone()
+            is not None
+        )
+
+    def __setitem__(self, id, value):
+        encoded = dumps(value)
+        self._write(
+            "INSERT INTO records (scope, mock, name, id, position, value) VALUES (?1, ?2, ?3, ?4, "
+            "(SELECT COALESCE(MAX(position), 0) + 1 FROM records WHERE scope = ?1 AND mock = ?2 AND name = ?3), ?5) "
+            "ON CONFLICT (scope, mock, name, id) DO UPDATE SET value = excluded.value",
+            _encode_id(id),
+            encoded,
+        )
+        self._cache_value(id, value)
+        if not self._backend.mirroring:
+            self._lent[id] = (value, encoded)
+
+    def insert(self, id, value, position: int):
+        """
+        Adds a value with a new id at a position of the insertion order.
+        """
+        self._write(
+            "INSERT OR REPLACE INTO records (scope, mock, name, id, position, value) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            _encode_id(id),
+            position,
+            dumps(value),
+        )
+        self._cache_value(id, value)
+        self._lent.pop(id, None)
+
+    def __delitem__(self, id):
+        cursor = self._write(
+            "DELETE FROM records WHERE scope = ? AND mock = ? AND name = ? AND id = ?",
+            _encode_id(id),
+        )
+        cached = self._cache.pop(id, None) is not None
+        self._lent.pop(id, None)
+        if cursor is not None and cursor.rowcount == 0 and not cached:
+            raise KeyError(id)
+
+    def clear(self):
+        self._write("DELETE FROM records WHERE scope = ? AND mock = ? AND name = ?")
+        self._cache.clear()
+        self._lent.clear()
+
+    def __iter__(self) -> typing.Iterator[typing.Any]:
+        for (id,) in self._execute(
+            "SELECT id FROM records WHERE scope = ? AND mock = ? AND name = ? ORDER BY position"
+        ):
+            yield _decode(id)
+
+    def __len__(self) -> int:
+        return self._execute(
+            "SELECT COUNT(*) FROM records WHERE scope = ? AND mock = ? AND name = ?"
+        ).fetchone()[0]
+
+    def restore(
+        self, values: bool = False
+    ) -> typing.Iterator[typing.Tuple[int, typing.Any, typing.Any]]:
+        """
+        Lists stored ids without caching their values.
+        :param values: whether to read values, e.g. to build indexes
+        :return: (position, id, value or None) in the insertion order
+        """
+        for position, id, value in self._execute(
+            "SELECT position, id, %s FROM records WHERE scope = ? AND mock = ? AND name = ? ORDER BY position"
+            % ("value" if values else "NULL")
+        ):
+            yield position, _decode(id), _loads(value) if values else None
+
+    def flush(self):
+        """
+        Saves lent values that were changed in place.
+        """
+        if len(self._lent) == 0:
+            return
+        lent, self._lent = self._lent, {}
+        for id, (value, encoded) in lent.items():
+            changed = dumps(value)
+            if changed != encoded:
+                self._write(
+                    "UPDATE records SET value = ?5 WHERE scope = ?1 AND mock = ?2 AND name = ?3 AND id = ?4",
+                    _encode_id(id),
+                    changed,
+                )
+
+    def snapshot(self, name: str) -> typing.Tuple[str, str, str]:
+        """
+        :return: the scope, the mock and the name of the snapshot
+        """
+        self.flush()
+        self._write(
+            "DELETE FROM snapshot_records WHERE scope = ?1 AND mock = ?2 AND name = ?3 AND snapshot = ?4",
+            name,
+        )
+        self._write(
+            "INSERT INTO snapshot_records (snapshot, scope, mock, name, id, position, value) "
+            "SELECT ?4, scope, mock, name, id, position, value FROM records "
+            "WHERE scope = ?1 AND mock = ?2 AND name = ?3",
+            name,
+        )
+        return self.scope, self._mockname, name
+
+    def restore_snapshot(self, state: typing.Tuple[str, str, str]) -> "SqliteTable":
+        """
+        :param state: a snapshot of this table or of the same table of another scope
+        """
+        self._write("DELETE FROM records WHERE scope = ? AND mock = ? AND name = ?")
+        self._write(
+            "INSERT INTO records (scope, mock, name, id, position, value) "
+            "SELECT ?1, ?2, ?3, id, position, value FROM snapshot_records "
+            "WHERE scope = ?4 AND mock = ?5 AND name = ?3 AND snapshot = ?6",
+            *state,
+        )
+        self._cache.clear()
+        self._lent.clear()
+        return self
+
+    def unshare(self) -> "SqliteTable":
+        return self
+
+
+def _loads(encoded: bytes) -> typing.Any:
+    return _decode(encoded.decode("utf-8"))
+
+
+def _encode_id(id: typing.Any) -> str:
+    # ids keep their types, so 1 and "1" are different ids like in a dict
+    return dumps(id).decode("utf-8")
+
+
+class SqliteBackend(StorageBackend):
+    """
+    Stores data of mocks in an SQLite database file, so it's kept when a mock server is restarted.
+    Changes are written to the write-ahead log when they are made, ids are loaded when a mock is added
+    and values when they are used.
+    Processes forked after the backend is created open their own connections.
+    """
+
+    def __init__(self, path: str, cache_size: int = 10000):
+        """
+        :param path: a database file, created if it doesn't exist
+        :param cache_size: a number of values of every table kept in memory
+        """
+        self._path = path
+        self._cache_size = cache_size
+        self._tables: typing.List[SqliteTable] = []
+        self._connection: typing.Optional[sqlite3.Connection] = None
+        self._pid: typing.Optional[int] = None
+        # connections of a parent process must not be used or closed in a forked process
+        self._inherited: typing.List[sqlite3.Connection] = []
+        self._depth = 0
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        if self._connection is None or self._pid != os.getpid():
+            if self._connection is not None:
+                self._inherited.append(self._connection)
+            self._connection = self._connect()
+            self._pid = os.getpid()
+        return self._connection
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self._path, isolation_level=None)
+        connection.execute("PRAGMA journal_mode = WAL")
+        # commits are durable when a process crashes, the log is synced to the disk on checkpoints
+        connection.execute("PRAGMA synchronous = NORMAL")
+        connection.execute("PRAGMA busy_timeout = 5000")
+        connection.executescript(SCHEMA)
+        logger.debug("Opened storage %s", self._path)
+        return connection
+
+    def table(
+        self, mockname: str, name: str, scope: typing.Optional[str] = None
+    ) -> SqliteTable:
+        table = SqliteTable(self, scope or "", mockname, name, self._cache_size)
+        self._tables.append(table)
+        return table
+
+    def seeded(self, mockname: str, scope: typing.Optional[str] = None) -> bool:
+        row = self.connection.execute(
+            "SELECT seeded FROM mocks WHERE scope = ? AND mock = ?",
+            (scope or "", mockname),
+        ).fetchone()
+        return row is not None and bool(row[0])
+
+    def set_seeded(self, mockname: str, scope: typing.Optional[str] = None):
+        if not self.mirroring:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO mocks (scope, mock, seeded) VALUES (?, ?, 1)",
+                (scope or "", mockname),
+            )
+
+    def drop(self, scope: typing.Optional[str] = None):
+        self._tables = [
+            table
+            for table in self._tables
+            if (table.scope == "" if scope is None else table.scope != scope)
+        ]
+        if not self.mirroring:
+            with self.transaction():
+                for table in ("records", "snapshot_records", "mocks"):
+                    if scope is None:
+                        self.connection.execute(
+                            "DELETE FROM %s WHERE scope != ''" % table
+                        )
+                    else:
+                        self.connection.execute(
+                            "DELETE FROM %s WHERE scope = ?" % table, (scope,)
+                        )
+
+    def drop_snapshots(self):
+        if not self.mirroring:
+            self.connection.execute("DELETE FROM snapshot_records")
+
+    @contextmanager
+    def transaction(self):
+        """
+        Commits changes at once, nested transactions are a part of the outer one.
+        """
+        if self._depth == 0:
+            self.connection.execute("BEGIN IMMEDIATE")
+        self._depth += 1
+        try:
+            yield
+        except BaseException:
+            self._depth -= 1
+            if self._depth == 0:
+                self.connection.execute("ROLLBACK")
+            raise
+        self._depth -= 1
+        if self._depth == 0:
+            self.connection.execute("COMMIT")
+
+    def flush(self):
+        for table in self._tables:
+            table.flush()
+
+    def close(self):
+        if self._connection is not None and self._pid == os.getpid():
+            self.flush()
+            self._connection.close()
+        self._connection = None
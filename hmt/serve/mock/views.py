@@ -1,12 +1,16 @@
 import datetime
 import logging
 from dataclasses import asdict
+from typing import Optional
 from urllib import parse
 
 from http_types import RequestBuilder
 from tornado.web import RequestHandler
 
+from ..utils.json_encoding import StreamedResponse, encoded_body
+from ..utils.metrics import LOGGING, ROUTING, WRITING, MetricsRegistry, Stopwatch
 from ..utils.routing import Routing
+from ..utils.timers import REQUEST, timed
 from .log import Log
 from .request_processor import RequestProcessor
 
@@ -21,37 +25,44 @@ class MockServerView(RequestHandler):
     SUPPORTED_METHODS = ["GET", "POST", "HEAD", "DELETE", "PATCH", "PUT", "OPTIONS"]
 
     def initialize(
-        self, request_processor: RequestProcessor, router: Routing, http_log: Log,
+        self,
+        request_processor: RequestProcessor,
+        router: Routing,
+        http_log: Log,
+        metrics: Optional[MetricsRegistry] = None,
     ):
         self._request_processor = request_processor
         self._router = router
         self._http_log = http_log
+        self._metrics = metrics
 
     def set_default_headers(self):
         self.set_header("Content-Type", 'application/json; charset="utf-8"')
 
-    def get(self, **kwargs):
-        self._serve()
+    async def get(self, **kwargs):
+        await self._serve()
 
-    def post(self):
-        self._serve()
+    async def post(self):
+        await self._serve()
 
-    def head(self, **kwargs):
-        self._serve()
+    async def head(self, **kwargs):
+        await self._serve()
 
-    def delete(self, **kwargs):
-        self._serve()
+    async def delete(self, **kwargs):
+        await self._serve()
 
-    def patch(self, **kwargs):
-        self._serve()
+    async def patch(self, **kwargs):
+        await self._serve()
 
-    def put(self, **kwargs):
-        self._serve()
+    async def put(self, **kwargs):
+        await self._serve()
 
-    def options(self, **kwargs):
-        self._serve()
+    async def options(self, **kwargs):
+        await self._serve()
 
-    def _serve(self):
+    @timed(name=REQUEST)
+    async def _serve(self):
+        stopwatch = Stopwatch()
         headers = {k: v for k, v in self.request.headers.get_all()}
         route_info = self._router.route(self.request.path, headers)
         headers["Host"] = route_info.host
@@ -85,13 +96,29 @@ class MockServerView(RequestHandler):
             }
         )
 
-        logger.debug("Processing request: %s", asdict(request))
-        response = self._request_processor.process(request)
-        logger.debug("Resolved response: %s", asdict(response))
+        stopwatch.lap(ROUTING)
+
+        # asdict copies the whole bodies, so it's only called when they are logged
+        debug = logger.isEnabledFor(logging.DEBUG)
+        if debug:
+            logger.debug("Processing request: %s", asdict(request))
+        response = await self._request_processor.process(request, stopwatch)
+        if debug:
+            logger.debug("Resolved response: %s", asdict(response))
 
         for header, value in response.headers.items():
             self.set_header(header, value)
         self._http_log.put(request, response)
+        stopwatch.lap(LOGGING)
         self.set_status(response.statusCode)
-        self.write(response.body)
+        if isinstance(response, StreamedResponse):
+            # without Content-Length, flushed chunks are sent with chunked transfer encoding
+            for chunk in response.chunks:
+                self.write(chunk)
+                await self.flush()
+        else:
+            self.write(encoded_body(response))
+        stopwatch.lap(WRITING)
+        if self._metrics is not None:
+            self._metrics.observe(stopwatch, request.method.value, response.statusCode)
         logger.debug("Handled writing response")
@@ -0,0 +1,276 @@
+import logging
+import os
+import pickle
+import struct
+import typing
+from multiprocessing.connection import Connection
+from multiprocessing.reduction import ForkingPickler
+
+from tornado.ioloop import IOLoop, PeriodicCallback
+
+from hmt.serve.mock.rest import RestMiddlewareManager
+from hmt.serve.mock.scope import Scope
+from hmt.serve.mock.storage.mock_data_store import MockDataStore
+from hmt.serve.utils.metrics import MetricsRegistry
+
+logger = logging.getLogger(__name__)
+
+
+class _Channel:
+    """
+    Exchanges messages over one end of a multiprocessing.Pipe without blocking.
+    Messages are framed like the ones of Connection.send. Outgoing messages are queued and written
+    while the pipe accepts them, incoming bytes are buffered until a message is complete, so two processes
+    writing to each other at once never wait for each other.
+    """
+
+    _HEADER = struct.Struct("!i")
+
+    def __init__(self, connection: Connection):
+        self.connection = connection
+        self.fd = connection.fileno()
+        os.set_blocking(self.fd, False)
+        self._outgoing = bytearray()
+        self._incoming = bytearray()
+        self.closed = False
+        """
+        Whether the other end was closed.
+        """
+
+    def send(self, message: typing.Any) -> bool:
+        """
+        :return: whether a part of the message is still queued
+        """
+        payload = ForkingPickler.dumps(message)
+        self._outgoing += self._HEADER.pack(len(payload))
+        self._outgoing += payload
+        return self.flush()
+
+    def flush(self) -> bool:
+        """
+        Writes queued messages until the pipe is full.
+        :return: whether anything is still queued
+        """
+        while len(self._outgoing) > 0:
+            try:
+                written = os.write(self.fd, self._outgoing)
+            except BlockingIOError:
+                break
+            del self._outgoing[:written]
+        return len(self._outgoing) > 0
+
+    def receive(self) -> typing.List[typing.Any]:
+        """
+        Reads what the pipe holds.
+        :return: messages completed by the read data
+        """
+        while True:
+            try:
+                data = os.read(self.fd, 1 << 16)
+            except BlockingIOError:
+                break
+            if len(data) == 0:
+                self.closed = True
+                break
+            self._incoming += data
+        messages = []
+        size = self._HEADER.size
+        while len(self._incoming) >= size:
+            (length,) = self._HEADER.unpack_from(self._incoming)
+            if len(self._incoming) < size + length:
+                break
+            messages.append(pickle.loads(self._incoming[size : size + length]))
+            del self._incoming[: size + length]
+        return messages
+
+
+class SharedState:
+    """
+    The SharedState object keeps the scope, the mock data store and the REST middlewares of
+    mock server processes in sync. Local changes are sent to all connected processes as
+    (target, event) messages and changes received from the connections are applied locally.
+    The admin process forwards changes of every worker to the other workers.
+    Workers also send their metrics to the admin process, which serves the metrics of all workers.
+    Messages are written when a connection is writable, so processes sending many changes to each other
+    don't block each other.
+    """
+
+    def __init__(
+        self,
+        scope: Scope,
+        mock_data_store: MockDataStore,
+        rest_middleware_manager: RestMiddlewareManager,
+        metrics: typing.Optional[MetricsRegistry] = None,
+    ):
+        self._scope = scope
+        self._mock_data_store = mock_data_store
+        self._rest_middleware_manager = rest_middleware_manager
+        self._metrics = metrics
+        self._channels: typing.List[_Channel] = []
+        self._applying = False
+
+        scope.subscribe(self._listen("scope"))
+        mock_data_store.subscribe(self._listen("storage"))
+        rest_middleware_manager.subscribe(self._listen("middleware"))
+
+    def _listen(self, target: str):
+        def listener(*event):
+            if not self._applying:
+                self.broadcast((target, event))
+
+        return listener
+
+    def connect(
+        self,
+        connection: Connection,
+        forward: bool = False,
+        on_close: typing.Optional[typing.Callable[[], None]] = None,
+    ):
+        """
+        Starts exchanging changes over a connection. Must be called from a running or a ready-to-run IOLoop.
+        :param connection: one end of a multiprocessing.Pipe
+        :param forward: whether to send changes received from the connection to all other connections
+        :param on_close: called when the other end of the connection is closed
+        """
+        channel = _Channel(connection)
+        self._channels.append(channel)
+
+        def on_events(fd, events):
+            if events & IOLoop.WRITE and not channel.flush():
+                IOLoop.current().update_handler(connection, IOLoop.READ)
+            if events & IOLoop.READ:
+                self._receive(channel, forward, on_close)
+
+        # the IOLoop closes the connection itself, not only its descriptor, if it's closed with all_fds
+        IOLoop.current().add_handler(connection, on_events, IOLoop.READ)
+
+    def share_metrics(self, process: typing.Any, interval: float = 1.0):
+        """
+        Periodically sends metrics of this process if they changed. Must be called from a running or a ready-to-run IOLoop.
+        :param process: an identifier of this process, e.g. the index of a worker
+        :param interval: seconds between checks
+        """
+        if self._metrics is None:
+            return
+        metrics = self._metrics
+        sent = [0]
+
+        def send():
+            if metrics.observations != sent[0]:
+                sent[0] = metrics.observations
+                self.broadcast(("metrics", (process, metrics.export())))
+
+        PeriodicCallback(send, interval * 1000).start()
+
+    def broadcast(self, message, exclude: typing.Optional[_Channel] = None):
+        for channel in self._channels:
+            if channel is exclude:
+                continue
+            try:
+                if channel.send(message):
+                    # the rest is written when the connection is writable
+                    IOLoop.current().update_handler(
+                        channel.connection, IOLoop.READ | IOLoop.WRITE
+                    )
+            except Exception as e:
+                logger.warning("Could not share a change %s: %s", message, e)
+
+    def _receive(
+        self,
+        channel: _Channel,
+        forward: bool,
+        on_close: typing.Optional[typing.Callable[[], None]],
+    ):
+        try:
+            messages = channel.receive()
+        except OSError:
+            messages = []
+            channel.closed = True
+        for message in messages:
+            self.apply(*message)
+            # metrics are only collected by the admin process
+            if forward and message[0] != "metrics":
+                self.broadcast(message, exclude=channel)
+        if channel.closed:
+            IOLoop.current().remove_handler(channel.connection)
+            self._channels.remove(channel)
+            channel.connection.close()
+            if on_close is not None:
+                on_close()
+
+    def apply(self, target: str, event: typing.Sequence[typing.Any]):
+        """
+        Applies a change received from another process without sharing it again.
+        :param target: scope, storage, middleware or metrics
+        :param event: an event reported by the target
+        """
+        self._applying = True
+        try:
+            if target == "scope":
+                self._apply_scope(*event)
+            elif target == "middleware":
+                self._apply_middleware(*event)
+            elif target == "metrics":
+                if self._metrics is not None:
+                    self._metrics.update_process(*event)
+            elif target == "storage":
+                # the process that made the change has stored it
+                with self._mock_data_store.mirroring():
+                    self._apply_storage(*event)
+            else:
+                logger.warning("Unknown shared state target %s", target)
+        finally:
+            self._applying = False
+
+    def _apply_scope(self, change, *args):
+        if change == "set":
+            self._scope.set(args[0])
+        elif change == "clear":
+            self._scope.clear()
+
+    def _apply_middleware(self, change, url, *args):
+        if change == "add":
+            self._rest_middleware_manager.add(url, *args)
+        elif change == "clear" and (
+            not url or url in self._rest_middleware_manager.get()
+        ):
+            self._rest_middleware_manager.clear(url)
+
+    def _apply_storage(self, change, *args):
+        if change == "scoped":
+            scope, scoped_change, *scoped_args = args
+            self._apply_mock_change(
+                self._mock_data_store.namespace(scope), scoped_change, *scoped_args
+            )
+        elif change == "drop":
+            self._mock_data_store.drop(args[0])
+        elif change == "clear":
+            self._mock_data_store.clear()
+        elif change == "reset":
+            self._mock_data_store.reset()
+        elif change == "snapshot":
+            self._mock_data_store.snapshot(args[0])
+        elif change == "restore" and args[0] in self._mock_data_store.snapshots():
+            self._mock_data_store.restore(args[0])
+        else:
+            self._apply_mock_change(self._mock_data_store, change, *args)
+
+    def _apply_mock_change(self, storages, change, *args):
+        if change == "entity":
+            mockname, entity_name, entity_change, *entity_args = args
+            entity = storages[mockname].get_entity(entity_name)
+            if entity_change == "set":
+                entity[entity_args[0]] = entity_args[1]
+            elif entity_change == "delete" and entity_args[0] in entity:
+                del entity[entity_args[0]]
+            elif entity_change == "clear":
+                entity.clear()
+        elif change == "default":
+            mockname, default_change, *default_args = args
+            storage = storages[mockname]
+            if default_change == "set":
+                storage[default_args[0]] = default_args[1]
+            elif default_change == "delete" and default_args[0] in storage:
+                del storage[default_args[0]]
+            elif default_change == "clear":
+                storage.clear()
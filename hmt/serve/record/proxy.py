@@ -3,8 +3,10 @@ import logging
 import tornado.ioloop
 from http_types import Request, Response
 
+from hmt.serve.admin import start_profiler_admin
 from hmt.serve.utils.data_callback import RequestLoggingCallback
 from hmt.serve.utils.routing import HeaderRouting
+from hmt.serve.utils.timers import REQUEST, timed
 
 from .channel import Channel
 from .proxy_callback import ProxyCallback
@@ -48,15 +50,23 @@ class RecordProxy(ProxyBase):
     def _create_channel(self, stream, client_address):
         return Channel(self, stream, client_address, self.router)
 
+    @timed(name=REQUEST)
     def on_request_complete(self, request: Request, response: Response):
         self._data_callback.log(request, response)
 
 
 class RecordProxyRunner:
     def __init__(
-        self, port, log_dir, specs_dir, routing=HeaderRouting(), mode=None,
+        self,
+        port,
+        log_dir,
+        specs_dir,
+        routing=HeaderRouting(),
+        mode=None,
+        admin_port=None,
     ):
         self._port = port
+        self._admin_port = admin_port
         self._log_dir = log_dir
         self._specs_dir = specs_dir
         self._routing = routing
@@ -74,5 +84,7 @@ class RecordProxyRunner:
         ) as callback:
             server = RecordProxy(callback, self._routing)
             server.listen(self._port)
+            if self._admin_port:
+                start_profiler_admin(self._admin_port)
             logger.info("HMT is running")
             tornado.ioloop.IOLoop.instance().start()
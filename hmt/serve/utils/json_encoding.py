@@ -0,0 +1,106 @@
+import json
+import typing
+
+from http_types import Response
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+
+def dumps(obj: typing.Any) -> bytes:
+    """
+    Serializes an object to compact JSON. orjson is used if it's installed,
+    objects it can't serialize, e.g. integers larger than 64 bits, fall back to the json module.
+    :param obj: a JSON-compatible object
+    :return: UTF-8 encoded JSON
+    """
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj)
+        except TypeError:
+            pass
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+class EncodedResponse(Response):
+    """
+    A response that also carries its body encoded to bytes, so it's not encoded again when it's written.
+    The encoded body is not a dataclass field, so it's left out when the response is converted to a dict.
+    """
+
+    shared = False
+    """
+    Whether the response is served more than once or holds stored data, so callbacks must not change it in place.
+    """
+
+    def __init__(self, encoded: bytes, **kwargs):
+        """
+        :param encoded: the body encoded to UTF-8
+        :param kwargs: fields of the response, the body is decoded from the encoded body if it's missing
+        """
+        super().__init__(
+            **{"body": encoded.decode("utf-8"), **kwargs}  # type: ignore
+        )
+        self.encoded = encoded
+
+
+class StreamedResponse(Response):
+    """
+    A response whose body is generated in chunks while it's written. Its body field is empty.
+    """
+
+    def __init__(self, chunks: typing.Iterator[bytes], **kwargs):
+        """
+        :param chunks: an iterator of the encoded body
+        :param kwargs: fields of the response
+        """
+        super().__init__(**{"body": "", **kwargs})  # type: ignore
+        self.chunks = chunks
+
+    def materialize(self) -> EncodedResponse:
+        """
+        Generates the whole body, e.g. for callbacks that need it.
+        :return: the same response with the complete body
+        """
+        encoded = b"".join(self.chunks)
+        return EncodedResponse(
+            encoded,
+            statusCode=self.statusCode,
+            headers=self.headers,
+            bodyAsJson=json.loads(encoded),
+            timestamp=self.timestamp,
+        )
+
+
+def dumps_array(
+    items: typing.Iterable[typing.Any], chunk_size: int = 64 * 1024
+) -> typing.Iterator[bytes]:
+    """
+    Serializes items to a JSON array lazily.
+    :param items: JSON-compatible objects
+    :param chunk_size: a minimal size of chunks except the last one
+    :return: an iterator of chunks of the encoded array
+    """
+    chunk = bytearray(b"[")
+    separator = b""
+    for item in items:
+        chunk += separator
+        chunk += dumps(item)
+        separator = b","
+        if len(chunk) >= chunk_size:
+            yield bytes(chunk)
+            chunk = bytearray()
+    chunk += b"]"
+    yield bytes(chunk)
+
+
+def encoded_body(response: Response) -> bytes:
+    """
+    :param response: a response
+    :return: the body of the response encoded to UTF-8
+    """
+    if isinstance(response, EncodedResponse):
+        return response.encoded
+    return response.body.encode("utf-8")
@@ -0,0 +1,246 @@
+import time
+import typing
+from bisect import bisect_left
+
+MIDDLEWARE = "middleware"
+SECURITY = "security"
+ROUTING = "routing"
+MATCH = "match"
+VALIDATION = "validation"
+FAKING = "faking"
+CALLBACKS = "callbacks"
+LOGGING = "logging"
+WRITING = "writing"
+TOTAL = "total"
+
+# upper bounds of histogram buckets in seconds, the last bucket has no bound
+BUCKETS = (
+    0.00001,
+    0.000025,
+    0.00005,
+    0.0001,
+    0.00025,
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+# (spec, path, method, status)
+RouteKey = typing.Tuple[str, str, str, int]
+# counts of the buckets and the sum of observed seconds by stage
+Series = typing.Dict[str, typing.List[typing.Any]]
+
+
+class Stopwatch:
+    """
+    Times the stages of a single request. Every lap adds the time since the previous lap to a stage,
+    so consecutive stages are measured with one clock reading each.
+    """
+
+    __slots__ = ("stages", "spec", "path", "_last")
+
+    def __init__(self):
+        self.stages: typing.Dict[str, float] = {}
+        self.spec = ""
+        """
+        The source of the spec that matched the request, empty if none did.
+        """
+        self.path = ""
+        """
+        The path item of the spec that matched the request, so requests of an endpoint share their series.
+        """
+        self._last = time.perf_counter()
+
+    def lap(self, stage: str):
+        now = time.perf_counter()
+        self.stages[stage] = self.stages.get(stage, 0.0) + now - self._last
+        self._last = now
+
+
+class MetricsRegistry:
+    """
+    Counters and latency histograms of requests by spec, path, method, status and stage,
+    kept in memory of the process. Worker processes share their series with the admin process,
+    which reports the sum of all processes.
+    """
+
+    def __init__(self):
+        self._routes: typing.Dict[RouteKey, Series] = {}
+        self._processes: typing.Dict[typing.Any, typing.Dict[RouteKey, Series]] = {}
+        self._started = time.time()
+        self.observations = 0
+        """
+        A number of observed requests, e.g. to find out whether the series changed.
+        """
+
+    def observe(self, stopwatch: Stopwatch, method: str, status: int):
+        """
+        Records the stages of a request and their total time.
+        """
+        key = (stopwatch.spec, stopwatch.path, method, status)
+        route = self._routes.get(key)
+        if route is None:
+            route = self._routes[key] = {}
+        total = 0.0
+        for stage, seconds in stopwatch.stages.items():
+            total += seconds
+            values = route.get(stage)
+            if values is None:
+                values = route[stage] = [[0] * (len(BUCKETS) + 1), 0.0]
+            values[0][bisect_left(BUCKETS, seconds)] += 1
+            values[1] += seconds
+        values = route.get(TOTAL)
+        if values is None:
+            values = route[TOTAL] = [[0] * (len(BUCKETS) + 1), 0.0]
+        values[0][bisect_left(BUCKETS, total)] += 1
+        values[1] += total
+        self.observations += 1
+
+    def export(self) -> typing.Dict[RouteKey, Series]:
+        """
+        :return: a copy of the series of this process that can be sent to another process
+        """
+        return {
+            key: {
+                stage: [list(counts), total] for stage, (counts, total) in route.items()
+            }
+            for key, route in self._routes.items()
+        }
+
+    def update_process(
+        self, process: typing.Any, routes: typing.Dict[RouteKey, Series]
+    ):
+        """
+        Replaces the series received from another process.
+        :param process: an identifier of the process, e.g. the index of a worker
+        :param routes: series exported by the process
+        """
+        self._processes[process] = routes
+
+    def _merged(
+        self,
+    ) -> typing.List[
+        typing.Tuple[RouteKey, typing.List[typing.Tuple[str, typing.Any]]]
+    ]:
+        merged = self.export()
+        for routes in self._processes.values():
+            for key, route in routes.items():
+                merged_route = merged.setdefault(key, {})
+                for stage, (counts, total) in route.items():
+                    values = merged_route.get(stage)
+                    if values is None:
+                        merged_route[stage] = [list(counts), total]
+                    else:
+                        values[0] = [a + b for a, b in zip(values[0], counts)]
+                        values[1] += total
+        return [(key, sorted(route.items())) for key, route in sorted(merged.items())]
+
+    def to_json(self) -> typing.Dict[str, typing.Any]:
+        """
+        :return: a route for every (spec, path, method, status) with its number of requests, requests per second
+            since the registry was created and the count, mean and quantiles of every stage in seconds
+        """
+        uptime = max(time.time() - self._started, 1e-9)
+        routes = []
+        for (spec, path, method, status), stages in self._merged():
+            route = dict(spec=spec, path=path, method=method, status=status, stages={})
+            for stage, (counts, total) in stages:
+                count = sum(counts)
+                route["stages"][stage] = dict(
+                    count=count,
+                    sum=total,
+                    mean=total / count if count > 0 else 0.0,
+                    p50=_quantile(counts, 0.5),
+                    p90=_quantile(counts, 0.9),
+                    p99=_quantile(counts, 0.99),
+                )
+                if stage == TOTAL:
+                    route["count"] = count
+                    route["rate"] = count / uptime
+            routes.append(route)
+        return dict(uptime=uptime, routes=routes)
+
+    def to_prometheus(self) -> str:
+        """
+        :return: the series in the Prometheus text exposition format
+        """
+        merged = self._merged()
+        lines = [
+            "# HELP hmt_requests_total Requests served by the mock server.",
+            "# TYPE hmt_requests_total counter",
+        ]
+        for (spec, path, method, status), stages in merged:
+            for stage, (counts, _) in stages:
+                if stage == TOTAL:
+                    lines.append(
+                        "hmt_requests_total{%s} %d"
+                        % (
+                            _labels(spec=spec, path=path, method=method, status=status),
+                            sum(counts),
+                        )
+                    )
+        lines.append(
+            "# HELP hmt_request_duration_seconds Time spent in stages of handling requests."
+        )
+        lines.append("# TYPE hmt_request_duration_seconds histogram")
+        for (spec, path, method, status), stages in merged:
+            for stage, (counts, total) in stages:
+                labels = _labels(
+                    spec=spec, path=path, method=method, status=status, stage=stage
+                )
+                cumulative = 0
+                for bound, count in zip(BUCKETS + (float("inf"),), counts):
+                    cumulative += count
+                    lines.append(
+                        'hmt_request_duration_seconds_bucket{%s,le="%s"} %d'
+                        % (
+                            labels,
+                            "+Inf" if bound == float("inf") else repr(bound),
+                            cumulative,
+                        )
+                    )
+                lines.append(
+                    "hmt_request_duration_seconds_sum{%s} %r" % (labels, total)
+                )
+                lines.append(
+                    "hmt_request_duration_seconds_count{%s} %d" % (labels, cumulative)
+                )
+        return "\n".join(lines) + "\n"
+
+
+def _quantile(counts: typing.Sequence[int], q: float) -> float:
+    # interpolates linearly inside the bucket of the quantile, like histogram_quantile of Prometheus
+    rank = q * sum(counts)
+    if rank == 0:
+        return 0.0
+    cumulative = 0
+    for i, count in enumerate(counts):
+        if cumulative + count >= rank and count > 0:
+            if i == len(BUCKETS):
+                return BUCKETS[-1]
+            lower = BUCKETS[i - 1] if i > 0 else 0.0
+            return lower + (BUCKETS[i] - lower) * (rank - cumulative) / count
+        cumulative += count
+    return BUCKETS[-1]
+
+
+def _labels(**labels) -> str:
+    return ",".join(
+        '%s="%s"'
+        % (
+            name,
+            str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"),
+        )
+        for name, value in labels.items()
+    )
@@ -0,0 +1,21 @@
+import typing
+
+
+class Observable:
+    """
+    An object that notifies a listener about its changes, e.g. to replicate them to other processes.
+    Events are plain tuples that start with the name of a change.
+    """
+
+    _listener: typing.Optional[typing.Callable[..., None]] = None
+
+    def subscribe(self, listener: typing.Optional[typing.Callable[..., None]]):
+        """
+        Sets a listener that is called with every change event. None removes the listener.
+        :param listener: a callable accepting the fields of an event as positional arguments
+        """
+        self._listener = listener
+
+    def _notify(self, *event):
+        if self._listener is not None:
+            self._listener(*event)
@@ -0,0 +1,208 @@
+import cProfile
+import io
+import logging
+import marshal
+import pstats
+import sys
+import threading
+import typing
+from collections import Counter
+from dataclasses import dataclass
+
+from hmt.serve.utils.timers import REQUEST, add_hook, remove_hook
+
+logger = logging.getLogger(__name__)
+
+DETERMINISTIC = "deterministic"
+SAMPLING = "sampling"
+
+TEXT = "text"
+PSTATS = "pstats"
+COLLAPSED = "collapsed"
+
+
+@dataclass(frozen=True)
+class Profile:
+    """
+    A result of a profiler run.
+    """
+
+    mode: str
+    """
+    deterministic or sampling.
+    """
+    requests: int
+    """
+    A number of requests handled while the profiler was running.
+    """
+    stats: typing.Optional[typing.Dict[typing.Any, typing.Any]] = None
+    """
+    Function statistics of a deterministic run in the format of pstats.
+    """
+    stacks: typing.Optional[typing.Mapping[str, int]] = None
+    """
+    Numbers of samples of call stacks of a sampling run, frames are separated by semicolons.
+    """
+
+    def formats(self) -> typing.List[str]:
+        return [TEXT, PSTATS] if self.mode == DETERMINISTIC else [COLLAPSED]
+
+    def output(self, output_format: typing.Optional[str] = None) -> bytes:
+        """
+        :param output_format: text (a pstats report sorted by cumulative time) or pstats (a file pstats.Stats loads)
+            for deterministic runs and collapsed (input of flamegraph.pl) for sampling runs, the first one by default
+        :raises ValueError: if the format isn't one of the formats of the run
+        """
+        output_format = output_format or self.formats()[0]
+        if output_format not in self.formats():
+            raise ValueError(
+                "%s profiles can be written as %s"
+                % (self.mode.capitalize(), " or ".join(self.formats()))
+            )
+        if output_format == PSTATS:
+            return marshal.dumps(self.stats)
+        elif output_format == TEXT:
+            stream = io.StringIO()
+            stats = pstats.Stats(_StatsSource(self.stats or {}), stream=stream)
+            stats.sort_stats("cumulative").print_stats()
+            return stream.getvalue().encode("utf-8")
+        return "".join(
+            "%s %d\n" % (stack, count)
+            for stack, count in sorted((self.stacks or {}).items())
+        ).encode("utf-8")
+
+
+class _StatsSource:
+    # pstats.Stats loads statistics from any object with create_stats and stats, like a cProfile.Profile
+    def __init__(self, stats: typing.Dict[typing.Any, typing.Any]):
+        self.stats = stats
+
+    def create_stats(self):
+        pass
+
+
+class _Sampler(threading.Thread):
+    """
+    Samples the call stack of a thread at regular intervals from a separate thread,
+    so the profiled thread isn't slowed down by tracing calls.
+    """
+
+    def __init__(self, thread_id: int, interval: float):
+        super().__init__(name="hmt-sampler", daemon=True)
+        self._thread_id = thread_id
+        self._interval = interval
+        self._stopped = threading.Event()
+        self.stacks: typing.Counter[str] = Counter()
+
+    def run(self):
+        while not self._stopped.wait(self._interval):
+            frame = sys._current_frames().get(self._thread_id)
+            frames = []
+            while frame is not None:
+                code = frame.f_code
+                frames.append(
+                    "%s (%s:%d)" % (code.co_name, code.co_filename, code.co_firstlineno)
+                )
+                frame = frame.f_back
+            if len(frames) > 0:
+                self.stacks[";".join(reversed(frames))] += 1
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
+
+
+class Profiler:
+    """
+    Profiles the thread that starts it on demand, e.g. the IOLoop of a running server.
+    A deterministic run uses cProfile, a sampling run reads the call stack every interval from another thread,
+    which slows requests down much less. A run may stop by itself after a number of requests,
+    its profile is kept until another run starts.
+    """
+
+    def __init__(self):
+        self._mode: typing.Optional[str] = None
+        self._profile: typing.Optional[cProfile.Profile] = None
+        self._sampler: typing.Optional[_Sampler] = None
+        self._requests = 0
+        self._limit: typing.Optional[int] = None
+        self.last: typing.Optional[Profile] = None
+        """
+        The profile of the last finished run.
+        """
+
+    @property
+    def running(self) -> bool:
+        return self._mode is not None
+
+    def status(self) -> typing.Dict[str, typing.Any]:
+        return dict(
+            running=self.running,
+            mode=self._mode,
+            requests=self._requests,
+            limit=self._limit,
+            finished=self.last is not None,
+        )
+
+    def start(
+        self,
+        mode: str = DETERMINISTIC,
+        requests: typing.Optional[int] = None,
+        interval: float = 0.005,
+    ):
+        """
+        :param mode: deterministic or sampling
+        :param requests: a number of requests after which the run stops, None runs until stop is called
+        :param interval: seconds between samples of a sampling run
+        :raises ValueError: if the profiler is already running or the mode is unknown
+        """
+        if self.running:
+            raise ValueError("The profiler is already running")
+        if mode == DETERMINISTIC:
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+        elif mode == SAMPLING:
+            self._sampler = _Sampler(threading.get_ident(), interval)
+            self._sampler.start()
+        else:
+            raise ValueError(
+                "Unknown profiler mode %s, use %s or %s"
+                % (mode, DETERMINISTIC, SAMPLING)
+            )
+        self._mode = mode
+        self._requests = 0
+        self._limit = requests
+        self.last = None
+        add_hook(self._on_call)
+        logger.info("Started the %s profiler", mode)
+
+    def stop(self) -> Profile:
+        """
+        :raises ValueError: if the profiler isn't running
+        """
+        if self._mode is None:
+            raise ValueError("The profiler isn't running")
+        remove_hook(self._on_call)
+        if self._profile is not None:
+            self._profile.disable()
+            self._profile.create_stats()
+            self.last = Profile(
+                self._mode, self._requests, stats=getattr(self._profile, "stats")
+            )
+        elif self._sampler is not None:
+            self._sampler.stop()
+            self.last = Profile(
+                self._mode, self._requests, stacks=dict(self._sampler.stacks)
+            )
+        self._mode = None
+        self._profile = None
+        self._sampler = None
+        logger.info("Stopped the profiler after %d requests", self._requests)
+        return typing.cast(Profile, self.last)
+
+    def _on_call(self, name: str, seconds: float):
+        if name != REQUEST:
+            return
+        self._requests += 1
+        if self._limit is not None and self._requests >= self._limit:
+            self.stop()
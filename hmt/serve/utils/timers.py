@@ -1,22 +1,64 @@
-import datetime
-import logging
-from functools import wraps
+import inspect
+import time
+import typing
+from functools import partial, wraps
 
-logger = logging.getLogger(__name__)
+REQUEST = "request"
+"""
+The name reported for every request handled by a server.
+"""
 
+Hook = typing.Callable[[str, float], None]
+
+_hooks: typing.List[Hook] = []
+
+
+def add_hook(hook: Hook):
+    """
+    Registers a hook called with the name and the duration in seconds of every timed call.
+    """
+    _hooks.append(hook)
+
+
+def remove_hook(hook: Hook):
+    if hook in _hooks:
+        _hooks.remove(hook)
+
+
+def _report(name: str, seconds: float):
+    # hooks may remove themselves
+    for hook in list(_hooks):
+        hook(name, seconds)
+
+
+def timed(func=None, *, name: typing.Optional[str] = None):
+    """
+    Times calls of a function or a coroutine function and reports them to the registered hooks.
+    Used as @timed or @timed(name=REQUEST).
+    :param name: a name reported to hooks, the qualified name of the function by default
+    """
+    if func is None:
+        return partial(timed, name=name)
+    reported = name or func.__qualname__
+
+    if inspect.iscoroutinefunction(func):
+
+        @wraps(func)
+        async def coroutine_wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                _report(reported, time.perf_counter() - start)
+
+        return coroutine_wrapper
 
-def timed(func):
     @wraps(func)
     def function_wrapper(*args, **kwargs):
-        start = datetime.datetime.now()
-        # logger.info("{} call".format(func.__name__))
-
-        res = func(*args, **kwargs)
-        logger.info(
-            "{} call time {}".format(
-                func.__name__, (datetime.datetime.now() - start).total_seconds()
-            )
-        )
-        return res
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _report(reported, time.perf_counter() - start)
 
     return function_wrapper
@@ -45,7 +45,10 @@ REQUIRED = [
     "jsonpath-rw>=1.4.0",
 ]
 
-BUNDLES = {}
+BUNDLES = {
+    # faster serialization of mock responses
+    "fast": ["orjson"],
+}
 
 # Requirements of all bundles
 BUNDLE_REQUIREMENTS = [dep for _, bundle_dep in BUNDLES.items() for dep in bundle_dep]
@@ -119,6 +122,8 @@ TYPE_CHECK_COMMAND = "pyright --lib"
 
 TEST_COMMAND = "pytest"
 
+BENCHMARK_COMMAND = "{executable} -m tests.benchmarks".format(executable=sys.executable)
+
 LINT_COMMAND = "flake8 --exclude .git,.venv,__pycache__,build,dist"
 
 PRECOMMIT_COMMAND = "pre-commit run --all-files"
@@ -136,6 +141,10 @@ def run_tests():
     run_sys_command(TEST_COMMAND, "Tests failed")
 
 
+def run_benchmarks():
+    run_sys_command(BENCHMARK_COMMAND, "Benchmarks regressed")
+
+
 def check_style():
     run_sys_command(LINT_COMMAND, "Checking style failed")
 
@@ -191,6 +200,16 @@ class TestCommand(SetupCommand):
         run_tests()
 
 
+class BenchmarkCommand(SetupCommand):
+    """Support setup.py benchmark."""
+
+    description = "Run load benchmarks of the mock server against the baseline"
+
+    def run(self):
+        self.status("Running benchmarks...")
+        run_benchmarks()
+
+
 class UploadCommand(SetupCommand):
     """Support setup.py upload."""
 
@@ -237,6 +256,7 @@ setup(
     zip_safe=False,
     entry_points={"console_scripts": ENTRY_POINTS},
     cmdclass={
+        "benchmark": BenchmarkCommand,
         "dist": BuildDistCommand,
         "format": FormatCommand,
         "upload": UploadCommand,
@@ -0,0 +1,85 @@
+import sys
+
+import click
+
+from tests.benchmarks.harness import (
+    BASELINE,
+    compare,
+    load_baseline,
+    machine,
+    median,
+    run,
+    save_baseline,
+    select,
+)
+
+COLUMNS = ("scenario", "requests", "boot_s", "p50_ms", "p99_ms", "rps", "rss_mb")
+
+
+@click.command()
+@click.argument("patterns", nargs=-1)
+@click.option("-n", "--requests", default=2000, help="Measured requests per scenario.")
+@click.option(
+    "-c", "--concurrency", default=16, help="Connections sending requests at once."
+)
+@click.option(
+    "-d",
+    "--duration",
+    default=30.0,
+    help="Seconds after which a scenario stops sending requests.",
+)
+@click.option(
+    "-r",
+    "--repeat",
+    default=3,
+    help="Runs of every scenario, the median of every metric is reported.",
+)
+@click.option("-b", "--baseline", default=BASELINE, help="The baseline file.")
+@click.option(
+    "-t",
+    "--tolerance",
+    default=0.25,
+    help="A fraction a metric may be worse than the baseline by.",
+)
+@click.option(
+    "--save", is_flag=True, help="Save the results as the baseline of their scenarios."
+)
+def benchmark(
+    patterns, requests, concurrency, duration, repeat, baseline, tolerance, save
+):
+    """
+    Benchmarks the mock server with synthetic specs. PATTERNS select scenarios by name, e.g. 1k-* or *-plain.
+    Exits with 1 if a scenario is worse than the baseline.
+    """
+    expected = load_baseline(baseline)
+    if expected["machine"] is not None and expected["machine"] != machine():
+        click.echo(
+            "The baseline was recorded on %s, this machine is %s, record a baseline of this machine with --save"
+            % (expected["machine"], machine()),
+            err=True,
+        )
+    regressions = []
+    results = []
+    click.echo(" ".join("%14s" % column for column in COLUMNS))
+    for scenario in select(patterns):
+        result = median(
+            [
+                run(scenario, requests, concurrency, duration=duration)
+                for _ in range(repeat)
+            ]
+        )
+        results.append(result)
+        click.echo(" ".join("%14s" % getattr(result, column) for column in COLUMNS))
+        regressions.extend(compare(result, expected["scenarios"], tolerance))
+    if save:
+        save_baseline(results, baseline)
+        click.echo(
+            "Saved the baseline of %d scenarios to %s" % (len(results), baseline)
+        )
+    elif len(regressions) > 0:
+        click.echo("\n".join(["", "Regressions:"] + regressions))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    benchmark(prog_name="python -m tests.benchmarks")
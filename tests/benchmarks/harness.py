@@ -0,0 +1,499 @@
+"""
+Load benchmarks of the mock server. Every scenario starts a MockServer in its own process with a synthetic spec,
+sends requests to it from a local asyncio client over keep-alive connections and measures the latency, the throughput
+and the memory of the server. Results are compared with a baseline file, nothing leaves the machine.
+"""
+import asyncio
+import fnmatch
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import socket
+import tempfile
+import time
+import typing
+import urllib.parse
+import urllib.request
+from dataclasses import asdict, dataclass
+
+import psutil
+
+HOST = "bench.local"
+ENTITY_PATHS = 100  # paths of an entity
+ITEMS = 10  # items seeded for every entity
+TARGETS = 100  # endpoints the load is spread over
+
+SIZES = {"10": 10, "1k": 1000, "10k": 10000}
+FEATURES = ("plain", "entities", "callbacks", "middleware", "all")
+
+BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+
+
+@dataclass(frozen=True)
+class Scenario:
+    name: str
+    paths: int
+    entities: bool = False
+    callbacks: bool = False
+    middleware: bool = False
+
+    def spec(self) -> typing.Dict[str, typing.Any]:
+        """
+        :return: an OpenAPI spec with a path for every endpoint, paths of entities read items seeded by x-hmt-data
+        """
+        paths = {}
+        schemas = {}
+        data: typing.Dict[str, typing.List[typing.Any]] = {}
+        for i in range(self.paths):
+            if self.entities:
+                entity = "entity%d" % (i // ENTITY_PATHS)
+                if entity not in schemas:
+                    schemas[entity] = {
+                        "type": "object",
+                        "x-hmt-id-path": "itemId",
+                        "properties": {
+                            "itemId": {"type": "string"},
+                            "name": {"type": "string"},
+                            "price": {"type": "number"},
+                        },
+                    }
+                    data[entity] = [
+                        {"itemId": str(k), "name": "item %d" % k, "price": k}
+                        for k in range(ITEMS)
+                    ]
+                paths["/resources%d/{itemId}" % i] = {
+                    "x-hmt-entity": entity,
+                    "get": {
+                        "x-hmt-operation": "read",
+                        "parameters": [
+                            {
+                                "name": "itemId",
+                                "in": "path",
+                                "required": True,
+                                "schema": {"type": "string"},
+                            }
+                        ],
+                        "responses": {
+                            "200": {
+                                "description": "An item",
+                                "content": {
+                                    "application/json": {
+                                        "schema": {
+                                            "$ref": "#/components/schemas/%s" % entity
+                                        }
+                                    }
+                                },
+                            }
+                        },
+                    },
+                }
+            else:
+                paths["/resources%d/{itemId}" % i] = {
+                    "get": {
+                        "parameters": [
+                            {
+                                "name": "itemId",
+                                "in": "path",
+                                "required": True,
+                                "schema": {"type": "string"},
+                            }
+                        ],
+                        "responses": {
+                            "200": {
+                                "description": "An item",
+                                "content": {
+                                    "application/json": {
+                                        "schema": {
+                                            "type": "object",
+                                            "required": ["itemId", "name", "price"],
+                                            "properties": {
+                                                "itemId": {"type": "string"},
+                                                "name": {"type": "string"},
+                                                "price": {"type": "number"},
+                                            },
+                                        }
+                                    }
+                                },
+                            }
+                        },
+                    }
+                }
+        spec: typing.Dict[str, typing.Any] = {
+            "openapi": "3.0.0",
+            "info": {"title": self.name, "version": "1.0.0"},
+            "servers": [{"url": "http://%s" % HOST}],
+            "paths": paths,
+        }
+        if self.entities:
+            spec["components"] = {"schemas": schemas}
+            spec["x-hmt-data"] = data
+        return spec
+
+    def targets(self) -> typing.List[str]:
+        """
+        :return: pathnames of requests, spread evenly over the spec so routing sees all of it
+        """
+        step = max(self.paths // TARGETS, 1)
+        return ["/resources%d/%d" % (i, i % ITEMS) for i in range(0, self.paths, step)][
+            :TARGETS
+        ]
+
+
+def scenarios() -> typing.List[Scenario]:
+    return [
+        Scenario(
+            "%s-%s" % (size, feature),
+            paths,
+            entities=feature in ("entities", "all"),
+            callbacks=feature in ("callbacks", "all"),
+            middleware=feature in ("middleware", "all"),
+        )
+        for size, paths in SIZES.items()
+        for feature in FEATURES
+    ]
+
+
+def select(patterns: typing.Sequence[str]) -> typing.List[Scenario]:
+    """
+    :param patterns: shell-style patterns of scenario names, e.g. 1k-* or *-plain, all scenarios if empty
+    """
+    return [
+        scenario
+        for scenario in scenarios()
+        if len(patterns) == 0
+        or any(fnmatch.fnmatchcase(scenario.name, pattern) for pattern in patterns)
+    ]
+
+
+@dataclass(frozen=True)
+class Result:
+    scenario: str
+    requests: int
+    errors: int
+    boot_s: float
+    """
+    Seconds from starting the server process until it accepts connections.
+    """
+    p50_ms: float
+    p99_ms: float
+    rps: float
+    rss_mb: float
+    """
+    The resident memory of the server after the load.
+    """
+
+
+# metrics that regress when they grow and when they shrink
+HIGHER_IS_WORSE = ("boot_s", "p50_ms", "p99_ms", "rss_mb")
+LOWER_IS_WORSE = ("rps",)
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _write_callbacks(scenario: Scenario, directory: str):
+    with open(os.path.join(directory, "benchmark.py"), "w", encoding="utf8") as f:
+        f.write(
+            "from hmt.serve.mock.callbacks import callback\n\n\n"
+            "def count_calls(response_body, storage):\n"
+            '    storage["calls"] = storage.get("calls", 0) + 1\n'
+            '    response_body["calls"] = storage["calls"]\n'
+            "    return response_body\n\n\n"
+            "for path in %r:\n"
+            '    callback(%r, "get", path)(count_calls)\n' % (scenario.targets(), HOST)
+        )
+
+
+def _serve(scenario: Scenario, port: int, admin_port: int, callback_dir: str):
+    from openapi_typed_2 import convert_to_openapi
+
+    from hmt.serve.mock.refs import make_definitions_from_spec
+    from hmt.serve.mock.server import MockServer
+    from hmt.serve.mock.specs import OpenAPISpecification
+
+    # the server logs every endpoint when it starts
+    logging.disable(logging.INFO)
+    api = convert_to_openapi(scenario.spec())
+    MockServer(
+        port,
+        [OpenAPISpecification(api, scenario.name, make_definitions_from_spec(api))],
+        callback_dir=callback_dir if scenario.callbacks else None,
+        admin_port=admin_port,
+    ).run()
+
+
+def _serve_middleware(port: int):
+    from tornado.ioloop import IOLoop
+    from tornado.web import Application, RequestHandler
+
+    class UnchangedSpecs(RequestHandler):
+        def post(self):
+            self.set_status(204)
+
+    Application([(r"/", UnchangedSpecs)]).listen(port)
+    IOLoop.current().start()
+
+
+def _wait_for(port: int, process: multiprocessing.Process, timeout: float):
+    deadline = time.perf_counter() + timeout
+    while True:
+        if not process.is_alive():
+            raise RuntimeError("The server exited with %s" % process.exitcode)
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=1):
+                return
+        except OSError:
+            if time.perf_counter() > deadline:
+                raise RuntimeError("The server didn't start in %s seconds" % timeout)
+            time.sleep(0.05)
+
+
+async def _read_response(reader: asyncio.StreamReader) -> int:
+    head = await reader.readuntil(b"\r\n\r\n")
+    lines = head.decode("latin-1").split("\r\n")
+    status = int(lines[0].split(" ", 2)[1])
+    headers = {}
+    for line in lines[1:]:
+        if ":" in line:
+            name, value = line.split(":", 1)
+            headers[name.strip().lower()] = value.strip()
+    if headers.get("transfer-encoding", "").lower() == "chunked":
+        while True:
+            size = int((await reader.readline()).split(b";")[0], 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    else:
+        await reader.readexactly(int(headers.get("content-length", "0")))
+    return status
+
+
+async def _load(
+    port: int,
+    targets: typing.Sequence[str],
+    requests: int,
+    concurrency: int,
+    duration: float,
+) -> typing.Tuple[typing.List[float], int, float]:
+    """
+    Sends requests over keep-alive connections, every connection sends its next request
+    when it received the previous response.
+    :return: latencies in seconds, a number of failed requests and the elapsed seconds
+    """
+    messages = [
+        (
+            "GET /http://%s%s HTTP/1.1\r\nHost: 127.0.0.1:%d\r\n\r\n"
+            % (HOST, target, port)
+        ).encode("latin-1")
+        for target in targets
+    ]
+    latencies: typing.List[float] = []
+    errors = 0
+    sent = 0
+    start = time.perf_counter()
+    deadline = start + duration
+
+    async def connection():
+        nonlocal errors, sent
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        try:
+            while sent < requests and time.perf_counter() < deadline:
+                message = messages[sent % len(messages)]
+                sent += 1
+                before = time.perf_counter()
+                writer.write(message)
+                status = await _read_response(reader)
+                latencies.append(time.perf_counter() - before)
+                if status != 200:
+                    errors += 1
+        finally:
+            writer.close()
+
+    await asyncio.gather(*(connection() for _ in range(concurrency)))
+    return latencies, errors, time.perf_counter() - start
+
+
+def _percentile(latencies: typing.Sequence[float], q: float) -> float:
+    ordered = sorted(latencies)
+    return ordered[min(int(q * len(ordered)), len(ordered) - 1)] if ordered else 0.0
+
+
+def run(
+    scenario: Scenario,
+    requests: int = 2000,
+    concurrency: int = 16,
+    warmup: int = 100,
+    duration: float = 30.0,
+    boot_timeout: float = 300.0,
+) -> Result:
+    """
+    Benchmarks a scenario in new processes.
+    :param requests: a number of measured requests
+    :param concurrency: a number of connections sending requests at the same time
+    :param warmup: a number of requests sent before the measured ones, e.g. to fill caches
+    :param duration: seconds after which no more requests are sent, so slow scenarios finish
+    :param boot_timeout: seconds to wait for the server to start
+    """
+    context = multiprocessing.get_context("spawn")
+    port, admin_port = _free_port(), _free_port()
+    processes = []
+    loop = asyncio.new_event_loop()
+    with tempfile.TemporaryDirectory() as callback_dir:
+        try:
+            _write_callbacks(scenario, callback_dir)
+            if scenario.middleware:
+                middleware_port = _free_port()
+                middleware = context.Process(
+                    target=_serve_middleware, args=(middleware_port,), daemon=True
+                )
+                middleware.start()
+                processes.append(middleware)
+                _wait_for(middleware_port, middleware, boot_timeout)
+
+            started = time.perf_counter()
+            server = context.Process(
+                target=_serve,
+                args=(scenario, port, admin_port, callback_dir),
+                daemon=True,
+            )
+            server.start()
+            processes.append(server)
+            _wait_for(port, server, boot_timeout)
+            boot = time.perf_counter() - started
+
+            if scenario.middleware:
+                _wait_for(admin_port, server, boot_timeout)
+                urllib.request.urlopen(
+                    "http://127.0.0.1:%d/admin/middleware/rest/pregen/%s"
+                    % (
+                        admin_port,
+                        urllib.parse.quote(
+                            "http://127.0.0.1:%d/" % middleware_port, safe=""
+                        ),
+                    ),
+                    data=b"",
+                ).close()
+
+            targets = scenario.targets()
+            if warmup > 0:
+                loop.run_until_complete(
+                    _load(port, targets, warmup, concurrency, duration)
+                )
+            latencies, errors, elapsed = loop.run_until_complete(
+                _load(port, targets, requests, concurrency, duration)
+            )
+            rss = psutil.Process(server.pid).memory_info().rss
+        finally:
+            loop.close()
+            for process in processes:
+                process.terminate()
+                process.join()
+
+    return Result(
+        scenario=scenario.name,
+        requests=len(latencies),
+        errors=errors,
+        boot_s=round(boot, 3),
+        p50_ms=round(_percentile(latencies, 0.5) * 1000, 3),
+        p99_ms=round(_percentile(latencies, 0.99) * 1000, 3),
+        rps=round(len(latencies) / elapsed, 1),
+        rss_mb=round(rss / 2 ** 20, 1),
+    )
+
+
+def median(results: typing.Sequence[Result]) -> Result:
+    """
+    :return: the median of every metric of repeated runs of a scenario, which is less noisy than a single run
+    """
+    values = [asdict(result) for result in results]
+    return Result(
+        **{
+            name: sorted(run[name] for run in values)[len(values) // 2]
+            if name != "scenario"
+            else values[0][name]
+            for name in values[0]
+        }
+    )
+
+
+def machine() -> typing.Dict[str, typing.Any]:
+    """
+    :return: a description of this machine, results of different machines can't be compared
+    """
+    return dict(
+        system="%s %s" % (platform.system(), platform.machine()),
+        python=platform.python_version(),
+        cpus=os.cpu_count(),
+        memory_mb=round(psutil.virtual_memory().total / 2 ** 20),
+    )
+
+
+def load_baseline(path: str = BASELINE) -> typing.Dict[str, typing.Any]:
+    """
+    :return: the machine the baseline was recorded on and results by scenario, empty if the file doesn't exist
+    """
+    if not os.path.isfile(path):
+        return dict(machine=None, scenarios={})
+    with open(path, encoding="utf8") as f:
+        return json.load(f)
+
+
+def save_baseline(
+    results: typing.Sequence[Result], path: str = BASELINE,
+):
+    """
+    Adds results to the baseline file, results of other scenarios are kept if they were recorded on this machine.
+    """
+    baseline = load_baseline(path)
+    scenarios = baseline["scenarios"] if baseline["machine"] == machine() else {}
+    for result in results:
+        scenarios[result.scenario] = {
+            name: value
+            for name, value in asdict(result).items()
+            if name in HIGHER_IS_WORSE + LOWER_IS_WORSE
+        }
+    with open(path, "w", encoding="utf8") as f:
+        json.dump(
+            dict(machine=machine(), scenarios=scenarios), f, indent=2, sort_keys=True
+        )
+        f.write("\n")
+
+
+def compare(
+    result: Result,
+    scenarios: typing.Dict[str, typing.Dict[str, float]],
+    tolerance: float = 0.25,
+) -> typing.List[str]:
+    """
+    :param scenarios: baseline results by scenario
+    :param tolerance: a fraction a metric may be worse than the baseline by
+    :return: descriptions of regressions, empty if the scenario has no baseline
+    """
+    expected = scenarios.get(result.scenario)
+    if expected is None:
+        return []
+    regressions = []
+    values = asdict(result)
+    for name in HIGHER_IS_WORSE:
+        if name in expected and values[name] > expected[name] * (1 + tolerance):
+            regressions.append(
+                "%s %s is %s, the baseline is %s"
+                % (result.scenario, name, values[name], expected[name])
+            )
+    for name in LOWER_IS_WORSE:
+        if name in expected and values[name] < expected[name] * (1 - tolerance):
+            regressions.append(
+                "%s %s is %s, the baseline is %s"
+                % (result.scenario, name, values[name], expected[name])
+            )
+    if result.errors > 0:
+        regressions.append(
+            "%s %d of %d requests failed"
+            % (result.scenario, result.errors, result.requests)
+        )
+    return regressions
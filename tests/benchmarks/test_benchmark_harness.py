@@ -0,0 +1,58 @@
+from tests.benchmarks.harness import Result, Scenario, compare, median, run, select
+
+
+def test_select():
+    assert ["10-plain", "1k-plain", "10k-plain"] == [
+        scenario.name for scenario in select(["*-plain"])
+    ]
+    assert 15 == len(select([]))
+
+
+def test_targets():
+    scenario = Scenario("10k-plain", 10000)
+    targets = scenario.targets()
+    assert 100 == len(targets)
+    assert "/resources0/0" == targets[0]
+    assert "/resources9900/0" == targets[-1]
+    assert 10000 == len(scenario.spec()["paths"])
+
+
+def test_compare():
+    result = Result(
+        scenario="10-plain",
+        requests=100,
+        errors=0,
+        boot_s=1.0,
+        p50_ms=10.5,
+        p99_ms=20.0,
+        rps=800.0,
+        rss_mb=50.0,
+    )
+    baseline = {
+        "10-plain": dict(boot_s=1.0, p50_ms=10.0, p99_ms=10.0, rps=1000.0, rss_mb=50.0)
+    }
+    assert [
+        "10-plain p99_ms is 20.0, the baseline is 10.0",
+        "10-plain rps is 800.0, the baseline is 1000.0",
+    ] == compare(result, baseline, tolerance=0.1)
+    assert [] == compare(result, baseline, tolerance=1.0)
+    assert [] == compare(result, {})
+
+
+def test_median():
+    results = [
+        Result("10-plain", 100, errors, 1.0, p50, 20.0, rps, 50.0)
+        for errors, p50, rps in [(0, 12.0, 900.0), (1, 10.0, 1000.0), (0, 11.0, 800.0)]
+    ]
+    assert Result("10-plain", 100, 0, 1.0, 11.0, 20.0, 900.0, 50.0) == median(results)
+
+
+def test_run():
+    # a server with entities, callbacks and a middleware answers every request
+    result = run(select(["10-all"])[0], requests=50, concurrency=4, warmup=10)
+    assert "10-all" == result.scenario
+    assert 50 == result.requests
+    assert 0 == result.errors
+    assert 0 < result.p50_ms <= result.p99_ms
+    assert result.rps > 0
+    assert result.rss_mb > 0
@@ -0,0 +1,69 @@
+import json
+
+import pytest
+from tornado.web import Application
+
+from hmt.serve.admin.views import MetricsView
+from hmt.serve.mock.log import Log
+from hmt.serve.mock.scope import Scope
+from hmt.serve.mock.specs import load_specs
+from hmt.serve.mock.views import MockServerView
+from hmt.serve.utils.metrics import MetricsRegistry
+from hmt.serve.utils.routing import HeaderRouting
+
+metrics = MetricsRegistry()
+
+
+@pytest.fixture
+def app(request_processor):
+    return Application(
+        [
+            (r"/admin/metrics", MetricsView, dict(metrics=metrics)),
+            (
+                r"/.*",
+                MockServerView,
+                dict(
+                    request_processor=request_processor(
+                        load_specs("tests/serve/mock/schemas/petstore")
+                    ),
+                    router=HeaderRouting(),
+                    http_log=Log(Scope()),
+                    metrics=metrics,
+                ),
+            ),
+        ]
+    )
+
+
+@pytest.mark.gen_test
+def test_metrics(http_client, base_url):
+    for _ in range(2):
+        yield http_client.fetch(
+            base_url + "/pets", headers={"Host": "petstore.swagger.io"}
+        )
+
+    response = yield http_client.fetch(base_url + "/admin/metrics")
+    routes = json.loads(response.body)["routes"]
+    assert 1 == len(routes)
+    assert "/pets" == routes[0]["path"]
+    assert "get" == routes[0]["method"]
+    assert 2 == routes[0]["count"]
+    assert {
+        "routing",
+        "middleware",
+        "security",
+        "match",
+        "validation",
+        "faking",
+        "callbacks",
+        "logging",
+        "writing",
+        "total",
+    } == set(routes[0]["stages"])
+
+    response = yield http_client.fetch(base_url + "/admin/metrics?format=prometheus")
+    assert response.headers["Content-Type"].startswith("text/plain")
+    assert (
+        'hmt_requests_total{spec="tests/serve/mock/schemas/petstore/index.yaml",'
+        'path="/pets",method="get",status="200"} 2'
+    ) in response.body.decode().splitlines()
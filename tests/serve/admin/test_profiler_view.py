@@ -0,0 +1,92 @@
+import json
+
+import pytest
+from tornado.httpclient import HTTPClientError, HTTPRequest
+
+from hmt.serve.admin import make_admin_app
+from hmt.serve.mock.scope import Scope
+from hmt.serve.utils.profiler import Profiler
+from hmt.serve.utils.timers import REQUEST, timed
+
+profiler = Profiler()
+
+
+@pytest.fixture
+def workers():
+    return 1
+
+
+@pytest.fixture
+def app(mock_data_store, rest_middleware_manager, workers):
+    return make_admin_app(
+        Scope(),
+        mock_data_store,
+        rest_middleware_manager,
+        profiler=profiler,
+        workers=workers,
+    )
+
+
+@timed(name=REQUEST)
+def handle_request():
+    pass
+
+
+def post(http_client, base_url, command, body=""):
+    return http_client.fetch(
+        HTTPRequest(
+            base_url + "/admin/profiler/" + command,
+            method="POST",
+            body=body,
+            headers={"content-type": "application/x-www-form-urlencoded"},
+        )
+    )
+
+
+@pytest.mark.gen_test
+def test_profiler(http_client, base_url):
+    response = yield post(http_client, base_url, "start", "requests=2")
+    assert 200 == response.code
+    with pytest.raises(HTTPClientError) as e:
+        yield post(http_client, base_url, "start")
+    assert 409 == e.value.code
+
+    handle_request()
+    response = yield http_client.fetch(base_url + "/admin/profiler")
+    status = json.loads(response.body)
+    assert status["running"]
+    assert 1 == status["requests"]
+
+    handle_request()
+    response = yield http_client.fetch(base_url + "/admin/profiler")
+    assert not json.loads(response.body)["running"]
+    response = yield http_client.fetch(base_url + "/admin/profiler/profile")
+    assert "handle_request" in response.body.decode()
+
+    with pytest.raises(HTTPClientError) as e:
+        yield http_client.fetch(base_url + "/admin/profiler/profile?format=collapsed")
+    assert 400 == e.value.code
+    with pytest.raises(HTTPClientError) as e:
+        yield post(http_client, base_url, "stop")
+    assert 409 == e.value.code
+
+
+@pytest.mark.gen_test
+def test_sampling_profiler(http_client, base_url):
+    response = yield post(http_client, base_url, "start", "mode=sampling&interval=1")
+    assert 200 == response.code
+    response = yield post(http_client, base_url, "stop")
+    assert response.headers["Content-Type"].startswith("text/plain")
+
+    with pytest.raises(HTTPClientError) as e:
+        yield post(http_client, base_url, "start", "mode=unknown")
+    assert 400 == e.value.code
+
+
+@pytest.mark.parametrize("workers", [2])
+@pytest.mark.gen_test
+def test_profiler_with_workers(http_client, base_url, workers):
+    with pytest.raises(HTTPClientError) as e:
+        yield post(http_client, base_url, "start")
+    assert 409 == e.value.code
+    assert b"2 workers" in e.value.response.body
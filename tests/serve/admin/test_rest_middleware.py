@@ -51,3 +51,20 @@ def test_admin_server_middleware(http_client, base_url):
     assert len(json.loads(response.body)) == 2
     assert "https://foo.bar.com/api/v2" in json.loads(response.body)
     assert "111" in json.loads(response.body)
+
+
+@pytest.mark.gen_test
+def test_admin_server_middleware_timeout(http_client, base_url):
+    url = base_url + "/admin/middleware/rest/pregen/https://foo.bar.com/api/v2"
+    for timeout in ["soon", "0", "-1", "inf", "nan"]:
+        response = yield http_client.fetch(
+            HTTPRequest(url, method="POST", body="timeout=" + timeout),
+            raise_error=False,
+        )
+        assert 400 == response.code
+    response = yield http_client.fetch(
+        HTTPRequest(url, method="POST", body="timeout=2.5")
+    )
+    assert 200 == response.code
+    response = yield http_client.fetch(base_url + "/admin/middleware/rest/pregen")
+    assert ["https://foo.bar.com/api/v2"] == json.loads(response.body)
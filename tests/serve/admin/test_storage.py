@@ -1,3 +1,5 @@
+import json
+
 import pytest
 from openapi_typed_2 import convert_to_OpenAPIObject
 from tornado.httpclient import HTTPClientError, HTTPRequest
@@ -67,3 +69,50 @@ def test_storage(mock_data_store, http_client, base_url):
         response = yield http_client.fetch(req)
 
     assert 1 == len(mock_data_store["items"].item)
+
+
+@pytest.mark.gen_test
+def test_storage_snapshots(mock_data_store, http_client, base_url):
+    mock_data_store.default["counter"] = 1
+
+    def post(command, body):
+        return http_client.fetch(
+            HTTPRequest(
+                base_url + "/admin/storage/" + command,
+                method="POST",
+                body=body,
+                headers={"content-type": "application/x-www-form-urlencoded"},
+            )
+        )
+
+    response = yield post("snapshot", "name=first")
+    assert response.code == 200
+    mock_data_store.default["counter"] = 2
+
+    response = yield http_client.fetch(base_url + "/admin/storage/snapshots")
+    assert ["first"] == json.loads(response.body)
+
+    response = yield post("restore", "name=first")
+    assert response.code == 200
+    assert 1 == mock_data_store.default["counter"]
+
+    with pytest.raises(HTTPClientError) as e:
+        yield post("restore", "name=unknown")
+    assert 404 == e.value.code
+
+
+@pytest.mark.gen_test
+def test_storage_scopes(mock_data_store, http_client, base_url):
+    mock_data_store.namespace("first").default["counter"] = 1
+
+    response = yield http_client.fetch(base_url + "/admin/storage/scopes")
+    assert ["first"] == json.loads(response.body)
+
+    req = HTTPRequest(base_url + "/admin/storage/scopes/first", method="DELETE")
+    response = yield http_client.fetch(req)
+    assert response.code == 200
+    assert [] == mock_data_store.scopes()
+
+    with pytest.raises(HTTPClientError) as e:
+        yield http_client.fetch(req)
+    assert 404 == e.value.code
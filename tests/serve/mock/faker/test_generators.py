@@ -0,0 +1,61 @@
+import random
+
+from hmt.serve.mock.faker.generators import (
+    ArrayGen,
+    ObjectGen,
+    RefGen,
+    SchemaCompiler,
+    StringGen,
+)
+from hmt.serve.mock.faker.stateless_faker import StatelessFaker
+
+definitions = {
+    "node": {
+        "type": "object",
+        "required": ["name", "children"],
+        "properties": {
+            "name": {"type": "string", "enum": ["a", "b"]},
+            "children": {
+                "type": "array",
+                "maxItems": 2,
+                "items": {"$ref": "#/definitions/node"},
+            },
+            "extra": {"type": "object", "additionalProperties": False},
+        },
+    }
+}
+
+
+def test_compile_recursive_schema():
+    compiler = SchemaCompiler(definitions)
+    generator = compiler.compile({"$ref": "#/definitions/node"})
+    assert isinstance(generator, RefGen)
+    assert "node" == generator.name
+
+    node = generator.target
+    assert isinstance(node, ObjectGen)
+    assert frozenset(["name", "children"]) == node.required
+    assert not node.properties[2][1].has_additional
+    children = node.properties[1][1]
+    assert isinstance(children, ArrayGen)
+    assert isinstance(node.properties[0][1], StringGen)
+    # references to a definition share its compiled generator
+    assert node is children.items.target
+
+
+def test_generate_recursive_schema():
+    faker = StatelessFaker()
+    generator = SchemaCompiler(definitions).compile({"$ref": "#/definitions/node"})
+
+    def check(node):
+        assert node["name"] in ["a", "b"]
+        assert len(node["children"]) <= 2
+        assert node.get("extra", {}) == {}
+        for child in node["children"]:
+            check(child)
+
+    random.seed(1)
+    first = generator(faker, None, 1)
+    check(first)
+    random.seed(1)
+    assert first == generator(faker, None, 1)
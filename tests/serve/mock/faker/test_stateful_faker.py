@@ -128,7 +128,7 @@ def test_insert(mock_data_store):
     assert res.bodyAsJson["itemId"] is not None
     assert 10 == res.bodyAsJson["foo"]
 
-    assert 1 == len(mock_data_store["default"].item)
+    assert 1 == len(mock_data_store["default"].item.keys())
     assert "val" == mock_data_store["default"].item[res.bodyAsJson["itemId"]]["bar"]
 
     request = RequestBuilder.from_dict(
@@ -146,7 +146,7 @@ def test_insert(mock_data_store):
     assert "id123" == res.bodyAsJson["itemId"]
     assert 20 == res.bodyAsJson["foo"]
 
-    assert 2 == len(mock_data_store["default"].item)
+    assert 2 == len(mock_data_store["default"].item.keys())
     assert "val1" == mock_data_store["default"].item[res.bodyAsJson["itemId"]]["bar"]
 
     request = RequestBuilder.from_dict(
@@ -160,7 +160,7 @@ def test_insert(mock_data_store):
     )
     res = faker.process("/items", spec, request)
 
-    assert 2 == len(mock_data_store["default"].item)
+    assert 2 == len(mock_data_store["default"].item.keys())
     assert "bar" not in mock_data_store["default"].item[res.bodyAsJson["itemId"]]
     assert 30 == mock_data_store["default"].item[res.bodyAsJson["itemId"]]["foo"]
 
@@ -228,7 +228,7 @@ def test_upsert(mock_data_store):
     assert res.bodyAsJson["item"]["itemId"] is not None
     assert 10 == res.bodyAsJson["item"]["foo"]
 
-    assert 1 == len(mock_data_store["default"].item)
+    assert 1 == len(mock_data_store["default"].item.keys())
     assert (
         "val"
         == mock_data_store["default"].item[res.bodyAsJson["item"]["itemId"]]["bar"]
@@ -249,7 +249,7 @@ def test_upsert(mock_data_store):
     assert "id123" == res.bodyAsJson["item"]["itemId"]
     assert 20 == res.bodyAsJson["item"]["foo"]
 
-    assert 2 == len(mock_data_store["default"].item)
+    assert 2 == len(mock_data_store["default"].item.keys())
     assert (
         "val1"
         == mock_data_store["default"].item[res.bodyAsJson["item"]["itemId"]]["bar"]
@@ -266,7 +266,7 @@ def test_upsert(mock_data_store):
     )
     res = faker.process("/items", spec, request)
 
-    assert 2 == len(mock_data_store["default"].item)
+    assert 2 == len(mock_data_store["default"].item.keys())
     assert (
         "val1"
         == mock_data_store["default"].item[res.bodyAsJson["item"]["itemId"]]["bar"]
@@ -445,3 +445,116 @@ def test_sateless_faker_5(mock_data_store):
     )
 
     assert valid_schema(res.bodyAsJson, schema)
+
+
+def test_paginated_array(mock_data_store):
+    faker = StatefulFaker(mock_data_store)
+    components = {
+        "schemas": {
+            "item": {
+                "type": "object",
+                "x-hmt-id-path": "itemId",
+                "properties": {"itemId": {"type": "integer"}},
+            }
+        }
+    }
+    spec = spec_dict(
+        path="/items",
+        response_schema={
+            "type": "array",
+            "items": {"$ref": "#/components/schemas/item"},
+        },
+        components=components,
+        method="get",
+    )
+    spec["paths"]["/items"]["x-hmt-entity"] = "item"
+    spec["paths"]["/items"]["get"]["x-hmt-pagination"] = {"link": True}
+    spec["paths"]["/items"]["get"]["parameters"] = [
+        {"name": "page", "in": "query", "schema": {"type": "integer"}},
+        {"name": "size", "in": "query", "schema": {"type": "integer"}},
+    ]
+    spec = OpenAPISpecification(
+        source="default",
+        api=convert_to_OpenAPIObject(spec),
+        definitions={"definitions": {}},
+    )
+    mock_data_store.add_mock(spec)
+    for id in range(5):
+        mock_data_store["default"].item.insert({"itemId": id})
+
+    request = RequestBuilder.from_dict(
+        dict(
+            method="get",
+            protocol="http",
+            path="/items?page=2&size=2",
+            host="api.com",
+            query={"page": ["2"], "size": ["2"]},
+        )
+    )
+    res = faker.process("/items", spec, request)
+    assert [{"itemId": 2}, {"itemId": 3}] == res.bodyAsJson
+    assert (
+        '<?page=3&size=2>; rel="next", <?page=1&size=2>; rel="prev"'
+        == res.headers["Link"]
+    )
+
+
+def test_scoped_storage(mock_data_store):
+    faker = StatefulFaker(mock_data_store)
+
+    components = {
+        "schemas": {
+            "item": {
+                "type": "object",
+                "x-hmt-id-path": "itemId",
+                "properties": {
+                    "foo": {"type": "number"},
+                    "itemId": {"type": "string"},
+                },
+            }
+        }
+    }
+
+    spec = spec_dict(
+        path="/items",
+        request_schema={"$ref": "#/components/schemas/item"},
+        response_schema={"$ref": "#/components/schemas/item"},
+        components=components,
+        method="post",
+    )
+    spec["paths"]["/items"]["x-hmt-entity"] = "item"
+    spec["paths"]["/items"]["post"]["x-hmt-operation"] = "insert"
+    spec["x-hmt-data"] = {"item": [{"foo": 1, "itemId": "seeded"}]}
+
+    spec = convert_to_OpenAPIObject(spec)
+    spec = OpenAPISpecification(spec, "default", definitions=components["schemas"])
+    mock_data_store.add_mock(spec)
+
+    def insert(item_id, headers):
+        return faker.process(
+            "/items",
+            spec,
+            RequestBuilder.from_dict(
+                dict(
+                    method="post",
+                    protocol="http",
+                    path="/items",
+                    host="api.com",
+                    headers=headers,
+                    bodyAsJson={"foo": 2, "itemId": item_id},
+                )
+            ),
+        )
+
+    insert("a", {"X-Hmt-Scope": "first"})
+    insert("b", {"x-hmt-scope": ["second"]})
+    insert("c", {})
+
+    # every scope starts from the seeded data
+    assert ["seeded", "a"] == list(
+        mock_data_store.namespace("first")["default"].item.keys()
+    )
+    assert ["seeded", "b"] == list(
+        mock_data_store.namespace("second")["default"].item.keys()
+    )
+    assert ["seeded", "c"] == list(mock_data_store["default"].item.keys())
@@ -1,10 +1,21 @@
+import json
+
 from http_types import RequestBuilder
+from openapi_typed_2 import convert_to_openapi, convert_to_OpenAPIObject
+from tornado import gen
 
+from hmt.serve.mock.faker.response_pool import PoolConfig, get_pool_config
 from hmt.serve.mock.faker.stateless_faker import StatelessFaker
 from hmt.serve.mock.refs import make_definitions_from_spec
-from hmt.serve.mock.request_validation import valid_schema
+from hmt.serve.mock.request_validation import (
+    ParamsValidators,
+    SchemaValidator,
+    valid_schema,
+    validate_query_params,
+)
 from hmt.serve.mock.specs import OpenAPISpecification
-from tests.util import spec
+from hmt.serve.utils.json_encoding import StreamedResponse
+from tests.util import spec, spec_dict
 
 
 def test_faker_1():
@@ -175,3 +186,248 @@ def test_faker_5():
     )
 
     assert valid_schema(res.bodyAsJson, schema)
+
+
+def test_faker_compiled_operation_cache():
+    faker = StatelessFaker()
+
+    request = RequestBuilder.from_dict(
+        dict(method="get", protocol="http", path="/", host="api.com")
+    )
+
+    first = OpenAPISpecification(
+        source="default",
+        api=spec(response_schema={"type": "integer"}),
+        definitions={"definitions": {}},
+    )
+    assert isinstance(faker.process("/", first, request).bodyAsJson, int)
+    operation = faker._compiled_operation(first, "/", "get")
+    assert operation.success.code == "200"
+    assert operation.success.schema["type"] == "integer"
+    assert operation is faker._compiled_operation(first, "/", "get")
+
+    replaced = OpenAPISpecification(
+        source="default",
+        api=spec(response_schema={"type": "string"}),
+        definitions={"definitions": {}},
+    )
+    assert isinstance(faker.process("/", replaced, request).bodyAsJson, str)
+    assert operation is not faker._compiled_operation(replaced, "/", "get")
+
+
+def test_schema_validator():
+    schema = {
+        "type": "object",
+        "required": ["foo"],
+        "properties": {"foo": {"type": "integer"}},
+    }
+    validator = SchemaValidator(schema)
+    for instance in [{"foo": 1}, {"foo": "1"}, {}, [], None]:
+        assert valid_schema(instance, schema) == validator(instance)
+
+    invalid_schema = {"type": 42}
+    assert not SchemaValidator(invalid_schema)({})
+    assert not valid_schema({}, invalid_schema)
+
+
+def test_params_validators():
+    components = {"schemas": {"item": {"type": "object"}}}
+    oai = spec_dict(path="/items", components=components)
+    oai["paths"]["/items"]["get"]["parameters"] = [
+        {"name": "limit", "in": "query", "required": True, "schema": {"type": "string"}}
+    ]
+    api = convert_to_openapi(oai)
+    path_item = api.paths["/items"]
+    validators = ParamsValidators(api)
+    query = validators.compile(False, "get", path_item)
+    for params in [{"limit": "1"}, {"limit": ["1"]}, {}]:
+        request = RequestBuilder.from_dict(
+            dict(
+                method="get",
+                protocol="http",
+                path="/items",
+                host="api.com",
+                query=params,
+            )
+        )
+        assert validate_query_params(request, api, path_item) == query(params)
+    # operations without parameters share a validator
+    assert validators.compile(True, "get", path_item) is validators.compile(
+        True, "get", api.paths["/items"]
+    )
+
+    # nothing is valid if the definitions are invalid
+    invalid = convert_to_openapi(
+        spec_dict(path="/items", components={"schemas": {"item": {"type": "foo"}}})
+    )
+    assert not ParamsValidators(invalid).compile(False, "get", invalid.paths["/items"])(
+        {}
+    )
+
+
+def test_faker_validates_body():
+    oai = spec_dict(
+        path="/items",
+        method="post",
+        response_schema={"type": "integer"},
+        request_schema={
+            "type": "object",
+            "required": ["name"],
+            "properties": {"name": {"type": "string"}},
+        },
+    )
+    oai["paths"]["/items"]["post"]["responses"]["400"] = {"description": "error"}
+    api = OpenAPISpecification(
+        source="default", api=convert_to_openapi(oai), definitions={"definitions": {}},
+    )
+
+    def post(body):
+        return RequestBuilder.from_dict(
+            dict(
+                method="post",
+                protocol="http",
+                path="/items",
+                host="api.com",
+                body=json.dumps(body),
+                bodyAsJson=body,
+            )
+        )
+
+    assert 200 == StatelessFaker().process("/items", api, post({})).statusCode
+
+    faker = StatelessFaker(validate_body=True)
+    assert 200 == faker.process("/items", api, post({"name": "a"})).statusCode
+    assert 400 == faker.process("/items", api, post({})).statusCode
+
+
+def pooled_spec(pool):
+    spec = spec_dict(response_schema={"type": "integer"})
+    spec["paths"]["/"]["get"]["x-hmt-pool"] = pool
+    return OpenAPISpecification(
+        source="default",
+        api=convert_to_OpenAPIObject(spec),
+        definitions={"definitions": {}},
+    )
+
+
+def test_faker_response_pool(io_loop):
+    faker = StatelessFaker()
+    request = RequestBuilder.from_dict(
+        dict(method="get", protocol="http", path="/", host="api.com")
+    )
+
+    spec = pooled_spec(3)
+    faker.fill_pools([spec])
+    responses = [faker.process("/", spec, request) for _ in range(6)]
+    assert 3 == len(set(id(response) for response in responses))
+    assert responses[:3] == responses[3:]
+    assert json.loads(responses[0].body) == responses[0].bodyAsJson
+
+    # the rest of the pool is filled in the background
+    spec = pooled_spec({"size": 4, "order": "random"})
+    faker.process("/", spec, request)
+    pool = faker._pools[("default", "/", "get", "200")][1]
+    assert 1 == len(pool)
+    io_loop.run_sync(lambda: gen.sleep(0.01))
+    assert 4 == len(pool)
+
+
+def test_fill_pools_compiles_pooled_operations():
+    spec = spec_dict(response_schema={"type": "integer"})
+    spec["paths"]["/pooled"] = {"get": {**spec["paths"]["/"]["get"], "x-hmt-pool": 2}}
+    spec = OpenAPISpecification(
+        source="default",
+        api=convert_to_OpenAPIObject(spec),
+        definitions={"definitions": {}},
+    )
+    faker = StatelessFaker()
+    faker.fill_pools([spec])
+    # operations without pools are compiled on their first request
+    assert [("default", "/pooled", "get")] == list(faker._operations)
+
+
+def test_pool_config():
+    api = convert_to_OpenAPIObject(spec_dict())
+    assert get_pool_config(api, api.paths["/"].get) is None
+
+    api = convert_to_OpenAPIObject({**spec_dict(), "x-hmt-pool": {"fresh": 0.5}})
+    assert PoolConfig(100, "round-robin", 0.5) == get_pool_config(
+        api, api.paths["/"].get
+    )
+
+
+def test_faker_seed():
+    schema = {
+        "type": "object",
+        "required": ["name", "values"],
+        "properties": {
+            "name": {"type": "string"},
+            "values": {"type": "array", "items": {"type": "number"}},
+        },
+    }
+    api = OpenAPISpecification(
+        source="default",
+        api=spec(response_schema=schema),
+        definitions={"definitions": {}},
+    )
+
+    def request(query):
+        return RequestBuilder.from_dict(
+            dict(method="get", protocol="http", path="/?q=" + query, host="api.com")
+        )
+
+    faker = StatelessFaker(seed=42, cache_size=1)
+    first = faker.process("/", api, request("a"))
+    assert first is faker.process("/", api, request("a"))
+    other = faker.process("/", api, request("b"))
+    assert first.bodyAsJson != other.bodyAsJson
+
+    # the cached response has been evicted, it's generated again
+    regenerated = faker.process("/", api, request("a"))
+    assert first is not regenerated
+    assert first.body == regenerated.body
+    assert first.body == StatelessFaker(seed=42).process("/", api, request("a")).body
+    assert first.body != StatelessFaker(seed=1).process("/", api, request("a")).body
+
+
+def test_faker_stream():
+    schema = {
+        "type": "array",
+        "minItems": 5,
+        "maxItems": 5,
+        "items": {"type": "integer"},
+    }
+    api = OpenAPISpecification(
+        source="default",
+        api=spec(response_schema=schema),
+        definitions={"definitions": {}},
+    )
+    request = RequestBuilder.from_dict(
+        dict(method="get", protocol="http", path="/", host="api.com")
+    )
+
+    response = StatelessFaker(stream_threshold=5).process("/", api, request)
+    assert isinstance(response, StreamedResponse)
+    assert "" == response.body
+    body = json.loads(b"".join(response.chunks))
+    assert 5 == len(body)
+    assert all(isinstance(item, int) for item in body)
+
+    # smaller arrays are generated at once
+    response = StatelessFaker(stream_threshold=6).process("/", api, request)
+    assert not isinstance(response, StreamedResponse)
+    assert 5 == len(json.loads(response.body))
+
+
+def test_faker_reseed():
+    # forked workers reseed the text generator, so they don't generate the same text
+    faker = StatelessFaker()
+    state = faker._text_faker.random.getstate()
+    faker.reseed()
+    assert state != faker._text_faker.random.getstate()
+
+    # seeded responses depend only on requests
+    seeded = StatelessFaker(seed=42)
+    generator = seeded._text_faker.random
+    seeded.reseed()
+    assert generator is seeded._text_faker.random
@@ -1,3 +1,6 @@
+from urllib.parse import parse_qs
+
+import pytest
 from http_types import RequestBuilder
 from openapi_typed_2 import convert_to_OpenAPIObject
 
@@ -228,3 +231,209 @@ def test_query():
     )
 
     assert 3 == len(res)
+
+
+def pets_entity(index=None, parameters=(), pagination=None):
+    components = {
+        "schemas": {
+            "pet": {
+                "type": "object",
+                "x-hmt-id-path": "id",
+                "properties": {
+                    "id": {"type": "integer"},
+                    "status": {"type": "string"},
+                    "owner": {"type": "integer"},
+                    "price": {"type": "number"},
+                },
+            }
+        }
+    }
+    if index is not None:
+        components["schemas"]["pet"]["x-hmt-index"] = index
+
+    spec = spec_dict(
+        path="/pets",
+        response_schema={
+            "type": "array",
+            "items": {"$ref": "#/components/schemas/pet"},
+        },
+        components=components,
+        method="get",
+    )
+    spec["paths"]["/pets"]["x-hmt-entity"] = "pet"
+    spec["paths"]["/pets"]["get"]["parameters"] = [
+        {"name": "id", "in": "query", "schema": {"type": "integer"}},
+        {"name": "status", "in": "query", "schema": {"type": "string"}},
+        {"name": "owner", "in": "query", "schema": {"type": "integer"}},
+        {"name": "limit", "in": "query", "schema": {"type": "integer"}},
+        {
+            "name": "minPrice",
+            "in": "query",
+            "schema": {"type": "number"},
+            "x-hmt-filter": {"field": "price", "operator": "gte"},
+        },
+        {
+            "name": "maxPrice",
+            "in": "query",
+            "schema": {"type": "number"},
+            "x-hmt-filter": {"field": "price", "operator": "lt"},
+        },
+        *parameters,
+    ]
+    if pagination is not None:
+        spec["paths"]["/pets"]["get"]["x-hmt-pagination"] = pagination
+    return Entity("pet", convert_to_OpenAPIObject(spec))
+
+
+def query_pets(entity, query):
+    return [
+        pet["id"]
+        for pet in entity.query(
+            "/pets",
+            RequestBuilder.from_dict(
+                dict(
+                    method="get",
+                    protocol="http",
+                    path="/pets",
+                    host="api.com",
+                    query=query,
+                )
+            ),
+        )
+    ]
+
+
+@pytest.mark.parametrize(
+    "index", [None, {"status": "hash", "owner": "hash", "price": "sorted"}]
+)
+def test_query_filters(index):
+    entity = pets_entity(index)
+    for id in range(10):
+        entity.insert(
+            {
+                "id": id,
+                "status": "sold" if id % 2 else "available",
+                "owner": id % 3,
+                "price": float(id),
+            }
+        )
+
+    assert list(range(10)) == query_pets(entity, {"limit": "5"})
+    assert [1, 7] == query_pets(entity, {"status": "sold", "owner": "1"})
+    assert [0, 1, 3, 4, 6, 7, 9] == query_pets(entity, {"owner": ["0", "1"]})
+    assert [3, 4, 5] == query_pets(entity, {"minPrice": "3", "maxPrice": "6"})
+    assert [3, 5] == query_pets(entity, {"minPrice": "3", "status": "sold"})[:2]
+    assert [] == query_pets(entity, {"status": "lost"})
+    assert (
+        5
+        == entity.query_one(
+            "/pets",
+            RequestBuilder.from_dict(
+                dict(
+                    method="get",
+                    protocol="http",
+                    path="/pets",
+                    host="api.com",
+                    query={"id": "5"},
+                )
+            ),
+        )["id"]
+    )
+
+    # indexes follow changes of the stored entities
+    entity[1] = {"id": 1, "status": "available", "owner": 1, "price": 100.0}
+    del entity[7]
+    assert [] == query_pets(entity, {"status": "sold", "owner": "1"})
+    assert [1] == query_pets(entity, {"minPrice": "50"})
+    entity.clear()
+    assert [] == query_pets(entity, {"status": "available"})
+
+
+def test_index_upsert_in_place():
+    entity = pets_entity({"status": "hash", "price": "sorted"})
+    entity.insert({"id": 1, "status": "sold", "price": 1.0})
+
+    pet = entity[1]
+    pet["status"] = "available"
+    pet["price"] = 5.0
+    entity[1] = pet
+    assert [] == query_pets(entity, {"status": "sold"})
+    assert [1] == query_pets(entity, {"status": "available", "minPrice": "2"})
+
+
+def test_unknown_index():
+    with pytest.raises(ValueError):
+        pets_entity({"status": "tree"})
+
+
+def page_pets(entity, query):
+    items, link = entity.query_page(
+        "/pets",
+        RequestBuilder.from_dict(
+            dict(
+                method="get",
+                protocol="http",
+                path="/pets",
+                host="api.com",
+                query=query,
+            )
+        ),
+    )
+    return [pet["id"] for pet in items], link
+
+
+def test_query_page_offset():
+    entity = pets_entity(
+        parameters=[{"name": "offset", "in": "query", "schema": {"type": "integer"}}],
+        pagination={"size": 3, "link": True},
+    )
+    for id in range(10):
+        entity.insert({"id": id, "status": "sold" if id % 2 else "available"})
+
+    assert ([0, 1, 2], '<?offset=3&limit=3>; rel="next"') == page_pets(entity, {})
+    del entity[4]
+    assert (
+        [3, 5, 6],
+        '<?offset=6&limit=3>; rel="next", <?offset=0&limit=3>; rel="prev"',
+    ) == page_pets(entity, {"offset": ["3"]})
+    assert [3, 5] == page_pets(entity, {"offset": "1", "limit": "2", "status": "sold"})[
+        0
+    ]
+    assert ([5, 7, 9], '<?status=sold&offset=0&limit=3>; rel="prev"') == page_pets(
+        entity, {"offset": "2", "status": "sold"}
+    )
+
+
+def test_query_page_number_and_cursor():
+    entity = pets_entity(
+        {"status": "hash"},
+        parameters=[
+            {"name": "page", "in": "query", "schema": {"type": "integer"}},
+            {
+                "name": "per_page",
+                "in": "query",
+                "schema": {"type": "integer", "default": 2, "maximum": 4},
+            },
+        ],
+    )
+    for id in range(10):
+        entity.insert({"id": id, "status": "sold" if id % 2 else "available"})
+
+    assert ([4, 5], None) == page_pets(entity, {"page": "3"})
+    assert [0, 1, 2, 3] == page_pets(entity, {"per_page": "100"})[0]
+    assert [5, 7] == page_pets(entity, {"page": "2", "status": "sold"})[0]
+
+    entity = pets_entity(
+        parameters=[{"name": "after", "in": "query", "x-hmt-page": "cursor"}],
+        pagination={"link": True},
+    )
+    for id in range(5):
+        entity.insert({"id": id, "status": "sold"})
+
+    ids, link = page_pets(entity, {"limit": "2"})
+    assert [0, 1] == ids
+    cursor = parse_qs(link[2 : link.index(">")])["after"][0]
+    # deleted entities don't move the cursor
+    del entity[1]
+    del entity[2]
+    assert ([3, 4], None) == page_pets(entity, {"limit": "2", "after": cursor})
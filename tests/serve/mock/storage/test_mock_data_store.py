@@ -1,7 +1,9 @@
+import pytest
 from openapi_typed_2 import convert_to_OpenAPIObject
 
 from hmt.serve.mock.refs import make_definitions_from_spec
 from hmt.serve.mock.specs import OpenAPISpecification
+from hmt.serve.mock.storage.entity_index import EQ, QueryFilter
 from hmt.serve.mock.storage.mock_data_store import MockDataStore
 from tests.util import spec, spec_dict
 
@@ -144,3 +146,125 @@ def test_reset():
 
     assert 1 == len(store["items"].item)
     assert "val" == store["items"].item["id123"]["bar"]
+
+
+def test_snapshots():
+    schema = {"$ref": "#/components/schemas/item"}
+
+    components = {
+        "schemas": {
+            "item": {
+                "type": "object",
+                "x-hmt-id-path": "itemId",
+                "x-hmt-index": {"bar": "hash"},
+                "properties": {
+                    "foo": {"type": "number"},
+                    "bar": {"type": "string"},
+                    "itemId": {"type": "string"},
+                },
+            }
+        }
+    }
+
+    spec = spec_dict(
+        path="/items/{id}", response_schema=schema, components=components, method="get"
+    )
+    spec["paths"]["/items/{id}"]["x-hmt-entity"] = "item"
+    spec["paths"]["/items/{id}"]["get"]["x-hmt-operation"] = "read"
+    spec["x-hmt-data"] = {"item": [{"foo": 10, "bar": "val", "itemId": "id123"}]}
+    spec = convert_to_OpenAPIObject(spec)
+
+    store = MockDataStore()
+    store.add_mock(
+        OpenAPISpecification(spec, "items", make_definitions_from_spec(spec))
+    )
+    item = store["items"].item
+
+    # values are changed in place like callbacks do
+    item["id123"]["bar"] = "changed"
+    item.insert({"foo": 20, "bar": "val1", "itemId": "id1234"})
+    store["items"]["counter"] = 1
+    store.snapshot("two")
+
+    del item["id123"]
+    item["id1234"]["foo"] = 30
+    store["items"]["counter"] = 2
+    assert ["id1234"] == list(item.keys())
+
+    store.restore("two")
+    assert ["two"] == store.snapshots()
+    assert ["id123", "id1234"] == list(item.keys())
+    assert "changed" == item["id123"]["bar"]
+    assert 20 == item["id1234"]["foo"]
+    assert 1 == store["items"]["counter"]
+    assert ["id1234"] == [
+        v["itemId"] for v in item.find([QueryFilter("bar", EQ, frozenset(["val1"]))])
+    ]
+
+    store.reset()
+    assert ["id123"] == list(item.keys())
+    assert "val" == item["id123"]["bar"]
+    assert store["items"].get("counter") is None
+
+    with pytest.raises(KeyError):
+        store.restore("unknown")
+    with pytest.raises(ValueError):
+        store.snapshot("")
+
+
+def test_scopes():
+    spec = spec_dict(
+        path="/items/{id}",
+        response_schema={"$ref": "#/components/schemas/item"},
+        components={
+            "schemas": {
+                "item": {
+                    "type": "object",
+                    "x-hmt-id-path": "itemId",
+                    "properties": {"itemId": {"type": "string"}},
+                }
+            }
+        },
+        method="get",
+    )
+    spec["x-hmt-data"] = {"item": [{"itemId": "id123"}]}
+    spec = convert_to_OpenAPIObject(spec)
+
+    store = MockDataStore()
+    store.add_mock(
+        OpenAPISpecification(spec, "items", make_definitions_from_spec(spec))
+    )
+    events = []
+    store.subscribe(lambda *event: events.append(event))
+
+    assert store is store.namespace(None)
+    first = store.namespace("first")
+    assert first is store.namespace("first")
+    first["items"].item.insert({"itemId": "first"})
+    first.default["counter"] = 1
+    store.namespace("second")["items"].item["id123"]["changed"] = True
+
+    # namespaces share the seeded data until it's changed
+    assert ["id123"] == list(store["items"].item.keys())
+    assert "changed" not in store["items"].item["id123"]
+    assert ["id123", "first"] == list(first["items"].item.keys())
+    assert "counter" not in store.default
+    assert ["first", "second"] == store.scopes()
+    assert (
+        "scoped",
+        "first",
+        "entity",
+        "items",
+        "item",
+        "set",
+        "first",
+        {"itemId": "first"},
+    ) in events
+
+    store.drop("first")
+    assert ["second"] == store.scopes()
+    assert ["id123"] == list(store.namespace("first")["items"].item.keys())
+    assert ("drop", "first") in events
+
+    store.reset()
+    assert [] == store.scopes()
@@ -0,0 +1,146 @@
+from openapi_typed_2 import convert_to_OpenAPIObject
+
+from hmt.serve.mock.refs import make_definitions_from_spec
+from hmt.serve.mock.specs import OpenAPISpecification
+from hmt.serve.mock.storage.entity_index import GT, QueryFilter
+from hmt.serve.mock.storage.mock_data_store import MockDataStore
+from hmt.serve.mock.storage.sqlite_backend import SqliteBackend
+from tests.util import spec_dict
+
+
+def items_spec(data):
+    components = {
+        "schemas": {
+            "item": {
+                "type": "object",
+                "x-hmt-id-path": "itemId",
+                "x-hmt-index": {"foo": "sorted"},
+                "properties": {
+                    "foo": {"type": "number"},
+                    "bar": {"type": "string"},
+                    "itemId": {"type": "string"},
+                },
+            }
+        }
+    }
+
+    spec = spec_dict(
+        path="/items",
+        response_schema={"$ref": "#/components/schemas/item"},
+        components=components,
+        method="get",
+    )
+    spec["paths"]["/items"]["x-hmt-entity"] = "item"
+    spec["paths"]["/items"]["get"]["x-hmt-operation"] = "read"
+    spec["x-hmt-data"] = {"item": data}
+    spec = convert_to_OpenAPIObject(spec)
+    return OpenAPISpecification(spec, "items", make_definitions_from_spec(spec))
+
+
+def open_store(path, data, cache_size=10000):
+    store = MockDataStore(SqliteBackend(path, cache_size=cache_size))
+    store.add_mock(items_spec(data))
+    return store
+
+
+def test_restart(tmp_path):
+    path = str(tmp_path / "storage.db")
+    data = [
+        {"foo": 10, "bar": "a", "itemId": "x"},
+        {"foo": 5, "bar": "b", "itemId": "y"},
+    ]
+
+    store = open_store(path, data)
+    item = store["items"].item
+    item.insert({"foo": 1, "bar": "c", "itemId": "z"})
+    del item["x"]
+    store["items"]["counter"] = {"count": 1}
+    store.close()
+
+    # stored data is restored instead of x-hmt-data
+    store = open_store(path, data)
+    item = store["items"].item
+    assert ["y", "z"] == list(item.keys())
+    assert "c" == item["z"]["bar"]
+    assert {"count": 1} == store["items"]["counter"]
+    # indexes are rebuilt
+    assert 2 == len(item._indexes[0]._ids)
+    assert [{"foo": 5, "bar": "b", "itemId": "y"}] == item.find(
+        [QueryFilter("foo", GT, frozenset(), 2)]
+    )
+
+    item.insert({"foo": 7, "bar": "d", "itemId": "w"})
+    assert ["y", "z", "w"] == [v["itemId"] for v in item.find([])]
+
+    store.reset()
+    store.close()
+    store = open_store(path, data)
+    assert ["x", "y"] == list(store["items"].item.keys())
+    store.close()
+
+
+def test_lazy_loading_and_changes_in_place(tmp_path):
+    path = str(tmp_path / "storage.db")
+    store = open_store(
+        path, [{"foo": i, "bar": str(i), "itemId": str(i)} for i in range(10)], 2
+    )
+    item = store["items"].item
+    assert [str(i) for i in range(10)] == [v["bar"] for v in item.find([])]
+    assert 2 == len(item._data._cache)
+
+    # values read by callbacks may be changed in place
+    item["3"]["bar"] = "changed"
+    store["items"]["list"] = []
+    store["items"]["list"].append(1)
+    for i in range(10):
+        item.get(str(i))
+    store.flush()
+    store.close()
+
+    store = open_store(path, [])
+    assert "changed" == store["items"].item["3"]["bar"]
+    assert [1] == store["items"]["list"]
+    store.close()
+
+
+def test_mirroring(tmp_path):
+    path = str(tmp_path / "storage.db")
+    store = open_store(path, [{"foo": 1, "bar": "a", "itemId": "x"}])
+    with store.mirroring():
+        store["items"].item["x"] = {"foo": 2, "bar": "b", "itemId": "x"}
+        store["items"].item.insert({"foo": 3, "bar": "c", "itemId": "y"})
+    # changes of another process are applied, but not stored again
+    assert "b" == store["items"].item["x"]["bar"]
+    assert 2 == len(store["items"].item)
+    store.flush()
+    store.close()
+
+    store = open_store(path, [])
+    assert ["x"] == list(store["items"].item.keys())
+    assert "a" == store["items"].item["x"]["bar"]
+    store.close()
+
+
+def test_snapshots(tmp_path):
+    path = str(tmp_path / "storage.db")
+    store = open_store(path, [{"foo": 1, "bar": "a", "itemId": "x"}])
+    item = store["items"].item
+    item["x"]["bar"] = "b"
+    store.snapshot("changed")
+    item.insert({"foo": 2, "bar": "c", "itemId": "y"})
+
+    store.reset()
+    assert "a" == item["x"]["bar"]
+    store.restore("changed")
+    assert ["x"] == list(item.keys())
+    assert "b" == item["x"]["bar"]
+    store.close()
+
+    # the restored data is stored, snapshots are not
+    store = open_store(path, [])
+    assert "b" == store["items"].item["x"]["bar"]
+    assert [] == store.snapshots()
+    assert (0,) == store._backend.connection.execute(
+        "SELECT COUNT(*) FROM snapshot_records WHERE snapshot = 'changed'"
+    ).fetchone()
+    store.close()
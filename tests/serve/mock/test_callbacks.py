@@ -1,7 +1,16 @@
+import json
+import os
+from unittest.mock import patch
+
+import pytest
 from http_types.utils import RequestBuilder, ResponseBuilder
+from tornado import gen
 
-from hmt.serve.mock.callbacks import callback_manager
+from hmt.serve.mock.callbacks import CallbackManager, callback_manager
+from hmt.serve.mock.log import Log
+from hmt.serve.mock.scope import Scope
 from hmt.serve.mock.storage.mock_data import MockData
+from hmt.serve.utils.json_encoding import EncodedResponse, encoded_body
 
 
 def test_no_callback():
@@ -159,3 +168,194 @@ def test_text_full(mock_data_store):
 
     assert "Hello" == new_response.body
     assert "value" == new_response.headers["X-Echo-Header"]
+
+
+def test_callback_views():
+    manager = CallbackManager()
+    manager.add_callback(
+        "api.com",
+        "get",
+        "/view",
+        "json",
+        "body",
+        lambda request, response_body: {**response_body, "path": request["path"]},
+    )
+    manager.add_callback(
+        "api.com",
+        "post",
+        "/view",
+        "json",
+        "full",
+        lambda response: response["headers"].update(a="b") or response,
+    )
+    manager.add_callback(
+        "api.com",
+        "put",
+        "/view",
+        "json",
+        "full",
+        lambda response: response["bodyAsJson"].append(2) or response,
+    )
+
+    def request(method):
+        return RequestBuilder.from_dict(
+            dict(method=method, host="api.com", path="/view", protocol="http")
+        )
+
+    response = EncodedResponse(
+        b'{"field":"value"}', statusCode=200, bodyAsJson={"field": "value"}, headers={}
+    )
+    new_response = manager(request("get"), response, MockData())
+    assert {"field": "value", "path": "/view"} == json.loads(encoded_body(new_response))
+    assert {"field": "value"} == response.bodyAsJson
+
+    # a body the callback doesn't touch is not serialized again
+    new_response = manager(request("post"), response, MockData())
+    assert response is new_response
+    assert {"a": "b"} == new_response.headers
+
+    # a shared response is copied before the callback changes it in place
+    response = EncodedResponse(b"[1]", statusCode=200, bodyAsJson=[1], headers={})
+    response.shared = True
+    new_response = manager(request("put"), response, MockData())
+    assert [1] == response.bodyAsJson
+    assert b"[1,2]" == encoded_body(new_response)
+    new_response = manager(request("post"), response, MockData())
+    assert {} == response.headers
+    assert {"a": "b"} == new_response.headers
+    assert response.body == new_response.body
+
+    # a new response dict is serialized like generated responses
+    manager.add_callback(
+        "api.com",
+        "patch",
+        "/view",
+        "json",
+        "full",
+        lambda: dict(statusCode=201, bodyAsJson={"a": [1, "é"]}, headers={}),
+    )
+    new_response = manager(request("patch"), response, MockData())
+    assert 201 == new_response.statusCode
+    assert {"a": [1, "é"]} == new_response.bodyAsJson
+    assert '{"a":[1,"é"]}'.encode("utf-8") == encoded_body(new_response)
+
+
+def test_callback_request_copies():
+    manager = CallbackManager()
+
+    def change_request(request_headers, query, request_body):
+        request_headers["X-Changed"] = "yes"
+        query["page"] = ["2"]
+        request_body["id"] = 2
+        return {"changed": True}
+
+    manager.add_callback("api.com", "post", "/items", "json", "body", change_request)
+    request = RequestBuilder.from_dict(
+        dict(
+            method="post",
+            host="api.com",
+            path="/items?page=1",
+            protocol="http",
+            headers={"Content-Type": "application/json"},
+            body='{"id": 1}',
+        )
+    )
+    response = ResponseBuilder.from_dict(
+        dict(statusCode=200, bodyAsJson={}, headers={})
+    )
+    new_response = manager(request, response, MockData())
+    assert {"changed": True} == new_response.bodyAsJson
+
+    log = Log(Scope())
+    log.put(request, new_response)
+    logged = log.interactions_as_json[0]["request"]
+    assert {"Content-Type": "application/json"} == logged["headers"]
+    assert {"page": "1"} == logged["query"]
+    assert {"id": 1} == request.bodyAsJson
+
+
+def test_callback_returns_none():
+    manager = CallbackManager()
+    manager.add_callback("api.com", "get", "/none", "json", "body", lambda: None)
+    request = RequestBuilder.from_dict(
+        dict(method="get", host="api.com", path="/none", protocol="http")
+    )
+    response = EncodedResponse(
+        b'{"field":"value"}', statusCode=200, bodyAsJson={"field": "value"}, headers={}
+    )
+    new_response = manager(request, response, MockData())
+    assert new_response.bodyAsJson is None
+    assert "null" == new_response.body
+    assert b"null" == encoded_body(new_response)
+
+
+def test_unknown_callback_argument():
+    with pytest.raises(ValueError):
+        CallbackManager().add_callback(
+            "api.com", "get", "/", "json", "body", lambda body: body
+        )
+
+
+def test_async_callback(io_loop):
+    manager = CallbackManager()
+
+    async def async_callback(response_body):
+        await gen.sleep(0)
+        return {**response_body, "async": True}
+
+    manager.add_callback("api.com", "get", "/async", "json", "body", async_callback)
+    request = RequestBuilder.from_dict(
+        dict(method="get", host="api.com", path="/async", protocol="http")
+    )
+    response = ResponseBuilder.from_dict(
+        dict(statusCode=200, body="{}", bodyAsJson={}, headers={})
+    )
+
+    new_response = io_loop.run_sync(lambda: manager(request, response, MockData()))
+    assert {"async": True} == new_response.bodyAsJson
+
+
+CALLBACK_SCRIPT = """
+from hmt.serve.mock.callbacks import callback
+
+
+@callback("api.com", "get", "/reload")
+def reload_callback(response_body):
+    return {"version": %d}
+"""
+
+
+def test_reload_callbacks(io_loop, tmp_path):
+    manager = CallbackManager()
+    script = tmp_path / "reload.py"
+    script.write_text(CALLBACK_SCRIPT % 1)
+    request = RequestBuilder.from_dict(
+        dict(method="get", host="api.com", path="/reload", protocol="http")
+    )
+    response = ResponseBuilder.from_dict(
+        dict(statusCode=200, body="{}", bodyAsJson={}, headers={})
+    )
+
+    # callbacks are added to the table of the manager that loads them
+    with patch("hmt.serve.mock.callbacks.callback_manager", manager):
+        manager.load(str(tmp_path))
+        callback = manager.callback("api.com", "get", "/reload")
+        manager.watch(str(tmp_path), interval=0.01)
+        try:
+            script.write_text(CALLBACK_SCRIPT % 2)
+            os.utime(str(script), (0, 0))
+            io_loop.run_sync(lambda: gen.sleep(0.05))
+            assert {"version": 2} == manager(request, response, MockData()).bodyAsJson
+            # a request that has started with the old callback is not affected
+            assert {"version": 1} == callback(request, response, MockData()).bodyAsJson
+
+            # a broken script doesn't remove the loaded callbacks
+            script.write_text("raise Exception()")
+            io_loop.run_sync(lambda: gen.sleep(0.05))
+            assert {"version": 2} == manager(request, response, MockData()).bodyAsJson
+
+            script.unlink()
+            io_loop.run_sync(lambda: gen.sleep(0.05))
+            assert manager.callback("api.com", "get", "/reload") is None
+        finally:
+            manager.unwatch()
@@ -0,0 +1,115 @@
+import json
+
+from http_types.utils import RequestBuilder, ResponseBuilder
+
+from hmt.serve.mock.log import FileSink, JsonLinesSink, Log
+from hmt.serve.mock.scope import Scope
+
+
+def put(log, count):
+    for i in range(count):
+        log.put(
+            RequestBuilder.from_url("http://api.com/items/%d" % i),
+            ResponseBuilder.from_dict(
+                dict(statusCode=200, body="", bodyAsJson={}, headers={})
+            ),
+        )
+
+
+def read_lines(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f]
+
+
+def test_json_lines_sink_batches(io_loop, tmpdir):
+    sink = JsonLinesSink(str(tmpdir), "test.log.jsonl", batch_size=2, background=False)
+    scope = Scope()
+    scope.set("test")
+    log = Log(scope, sink)
+
+    put(log, 3)
+    assert 3 == len(log.interactions_as_json)
+    assert ["/items/0", "/items/1"] == [
+        line["request"]["pathname"] for line in read_lines(sink.path)
+    ]
+
+    log.close()
+    lines = read_lines(sink.path)
+    assert 3 == len(lines)
+    assert "test" == lines[2]["meta"]["scope"]
+
+
+def test_json_lines_sink_in_background(io_loop, tmpdir):
+    sink = JsonLinesSink(str(tmpdir), batch_size=10)
+    log = Log(Scope(), sink)
+
+    put(log, 25)
+    log.close()
+    assert list(log.interactions_as_json) == read_lines(sink.path)
+
+
+def test_log_retention():
+    log = Log(Scope(), max_entries=2, keep_typed=True)
+    put(log, 3)
+    assert ["/items/1", "/items/2"] == [
+        interaction["request"]["pathname"] for interaction in log.interactions_as_json
+    ]
+    assert ["/items/1", "/items/2"] == [
+        interaction.request.pathname for interaction in log.interactions
+    ]
+
+    log = Log(Scope(), max_bytes=1)
+    put(log, 3)
+    assert 0 == len(log.interactions_as_json)
+    assert 0 == len(log.interactions)
+
+    log = Log(Scope(), max_age=0, keep_typed=True)
+    put(log, 1)
+    log._evict(log.interactions[0].meta.timestamp + 1)
+    assert 0 == len(log.interactions)
+    assert 0 == len(log.interactions_as_json)
+
+
+def test_file_sink_rotation(tmpdir):
+    sink = FileSink(str(tmpdir), "test.log.json", max_bytes=1)
+    put(Log(Scope(), sink), 2)
+    assert ["test-1.log.json", "test.log.json"] == sorted(
+        path.basename for path in tmpdir.listdir()
+    )
+    assert 1 == len(json.load(open(sink.path)))
+
+
+def test_file_sink_appends(tmpdir):
+    sink = FileSink(str(tmpdir), "test.log.json", max_entries=2)
+    log = Log(Scope(), sink)
+    put(log, 3)
+    with open(str(tmpdir.join("test.log.json"))) as f:
+        assert json.dumps(list(log.interactions_as_json)[:2], indent=2) == f.read()
+    assert ["/items/2"] == [
+        interaction["request"]["pathname"] for interaction in json.load(open(sink.path))
+    ]
+
+
+def test_json_lines_sink_rotation(io_loop, tmpdir):
+    sink = JsonLinesSink(str(tmpdir), "test.log.jsonl", max_bytes=1)
+    log = Log(Scope(), sink)
+    put(log, 3)
+    log.close()
+    assert ["test-1.log.jsonl", "test-2.log.jsonl", "test.log.jsonl"] == sorted(
+        path.basename for path in tmpdir.listdir()
+    )
+    assert 1 == len(read_lines(sink.path))
+
+
+def test_json_lines_sink_rotation_by_age(io_loop, tmpdir):
+    sink = JsonLinesSink(
+        str(tmpdir), "test.log.jsonl", batch_size=1, background=False, max_age=0
+    )
+    log = Log(Scope(), sink)
+    put(log, 1)
+    sink._file._opened -= 1
+    put(log, 1)
+    log.close()
+    assert ["test-1.log.jsonl", "test.log.jsonl"] == sorted(
+        path.basename for path in tmpdir.listdir()
+    )
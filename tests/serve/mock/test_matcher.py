@@ -4,7 +4,7 @@ from typing import Sequence
 from http_types import RequestBuilder
 from openapi_typed_2 import convert_to_openapi
 
-from hmt.serve.mock.matcher import match_request_to_openapi
+from hmt.serve.mock.matcher import SpecIndex, match_request_to_openapi
 from hmt.serve.mock.specs import OpenAPISpecification
 
 store: Sequence[OpenAPISpecification] = [
@@ -358,3 +358,31 @@ def test_matcher_14():
         )[0]
         == "/guest/{id}"
     )
+
+
+def test_spec_index():
+    index = SpecIndex(store)
+    assert len(index) == 3
+    assert [store[0]] == [s for s, _ in index.match_servers("http", "api.foo.com")]
+    assert [store[0]] == [s for s, _ in index.match_servers("https", "api.foo.com")]
+    assert [(store[1], ["/v1"])] == index.match_servers("https", "api.bar.com")
+    assert [] == index.match_servers("http", "api.bar.com")
+    assert ["/v1"] == index.base_paths("https", "api.bar.com", store[1].api)
+    assert [] == index.base_paths("https", "api.bar.com", store[0].api)
+
+
+def test_matcher_with_index():
+    assert match_request_to_openapi(
+        RequestBuilder.from_dict(
+            {
+                "headers": {},
+                "host": "api.bar.com",
+                "path": "/v1/guest/{id}",
+                "pathname": "/v1/guest/{id}",
+                "protocol": "https",
+                "method": "post",
+                "query": {},
+            }
+        ),
+        SpecIndex(store),
+    ) == ("/guest/{id}", store[1])
@@ -0,0 +1,141 @@
+import json
+import time
+from urllib.parse import urlencode
+
+import pytest
+from http_types.utils import RequestBuilder
+from tornado import gen
+from tornado.web import Application, RequestHandler
+
+from hmt.serve.mock.matcher import SpecIndex
+from hmt.serve.mock.rest import DIFF, RestMiddlewareManager
+from hmt.serve.mock.specs import load_specs
+from hmt.serve.mock.storage.mock_data_store import MockDataStore
+
+DELAY = 0.2
+
+
+class MiddlewareStub(RequestHandler):
+    """
+    A stand-in middleware that answers after a delay given in the query and
+    replaces the title of every schema.
+    """
+
+    async def post(self):
+        await gen.sleep(float(self.get_query_argument("delay", "0")))
+        if self.get_query_argument("fail", None):
+            self.set_status(500)
+            return
+        if self.get_query_argument("unchanged", None):
+            self.set_status(204)
+            return
+        invalid = self.get_query_argument("invalid", None)
+        if invalid is not None:
+            self.set_header("Content-Type", "application/json")
+            self.write(invalid)
+            return
+        schemas = json.loads(self.request.body)["schemas"]
+        for schema in schemas.values():
+            schema["info"]["title"] = "changed"
+        if self.get_query_argument("diff", None):
+            self.write({DIFF: schemas})
+        else:
+            self.write(schemas)
+
+
+@pytest.fixture
+def app():
+    return Application([(r"/", MiddlewareStub)])
+
+
+@pytest.fixture
+def specs():
+    return SpecIndex(load_specs("tests/serve/mock/schemas/petstore"))
+
+
+@pytest.fixture
+def manager():
+    return RestMiddlewareManager(MockDataStore(), timeout=DELAY * 5)
+
+
+def petstore_request():
+    return RequestBuilder.from_dict(
+        dict(
+            method="get",
+            host="petstore.swagger.io",
+            pathname="/v1/pets",
+            query={},
+            body="",
+            protocol="http",
+            headers={},
+        )
+    )
+
+
+@pytest.mark.gen_test
+async def test_spew(http_server, base_url, specs, manager):
+    manager.add(base_url + "/")
+    out = await manager.spew(petstore_request(), specs)
+    assert ["changed"] == [spec.api.info.title for spec in out]
+
+
+@pytest.mark.gen_test
+async def test_spew_reuses_unchanged_specs(http_server, base_url, specs, manager):
+    manager.add(base_url + "/")
+    first = await manager.spew(petstore_request(), specs)
+    storage = manager._mock_data_store[first[0].source]
+    storage["counter"] = 1
+
+    second = await manager.spew(petstore_request(), specs)
+    assert first is second
+    # the spec is not registered again, so its storage is kept
+    assert 1 == manager._mock_data_store[first[0].source]["counter"]
+
+
+@pytest.mark.gen_test
+async def test_spew_unchanged_and_diff(http_server, base_url, specs, manager):
+    manager.add(base_url + "/?unchanged=1")
+    assert specs is await manager.spew(petstore_request(), specs)
+
+    manager.clear()
+    manager.add(base_url + "/?diff=1")
+    out = await manager.spew(petstore_request(), specs)
+    assert ["changed"] == [spec.api.info.title for spec in out]
+
+
+@pytest.mark.gen_test
+async def test_spew_concurrently(http_server, base_url, specs, manager):
+    manager.add(base_url + "/?delay=%s" % DELAY)
+    count = 5
+
+    start = time.perf_counter()
+    outs = await gen.multi(
+        [manager.spew(petstore_request(), specs) for _ in range(count)]
+    )
+    elapsed = time.perf_counter() - start
+
+    assert count == len(outs)
+    # requests wait for the middleware at the same time instead of one by one
+    assert elapsed < count * DELAY
+
+
+@pytest.mark.gen_test
+async def test_spew_skips_slow_and_failing_middlewares(
+    http_server, base_url, specs, manager
+):
+    manager.add(base_url + "/?delay=%s" % (DELAY * 2), timeout=DELAY)
+    manager.add(base_url + "/?fail=1")
+    out = await manager.spew(petstore_request(), specs)
+    assert [spec.api.info.title for spec in specs] == [
+        spec.api.info.title for spec in out
+    ]
+    # let the stand-in middleware finish the abandoned request
+    await gen.sleep(DELAY)
+
+
+@pytest.mark.gen_test
+async def test_spew_skips_invalid_responses(http_server, base_url, specs, manager):
+    for invalid in ["[]", '"changed"', '{"%s": []}' % DIFF, '{"petstore": 1}']:
+        manager.clear()
+        manager.add(base_url + "/?" + urlencode(dict(invalid=invalid)))
+        assert specs is await manager.spew(petstore_request(), specs)
@@ -0,0 +1,83 @@
+import random
+
+from openapi_typed_2 import convert_to_openapi
+
+from hmt.serve.mock.matcher import matches
+from hmt.serve.mock.routes import RouteTrie, split_pathname
+
+
+def paths_spec(paths):
+    return convert_to_openapi(
+        {
+            "openapi": "",
+            "info": {"title": "", "version": ""},
+            "paths": {
+                path: {
+                    method: {"responses": {"200": {"description": ""}}}
+                    for method in methods
+                }
+                for path, methods in paths.items()
+            },
+        }
+    )
+
+
+def best_by_score(oai, path, method):
+    best_path = None
+    best_score = 0
+    for pathname, path_item in oai.paths.items():
+        score = matches(path, pathname, path_item, method)
+        if score > 0 and score > best_score:
+            best_path = pathname
+            best_score = score
+    return best_path
+
+
+def test_literal_before_template():
+    oai = paths_spec(
+        {
+            "/user/{id}": ["get"],
+            "/user/me": ["get"],
+            "/user/{id}/name": ["get", "post"],
+        }
+    )
+    trie = RouteTrie(oai.paths)
+    assert "/user/me" == trie.match(["user", "me"], "get")
+    assert "/user/{id}" == trie.match(["user", "42"], "get")
+    assert "/user/{id}/name" == trie.match(["user", "me", "name"], "post")
+    assert trie.match(["user", "me"], "post") is None
+    assert trie.match(["user"], "get") is None
+    assert trie.match(["user", "42", "name", "x"], "get") is None
+
+
+def test_most_literals_win_over_first_literal():
+    oai = paths_spec({"/a/{x}/{y}": ["get"], "/{z}/b/c": ["get"]})
+    trie = RouteTrie(oai.paths)
+    assert "/{z}/b/c" == trie.match(["a", "b", "c"], "get")
+
+
+def test_ties_go_to_first_declared_path():
+    oai = paths_spec({"/a/{x}/c": ["get"], "/{y}/b/c": ["get"], "/a/{w}": ["get"]})
+    trie = RouteTrie(oai.paths)
+    assert "/a/{x}/c" == trie.match(["a", "b", "c"], "get")
+
+
+def test_same_as_scoring_every_path():
+    rnd = random.Random(0)
+    segments = ["a", "b", "c", "{x}", "{y}"]
+    paths = {
+        "/"
+        + "/".join(rnd.choice(segments) for _ in range(rnd.randint(0, 4))): rnd.sample(
+            ["get", "post", "put"], rnd.randint(1, 3)
+        )
+        for _ in range(200)
+    }
+    oai = paths_spec(paths)
+    trie = RouteTrie(oai.paths)
+    for _ in range(500):
+        request_path = "/" + "/".join(
+            rnd.choice(["a", "b", "c", "d"]) for _ in range(rnd.randint(0, 4))
+        )
+        method = rnd.choice(["get", "post", "put", "delete"])
+        path = split_pathname(request_path)
+        assert best_by_score(oai, path, method) == trie.match(path, method)
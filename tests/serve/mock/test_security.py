@@ -1,16 +1,25 @@
+import gc
+import weakref
+
 from hamcrest import assert_that, has_entry, instance_of, is_, matches_regexp
 from http_types import RequestBuilder, Response
 
-from hmt.serve.mock.matcher import truncate_path
+from hmt.serve.mock.matcher import SpecIndex, truncate_path
 from hmt.serve.mock.security import (
     match_request_to_security_scheme,
     match_to_security_schemes,
+    security_routes,
 )
 from hmt.serve.mock.specs import load_specs
 
-spec = load_specs("tests/serve/mock/schemas/nordea")[0].api
+specs = [
+    *load_specs("tests/serve/mock/schemas/nordea"),
+    *load_specs("tests/serve/mock/schemas/petstore"),
+]
+
+spec = specs[0].api
 
-spec_petstore = load_specs("tests/serve/mock/schemas/petstore")[0].api
+spec_petstore = specs[1].api
 
 redirect_uri = "https://example.com/callback"
 state = "my-state"
@@ -24,6 +33,11 @@ def test_truncate_path():
     assert truncated == "/v4/authorize"
 
 
+def test_truncate_path_with_index():
+    truncated = truncate_path(req.pathname, spec, req, SpecIndex(specs))
+    assert truncated == "/v4/authorize"
+
+
 def test_match_to_oauth():
     match = match_request_to_security_scheme(req, spec)
     assert_that(match, instance_of(Response))
@@ -40,3 +54,38 @@ def test_match_to_security_schemes():
 def test_match_to_nonmatching_security():
     match = match_to_security_schemes(req, (spec_petstore,))
     assert_that(match, is_(None))
+
+
+def test_match_to_security_schemes_with_index():
+    index = SpecIndex(specs)
+    match = match_to_security_schemes(req, index.apis, index)
+    assert_that(match, instance_of(Response))
+    assert_that(match.statusCode, is_(302))
+
+
+def test_security_routes():
+    index = SpecIndex(specs)
+    routes = security_routes(index)
+    assert routes is security_routes(index)
+
+    # the authorization url is matched with and without the base path of a server
+    assert_that(routes.match(req), instance_of(Response))
+    assert_that(
+        routes.match(
+            RequestBuilder.from_url(
+                f"https://api.nordeaopenbanking.com/v4/authorize?redirect_uri={redirect_uri}"
+            )
+        ),
+        instance_of(Response),
+    )
+    assert_that(
+        routes.match(RequestBuilder.from_url("https://api.nordeaopenbanking.com/pets")),
+        is_(None),
+    )
+    assert_that(security_routes(SpecIndex(specs[1:])).match(req), is_(None))
+
+    # routes are dropped with their index
+    routes = weakref.ref(routes)
+    del index
+    gc.collect()
+    assert_that(routes(), is_(None))
@@ -1,4 +1,5 @@
 import json
+import logging
 from unittest.mock import Mock
 
 import pytest
@@ -9,6 +10,8 @@ from tornado.httpclient import HTTPRequest
 from hmt.serve.mock.log import Log
 from hmt.serve.mock.scope import Scope
 from hmt.serve.mock.specs import load_specs
+from hmt.serve.utils import json_encoding
+from hmt.serve.utils.json_encoding import StreamedResponse
 from hmt.serve.utils.routing import HeaderRouting
 
 response = ResponseBuilder.from_dict(
@@ -26,7 +29,11 @@ process_mock = Mock(return_value=response)
 def request_processor(request_processor):
     def _rp(specs):
         rp = request_processor(specs)
-        rp.process = process_mock
+
+        async def process(request, stopwatch=None):
+            return process_mock(request)
+
+        rp.process = process
         return rp
 
     return _rp
@@ -60,3 +67,36 @@ def test_mocking_server_pets(http_client, base_url, app):
     assert {} == request.query
     assert "petstore.swagger.io" == request.host
     assert "petstore.swagger.io" == request.headers["Host"]
+
+
+@pytest.mark.gen_test
+def test_mocking_server_streams(http_client, base_url, app, monkeypatch):
+    items = [{"id": i} for i in range(10000)]
+    streamed = StreamedResponse(
+        json_encoding.dumps_array(items),
+        statusCode=200,
+        bodyAsJson=None,
+        headers={"Content-Type": "application/json"},
+    )
+    monkeypatch.setattr(process_mock, "return_value", streamed)
+
+    req = HTTPRequest(base_url + "/pets", headers={"Host": "petstore.swagger.io"})
+    http_response = yield http_client.fetch(req)
+    assert 200 == http_response.code
+    assert "chunked" == http_response.headers["Transfer-Encoding"]
+    assert items == json.loads(http_response.body)
+
+
+@pytest.mark.gen_test
+def test_mocking_server_copies_bodies_only_for_debug_logs(
+    http_client, base_url, app, monkeypatch, caplog
+):
+    caplog.set_level(logging.INFO, logger="hmt.serve.mock.views")
+    asdict = Mock(side_effect=AssertionError("asdict called"))
+    monkeypatch.setattr("hmt.serve.mock.views.asdict", asdict)
+    monkeypatch.setattr(process_mock, "return_value", response)
+
+    req = HTTPRequest(base_url + "/pets", headers={"Host": "petstore.swagger.io"})
+    http_response = yield http_client.fetch(req)
+    assert 200 == http_response.code
+    asdict.assert_not_called()
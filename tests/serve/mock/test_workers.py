@@ -0,0 +1,128 @@
+from multiprocessing import Pipe
+
+from openapi_typed_2 import convert_to_OpenAPIObject
+from tornado import gen
+
+from hmt.serve.mock.rest import RestMiddlewareManager
+from hmt.serve.mock.scope import Scope
+from hmt.serve.mock.specs import OpenAPISpecification
+from hmt.serve.mock.storage.mock_data_store import MockDataStore
+from hmt.serve.mock.workers import SharedState
+from hmt.serve.utils.metrics import MetricsRegistry, Stopwatch
+from tests.util import spec_dict
+
+
+def items_spec():
+    components = {
+        "schemas": {
+            "item": {
+                "type": "object",
+                "x-hmt-id-path": "itemId",
+                "properties": {"foo": {"type": "number"}, "itemId": {"type": "string"}},
+            }
+        }
+    }
+    spec = spec_dict(
+        path="/items/{id}",
+        response_schema={"$ref": "#/components/schemas/item"},
+        components=components,
+    )
+    spec["paths"]["/items/{id}"]["x-hmt-entity"] = "item"
+    spec["x-hmt-data"] = {"item": [{"foo": 10, "itemId": "id123"}]}
+    return OpenAPISpecification(
+        convert_to_OpenAPIObject(spec), "items", {"definitions": {}}
+    )
+
+
+class Process:
+    def __init__(self, connection):
+        self.connection = connection
+        self.scope = Scope()
+        self.mock_data_store = MockDataStore()
+        self.mock_data_store.add_mock(items_spec())
+        self.rest_middleware_manager = RestMiddlewareManager(self.mock_data_store)
+        self.metrics = MetricsRegistry()
+        self.shared_state = SharedState(
+            self.scope, self.mock_data_store, self.rest_middleware_manager, self.metrics
+        )
+        self.shared_state.connect(connection)
+
+    def receive_all(self):
+        self.shared_state._receive(self.shared_state._channels[0], False, None)
+
+
+def test_shared_state(io_loop):
+    one_end, other_end = Pipe()
+    one = Process(one_end)
+    other = Process(other_end)
+
+    one.scope.set("test")
+    one.rest_middleware_manager.add("http://localhost:8080")
+    one.mock_data_store["items"].item.insert({"foo": 20, "itemId": "id456"})
+    one.mock_data_store["items"]["counter"] = 1
+    other.receive_all()
+
+    assert "test" == other.scope.get()
+    assert ["http://localhost:8080"] == other.rest_middleware_manager.get()
+    assert 20 == other.mock_data_store["items"].item["id456"]["foo"]
+    assert 1 == other.mock_data_store["items"]["counter"]
+    # applied changes are not sent back
+    assert not one_end.poll()
+
+    other.mock_data_store.clear()
+    one.receive_all()
+    assert 0 == len(one.mock_data_store["items"].item)
+
+    other.mock_data_store.reset()
+    other.scope.clear()
+    other.rest_middleware_manager.clear()
+    one.receive_all()
+    assert 1 == len(one.mock_data_store["items"].item)
+    assert one.scope.get() is None
+    assert [] == one.rest_middleware_manager.get()
+
+    del one.mock_data_store["items"].item["id123"]
+    other.receive_all()
+    assert 0 == len(other.mock_data_store["items"].item)
+
+    one.mock_data_store.namespace("test")["items"].item.insert(
+        {"foo": 30, "itemId": "id789"}
+    )
+    other.receive_all()
+    assert 30 == other.mock_data_store.namespace("test")["items"].item["id789"]["foo"]
+    assert "id789" not in other.mock_data_store["items"].item
+
+    one.mock_data_store.drop("test")
+    other.receive_all()
+    assert [] == other.mock_data_store.scopes()
+    assert not one_end.poll()
+
+
+def test_shared_metrics(io_loop):
+    one_end, other_end = Pipe()
+    worker = Process(one_end)
+    admin = Process(other_end)
+
+    worker.metrics.observe(Stopwatch(), "get", 200)
+    worker.shared_state.broadcast(("metrics", (0, worker.metrics.export())))
+    admin.receive_all()
+
+    assert 1 == admin.metrics.to_json()["routes"][0]["count"]
+
+
+def test_shared_state_does_not_block(io_loop):
+    one_end, other_end = Pipe()
+    one = Process(one_end)
+    other = Process(other_end)
+
+    # both processes send more than the pipe buffers hold before reading anything
+    value = "x" * (1 << 20)
+    one.mock_data_store["items"]["big"] = value
+    other.mock_data_store["items"]["large"] = value
+    one.mock_data_store["items"]["after"] = 1
+
+    # the rest of the messages is written and read by the IOLoop
+    io_loop.run_sync(lambda: gen.sleep(0.2))
+    assert value == other.mock_data_store["items"]["big"]
+    assert 1 == other.mock_data_store["items"]["after"]
+    assert value == one.mock_data_store["items"]["large"]
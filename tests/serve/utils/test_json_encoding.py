@@ -0,0 +1,54 @@
+import json
+
+from http_types import HttpExchange, HttpExchangeWriter, RequestBuilder
+
+from hmt.serve.utils import json_encoding
+from hmt.serve.utils.json_encoding import (
+    EncodedResponse,
+    StreamedResponse,
+    encoded_body,
+)
+
+
+def test_dumps():
+    obj = {"a": [1, 2.5, None, True], "b": "ünïcode", "c": 2 ** 70}
+    assert obj == json.loads(json_encoding.dumps(obj))
+
+
+def test_dumps_without_orjson(monkeypatch):
+    monkeypatch.setattr(json_encoding, "orjson", None)
+    assert b'{"a":[1,"\xc3\xbc"]}' == json_encoding.dumps({"a": [1, "ü"]})
+
+
+def test_encoded_response():
+    response = EncodedResponse(
+        b'{"a":1}', statusCode=200, bodyAsJson={"a": 1}, headers={}
+    )
+    assert '{"a":1}' == response.body
+    assert b'{"a":1}' == encoded_body(response)
+
+    exchange = HttpExchangeWriter.to_dict(
+        HttpExchange(
+            request=RequestBuilder.from_url("http://api.com/"), response=response
+        )
+    )
+    assert "encoded" not in exchange["response"]
+
+
+def test_dumps_array():
+    items = [{"a": i} for i in range(100)]
+    chunks = list(json_encoding.dumps_array(iter(items), chunk_size=64))
+    assert len(chunks) > 1
+    assert all(len(chunk) >= 64 for chunk in chunks[:-1])
+    assert items == json.loads(b"".join(chunks))
+    assert [b"[]"] == list(json_encoding.dumps_array([]))
+
+
+def test_streamed_response():
+    response = StreamedResponse(
+        json_encoding.dumps_array([1, 2]), statusCode=200, bodyAsJson=None, headers={}
+    )
+    assert "" == response.body
+    materialized = response.materialize()
+    assert b"[1,2]" == encoded_body(materialized)
+    assert [1, 2] == materialized.bodyAsJson
@@ -0,0 +1,68 @@
+from hmt.serve.utils.metrics import MATCH, ROUTING, TOTAL, MetricsRegistry, Stopwatch
+
+
+def stopwatch(**stages):
+    stopwatch = Stopwatch()
+    stopwatch.spec = "items"
+    stopwatch.path = "/items/{id}"
+    stopwatch.stages.update(stages)
+    return stopwatch
+
+
+def test_observe():
+    metrics = MetricsRegistry()
+    metrics.observe(stopwatch(routing=0.00002, match=0.0003), "get", 200)
+    metrics.observe(stopwatch(routing=0.00004, match=0.0007), "get", 200)
+    metrics.observe(stopwatch(routing=0.001), "get", 404)
+
+    routes = metrics.to_json()["routes"]
+    assert [200, 404] == [route["status"] for route in routes]
+    assert 2 == routes[0]["count"]
+    stages = routes[0]["stages"]
+    assert {MATCH, ROUTING, TOTAL} == set(stages)
+    assert 2 == stages[ROUTING]["count"]
+    assert abs(0.00003 - stages[ROUTING]["mean"]) < 1e-12
+    assert 0.000025 < stages[ROUTING]["p99"] <= 0.00005
+    assert abs(0.00106 - stages[TOTAL]["sum"]) < 1e-12
+
+
+def test_lap():
+    watch = Stopwatch()
+    watch.lap(ROUTING)
+    watch.lap(MATCH)
+    watch.lap(ROUTING)
+    assert [ROUTING, MATCH] == list(watch.stages)
+    assert all(seconds >= 0 for seconds in watch.stages.values())
+
+
+def test_processes():
+    metrics = MetricsRegistry()
+    worker = MetricsRegistry()
+    worker.observe(stopwatch(routing=0.001), "get", 200)
+    metrics.observe(stopwatch(routing=0.001), "get", 200)
+    metrics.update_process(0, worker.export())
+    # a later export of the same process replaces the previous one
+    metrics.update_process(0, worker.export())
+
+    assert 2 == metrics.to_json()["routes"][0]["count"]
+    assert 1 == worker.to_json()["routes"][0]["count"]
+
+
+def test_prometheus():
+    metrics = MetricsRegistry()
+    metrics.observe(stopwatch(routing=0.001), "get", 200)
+    text = metrics.to_prometheus()
+    labels = 'spec="items",path="/items/{id}",method="get",status="200"'
+    assert "hmt_requests_total{%s} 1" % labels in text.splitlines()
+    assert (
+        'hmt_request_duration_seconds_bucket{%s,stage="routing",le="0.001"} 1' % labels
+        in text.splitlines()
+    )
+    assert (
+        'hmt_request_duration_seconds_bucket{%s,stage="routing",le="0.0005"} 0' % labels
+        in text.splitlines()
+    )
+    assert (
+        'hmt_request_duration_seconds_count{%s,stage="total"} 1' % labels
+        in text.splitlines()
+    )
@@ -0,0 +1,97 @@
+import asyncio
+import marshal
+import pstats
+import time
+
+import pytest
+
+from hmt.serve.utils.profiler import (
+    COLLAPSED,
+    DETERMINISTIC,
+    PSTATS,
+    SAMPLING,
+    TEXT,
+    Profiler,
+)
+from hmt.serve.utils.timers import REQUEST, add_hook, remove_hook, timed
+
+
+@timed(name=REQUEST)
+def handle_request():
+    # python code, so the sampler gets the GIL while the request is handled
+    total = 0
+    for i in range(100000):
+        total += i
+    return total
+
+
+@timed
+async def handle_async():
+    await asyncio.sleep(0)
+    return 1
+
+
+def test_timed(io_loop):
+    calls = []
+
+    def hook(name, seconds):
+        calls.append((name, seconds))
+
+    add_hook(hook)
+    try:
+        assert 4999950000 == handle_request()
+        assert 1 == io_loop.run_sync(handle_async)
+    finally:
+        remove_hook(hook)
+    assert [REQUEST, "handle_async"] == [name for name, _ in calls]
+    assert all(seconds >= 0 for _, seconds in calls)
+
+
+def test_deterministic():
+    profiler = Profiler()
+    profiler.start(DETERMINISTIC, requests=2)
+    assert profiler.running
+    with pytest.raises(ValueError):
+        profiler.start()
+
+    handle_request()
+    assert profiler.running
+    handle_request()
+    # the run stops by itself after the requests
+    assert not profiler.running
+    profile = profiler.last
+    assert 2 == profile.requests
+
+    assert "handle_request" in profile.output(TEXT).decode()
+    stats = pstats.Stats(_Loaded(marshal.loads(profile.output(PSTATS))))
+    assert any(name == "handle_request" for _, _, name in stats.stats)
+    with pytest.raises(ValueError):
+        profile.output(COLLAPSED)
+
+
+def test_sampling():
+    profiler = Profiler()
+    profiler.start(SAMPLING, interval=0.001)
+    deadline = time.time() + 0.3
+    while time.time() < deadline:
+        handle_request()
+    profile = profiler.stop()
+
+    assert not profiler.running
+    assert profile.requests > 0
+    lines = profile.output().decode().splitlines()
+    assert any(
+        line.startswith("test_sampling") or ";test_sampling" in line for line in lines
+    )
+    assert any("handle_request" in line for line in lines)
+    assert all(int(line.rsplit(" ", 1)[1]) > 0 for line in lines)
+    with pytest.raises(ValueError):
+        profiler.stop()
+
+
+class _Loaded:
+    def __init__(self, stats):
+        self.stats = stats
+
+    def create_stats(self):
+        pass
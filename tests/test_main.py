@@ -112,3 +112,10 @@ def test_version():
     result = runner.invoke(cli, ["--version"])
     assert result.exit_code == 0
     assert result.output == f"cli, version {expected_version}\n"
+
+
+def test_record_admin_port_is_a_number():
+    runner = CliRunner()
+    result = runner.invoke(cli, ["record", "--admin-port", "admin"])
+    assert result.exit_code == 2
+    assert "admin is not a valid integer" in result.output